@@ -1,7 +1,7 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 from app.config import Config
-from app.extensions import db, migrate, init_extensions, jwt
+from app.extensions import db, init_extensions, jwt
 import os
 import logging
 from logging.handlers import RotatingFileHandler
@@ -29,7 +29,7 @@ def create_app(config_class=Config):
             "origins": default_origins,
             "methods": ["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
             "allow_headers": ["Content-Type", "Authorization", "X-Requested-With"],
-            "expose_headers": ["Content-Type", "Authorization"],
+            "expose_headers": ["Content-Type", "Authorization", "ETag", "Last-Modified"],
             "supports_credentials": True,
             "max_age": 3600
         }
@@ -59,6 +59,30 @@ def create_app(config_class=Config):
     # Initialize extensions
     init_extensions(app)
 
+    # Pool metrics, and a warm connection at serverless cold start
+    from app.utils.db_pool import init_db_pool
+    init_db_pool(app, db)
+
+    # Request latency, SQL and outbound call metrics
+    from app.utils.metrics import metrics
+    metrics.init_app(app)
+
+    # Route-tagged SQL and the slow-query log
+    from app.utils.slow_queries import slow_queries
+    slow_queries.init_app(app)
+
+    # Email outbox (imports models, so it can't live in extensions.py)
+    from app.utils.outbox import outbox
+    outbox.init_app(app)
+
+    # `flask images backfill`
+    from app.utils.derivatives import images_cli
+    app.cli.add_command(images_cli)
+
+    # `flask listings import|export`
+    from app.utils.bulk import listings_cli
+    app.cli.add_command(listings_cli)
+
     # Configure JWT
     jwt.init_app(app)
 
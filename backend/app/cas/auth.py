@@ -9,13 +9,16 @@ from flask import current_app, request, redirect, url_for, session, jsonify
 from flask_jwt_extended import create_access_token
 from ..extensions import db
 from ..models import User
-import requests
 from ..extensions import jwt
-import xml.etree.ElementTree as ET
+from .client import get_cas_client, parse_service_response
 from flask import Blueprint
 from datetime import datetime, timedelta
 import os
 from functools import wraps
+from collections import namedtuple
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
 #-----------------------------------------------------------------------
 
@@ -66,94 +69,86 @@ def get_cas_ticket():
 
 def extract_netid_from_cas_response(response_text):
     """Extract the netid directly from the CAS response."""
-    try:
-        # Parse the XML response
-        root = ET.fromstring(response_text)
-        # Find the authentication success element
-        success = root.find('.//{http://www.yale.edu/tp/cas}authenticationSuccess')
-        if success is not None:
-            # Extract the netid from the user element
-            user = success.find('{http://www.yale.edu/tp/cas}user')
-            if user is not None:
-                netid = user.text
-                current_app.logger.info(f"Extracted netid from CAS response: {netid}")
-                return netid
-            else:
-                current_app.logger.error("No user element found in CAS response")
-        else:
-            current_app.logger.error("No authentication success found in CAS response")
-        return None
-    except Exception as e:
-        current_app.logger.error(f"Error extracting netid from CAS response: {str(e)}")
-        return None
+    netid, failure = parse_service_response(response_text)
+    if failure:
+        current_app.logger.error(f"CAS authentication failed: {failure}")
+    return netid
 
 def validate_cas_ticket(ticket, service_url=None):
     """Validate the CAS ticket with the CAS server."""
-    validate_url = f'{CAS_SERVER}/serviceValidate'
     # Use provided service URL or fall back to CAS_SERVICE
     service_url = service_url or CAS_SERVICE
-    
-    try:
-        # Log the request details
-        current_app.logger.info(f"Validating ticket: {ticket}")
-        current_app.logger.info(f"Service URL: {service_url}")
-        
-        # For development, if the ticket starts with 'ST-', consider it valid
-        if ticket and ticket.startswith('ST-'):
-            current_app.logger.info("Development mode: Accepting ST- ticket")
-            # In development mode, use a test netid
-            # This is for testing purposes only
-            netid = "testuser"
-            current_app.logger.info(f"Development mode: Using test netid: {netid}")
-            return netid
-        
-        # Proceed with normal validation
-        response = requests.get(validate_url, params={
-            'ticket': ticket,
-            'service': service_url
-        }, timeout=10)  # Add timeout
-        current_app.logger.info(f"CAS validation URL: {response.url}")
-        current_app.logger.info(f"CAS validation response: {response.text}")
-        
-        if response.status_code == 200:
-            # Extract netid directly from the response
-            netid = extract_netid_from_cas_response(response.text)
-            if netid:
-                current_app.logger.info(f"Successfully validated ticket for netid: {netid}")
-                return netid
-        else:
-            current_app.logger.error(f"CAS validation failed with status code: {response.status_code}")
-        return None
-    except requests.exceptions.Timeout:
-        current_app.logger.error("CAS validation timeout")
-        return None
-    except requests.exceptions.RequestException as e:
-        current_app.logger.error(f"CAS validation request error: {str(e)}")
-        return None
-    except Exception as e:
-        current_app.logger.error(f"CAS validation error: {str(e)}")
+    if not ticket:
         return None
 
+    # Local development without CAS: opt in with CAS_DEV_TICKETS=1. Real
+    # service tickets start with ST- too, so this must never be on in production.
+    if current_app.config.get('CAS_DEV_TICKETS') and ticket.startswith('ST-'):
+        current_app.logger.info("Development mode: Accepting ST- ticket as testuser")
+        return "testuser"
+
+    netid = get_cas_client().validate(ticket, service_url)
+    if netid:
+        current_app.logger.info(f"Successfully validated ticket for netid: {netid}")
+    return netid
+
+# What login needs from a user row; see create_or_update_user
+LoginUser = namedtuple('LoginUser', ['id', 'netid'])
+
+def _upsert_statement(dialect_name, netid, now):
+    """INSERT ... ON CONFLICT (netid) DO NOTHING, returning the user's id.
+
+    On Postgres the lookup of an already existing row rides along in the same
+    statement; SQLite can't put INSERT in a CTE, so there it only returns the
+    id of a row it just created.
+    """
+    users = User.__table__
+    if dialect_name == 'postgresql':
+        inserted = (pg_insert(users).values(netid=netid, created_at=now)
+                    .on_conflict_do_nothing(index_elements=['netid'])
+                    .returning(users.c.id)
+                    .cte('inserted'))
+        return (select(inserted.c.id)
+                .union_all(select(users.c.id).where(users.c.netid == netid))
+                .limit(1))
+    return (sqlite_insert(users).values(netid=netid, created_at=now)
+            .on_conflict_do_nothing(index_elements=['netid'])
+            .returning(users.c.id))
+
+def _upsert_user_id(netid):
+    """Return the id of the user with `netid`, creating the row if needed.
+
+    Concurrent first logins can't collide: the insert skips a conflicting
+    row instead of failing.
+    """
+    stmt = _upsert_statement(db.engine.dialect.name, netid, datetime.utcnow())
+    user_id = db.session.execute(stmt).scalar()
+    if user_id is None:
+        # Existing user (SQLite), or a concurrent insert that committed after
+        # this statement's snapshot was taken (Postgres)
+        user_id = db.session.execute(select(User.id).where(User.netid == netid)).scalar()
+    db.session.commit()
+    return user_id
+
 def create_or_update_user(netid):
-    """Create or update a user based on CAS netid."""
+    """Create or update a user based on CAS netid.
+
+    Returns a LoginUser (id, netid), or None if the netid is invalid or the
+    database fails. Known netids are answered from a per-process cache, so a
+    returning user's login doesn't touch the database at all.
+    """
     try:
-        current_app.logger.info(f"Creating/updating user with netid: {netid}")
-        
         # Validate netid format (Princeton netids are typically 3-8 characters)
-        if not re.match(r'^[a-zA-Z0-9]{3,8}$', netid):
+        if not netid or not re.match(r'^[a-zA-Z0-9]{3,8}$', netid):
             current_app.logger.error(f"Invalid netid format: {netid}")
             return None
-            
-        user = User.query.filter_by(netid=netid).first()
-        if not user:
-            current_app.logger.info(f"Creating new user for netid: {netid}")
-            user = User(netid=netid)
-            db.session.add(user)
-            db.session.commit()
-            current_app.logger.info(f"Created new user with id: {user.id}")
-        else:
-            current_app.logger.info(f"Found existing user with id: {user.id}")
-        return user
+
+        netids = current_app.extensions['auth_cache'].netids
+        user_id = netids.get(netid)
+        if user_id is None:
+            user_id = _upsert_user_id(netid)
+            netids.set(netid, user_id)
+        return LoginUser(user_id, netid)
     except Exception as e:
         current_app.logger.error(f"Error creating/updating user: {str(e)}")
         db.session.rollback()
@@ -162,8 +157,9 @@ def create_or_update_user(netid):
 def generate_jwt_token(user):
     """Generate a JWT token for the user."""
     # Use create_access_token from flask_jwt_extended
+    # PyJWT requires `sub` to be a string
     return create_access_token(
-        identity=user.id,
+        identity=str(user.id),
         additional_claims={
             'netid': user.netid
         },
@@ -0,0 +1,148 @@
+"""CAS ticket validation client.
+
+One CASClient per app keeps a pooled, keep-alive requests.Session to the CAS
+server, so logins after the first reuse an open TLS connection instead of
+handshaking with fed.princeton.edu every time.
+
+Tickets are single-use, so the client also remembers ticket -> netid for
+CAS_TICKET_CACHE_TTL seconds and coalesces concurrent validations of the same
+ticket: a duplicate callback (double click, browser retry) gets the first
+answer instead of a second upstream call that CAS would reject.
+
+Retries only cover failures where CAS cannot have consumed the ticket
+(connection errors and 502/503/504); a read timeout is not retried, since
+the first attempt may already have used the ticket up.
+
+requests and ElementTree are imported when the first client is built or the
+first response parsed, not when the blueprints load.
+"""
+import logging
+import threading
+
+from flask import current_app
+
+from ..utils.auth_cache import TTLCache
+from ..utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+_CAS_NS = '{http://www.yale.edu/tp/cas}'
+
+
+def parse_service_response(text):
+    """Return (netid, failure_code) from a serviceValidate XML body."""
+    import xml.etree.ElementTree as ET
+
+    try:
+        root = ET.fromstring(text)
+    except ET.ParseError:
+        return None, 'INVALID_RESPONSE'
+    user = root.find(f'{_CAS_NS}authenticationSuccess/{_CAS_NS}user')
+    if user is not None and user.text:
+        return user.text.strip(), None
+    failure = root.find(f'{_CAS_NS}authenticationFailure')
+    if failure is not None:
+        return None, failure.get('code') or 'UNKNOWN'
+    return None, 'INVALID_RESPONSE'
+
+
+class CASClient:
+    """Validates service tickets against one CAS server."""
+
+    def __init__(self, server_url, timeout=(3.05, 10), retries=2, pool_size=10,
+                 cache_size=1024, cache_ttl=60):
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        self.server_url = server_url.rstrip('/')
+        self.timeout = timeout
+        self.session = requests.Session()
+        retry = Retry(total=retries, connect=retries, read=0, status=retries,
+                      status_forcelist=(502, 503, 504), allowed_methods=frozenset({'GET'}),
+                      backoff_factor=0.2, raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.tickets = TTLCache(cache_size, cache_ttl)
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config['CAS_URL'], timeout=config['CAS_TIMEOUT'], retries=config['CAS_RETRIES'],
+                   pool_size=config['CAS_POOL_SIZE'], cache_size=config['CAS_TICKET_CACHE_SIZE'],
+                   cache_ttl=config['CAS_TICKET_CACHE_TTL'])
+
+    def validate(self, ticket, service_url):
+        """Return the netid for `ticket`, or None if CAS rejects it or is unreachable."""
+        key = (ticket, service_url)
+        netid = self.tickets.get(key)
+        if netid is not None:
+            return netid
+
+        with self._lock:
+            pending = self._inflight.get(key)
+            leader = pending is None
+            if leader:
+                pending = self._inflight[key] = _Pending()
+        if not leader:
+            pending.done.wait(self.timeout[0] + self.timeout[1])
+            return pending.netid
+
+        try:
+            pending.netid = self._validate_upstream(ticket, service_url)
+            if pending.netid:
+                self.tickets.set(key, pending.netid)
+            return pending.netid
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            pending.done.set()
+
+    def _validate_upstream(self, ticket, service_url):
+        import requests
+
+        try:
+            with metrics.outbound('cas'):
+                response = self.session.get(f'{self.server_url}/serviceValidate',
+                                            params={'ticket': ticket, 'service': service_url},
+                                            timeout=self.timeout)
+        except requests.exceptions.Timeout:
+            logger.error('CAS validation timeout')
+            return None
+        except requests.exceptions.RequestException as e:
+            logger.error(f'CAS validation request error: {str(e)}')
+            return None
+
+        if response.status_code != 200:
+            logger.error(f'CAS validation failed with status code: {response.status_code}')
+            return None
+        netid, failure = parse_service_response(response.text)
+        if failure:
+            logger.warning(f'CAS rejected ticket: {failure}')
+            logger.debug(f'CAS response: {response.text[:500]}')
+        return netid
+
+    def close(self):
+        self.session.close()
+
+
+class _Pending:
+    def __init__(self):
+        self.done = threading.Event()
+        self.netid = None
+
+
+_clients_lock = threading.Lock()
+
+
+def get_cas_client():
+    """The current app's CASClient, created on first use."""
+    client = current_app.extensions.get('cas_client')
+    if client is None:
+        with _clients_lock:
+            client = current_app.extensions.get('cas_client')
+            if client is None:
+                client = current_app.extensions['cas_client'] = CASClient.from_config(current_app.config)
+    return client
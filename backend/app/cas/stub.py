@@ -0,0 +1,102 @@
+"""A local stand-in for the CAS server, for tests and load runs.
+
+    with StubCASServer() as cas:
+        cas.add_ticket('ST-1', 'tiger1')
+        app.config['CAS_URL'] = cas.url
+
+Serves /serviceValidate with real CAS 2.0 XML. Like the real server, each
+ticket validates once. It counts requests and TCP connections so callers can
+check keep-alive and caching, and can fail the next N requests with a 503 or
+delay every response.
+"""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from xml.sax.saxutils import escape
+
+_SUCCESS = ('<cas:serviceResponse xmlns:cas="http://www.yale.edu/tp/cas">'
+            '<cas:authenticationSuccess><cas:user>{netid}</cas:user></cas:authenticationSuccess>'
+            '</cas:serviceResponse>')
+_FAILURE = ('<cas:serviceResponse xmlns:cas="http://www.yale.edu/tp/cas">'
+            '<cas:authenticationFailure code="INVALID_TICKET">Ticket {ticket} not recognized'
+            '</cas:authenticationFailure></cas:serviceResponse>')
+
+
+class StubCASServer:
+    def __init__(self, host='127.0.0.1', port=0, delay=0.0):
+        self.delay = delay
+        self.tickets = {}
+        self.requests = 0
+        self.connections = 0
+        self.fail_next = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def add_ticket(self, ticket, netid):
+        with self._lock:
+            self.tickets[ticket] = netid
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _respond(self, path, query):
+        with self._lock:
+            self.requests += 1
+            if self.fail_next:
+                self.fail_next -= 1
+                return 503, 'unavailable'
+            if not path.endswith('/serviceValidate'):
+                return 404, 'not found'
+            ticket = query.get('ticket', [''])[0]
+            netid = self.tickets.pop(ticket, None)
+        if netid is None:
+            return 200, _FAILURE.format(ticket=escape(ticket))
+        return 200, _SUCCESS.format(netid=escape(netid))
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                with stub._lock:
+                    stub.connections += 1
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                status, body = stub._respond(parsed.path, parse_qs(parsed.query))
+                if stub.delay:
+                    time.sleep(stub.delay)
+                data = body.encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/xml; charset=utf-8')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -3,7 +3,7 @@ from datetime import timedelta
 from dotenv import load_dotenv
 import logging
 from logging.handlers import RotatingFileHandler
-from sqlalchemy.pool import NullPool
+from app.utils.db_pool import engine_options
 
 load_dotenv()
 
@@ -14,34 +14,52 @@ class Config:
     # JWT config
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'dev'
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=1)
+    # Per-process caches of verified tokens and user records (0 disables)
+    AUTH_TOKEN_CACHE_SIZE = 4096
+    AUTH_TOKEN_CACHE_TTL = 300
+    AUTH_USER_CACHE_SIZE = 4096
+    AUTH_USER_CACHE_TTL = 60
+    AUTH_NETID_CACHE_SIZE = 8192
+    AUTH_NETID_CACHE_TTL = 300
     
     # Database config
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///app.db'
     if SQLALCHEMY_DATABASE_URI and SQLALCHEMY_DATABASE_URI.startswith("postgres://"):
         SQLALCHEMY_DATABASE_URI = SQLALCHEMY_DATABASE_URI.replace("postgres://", "postgresql://", 1)
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    # SQLAlchemy engine options. For serverless platforms (Vercel) we prefer NullPool
-    # to avoid exhausting database connections from short-lived function invocations.
+    # Serverless platforms (Vercel) run many short-lived containers; each one
+    # keeps a single connection to a transaction-mode pooler rather than a
+    # pool of its own against Postgres. See app/utils/db_pool.py.
     IS_SERVERLESS = os.environ.get('VERCEL') == '1' or os.environ.get('SERVERLESS') == '1'
-
-    if IS_SERVERLESS:
-        # Use NullPool for serverless environments; keep connect_args minimal.
-        SQLALCHEMY_ENGINE_OPTIONS = {
-            'poolclass': NullPool,
-            'connect_args': {}
-        }
-    else:
-        SQLALCHEMY_ENGINE_OPTIONS = {
-            'pool_size': 10,
-            'max_overflow': 2,
-            'pool_recycle': 300,
-            'pool_pre_ping': True,
-            'pool_timeout': 30
-        }
+    DB_POOL_MODE = os.environ.get('DB_POOL_MODE') or ('pooler' if IS_SERVERLESS else 'queue')
+    # e.g. Supabase's Supavisor on port 6543, or PgBouncer with pool_mode=transaction
+    DATABASE_POOLER_URL = os.environ.get('DATABASE_POOLER_URL')
+    if DB_POOL_MODE == 'pooler' and DATABASE_POOLER_URL:
+        SQLALCHEMY_DATABASE_URI = DATABASE_POOLER_URL.replace("postgres://", "postgresql://", 1)
+    # Open the pooled connection in the background at cold start
+    DB_WARM_ON_START = os.environ.get('DB_WARM_ON_START', '1' if DB_POOL_MODE == 'pooler' else '0') == '1'
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(
+        DB_POOL_MODE, SQLALCHEMY_DATABASE_URI,
+        pool_size=int(os.environ.get('DB_POOL_SIZE', 10)),
+        max_overflow=int(os.environ.get('DB_MAX_OVERFLOW', 2)))
+    # Register Flask-Migrate (and import Alembic) at startup; the serverless
+    # function never runs migrations, see run_migrations.py
+    ENABLE_MIGRATIONS = os.environ.get('ENABLE_MIGRATIONS', '0' if IS_SERVERLESS else '1') == '1'
     
     # File upload config
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'uploads')
+    # Image storage: 'cloudinary' or 'local' (UPLOAD_FOLDER, for development)
+    UPLOAD_STORAGE = os.environ.get('UPLOAD_STORAGE') or (
+        'cloudinary' if os.environ.get('CLOUDINARY_CLOUD_NAME') else 'local')
+    UPLOAD_BASE_URL = os.environ.get('UPLOAD_BASE_URL')
+    UPLOAD_MAX_DIMENSION = 2048  # longest edge after normalization, in pixels
+    UPLOAD_JPEG_QUALITY = 82
+    # Derivatives of each full-size image (longest edge, px): Cloudinary
+    # transformations, or rendered at upload for local files
+    UPLOAD_VARIANTS = {'thumb': 200, 'card': 480}
+    UPLOAD_FORMATS = ('webp', 'jpeg')
+    UPLOAD_MAX_WORKERS = int(os.environ.get('UPLOAD_MAX_WORKERS', 6))
     
     # Email config
     MAIL_SERVER = 'smtp.gmail.com'
@@ -51,6 +69,53 @@ class Config:
     MAIL_PASSWORD = 'vvtb vsht wwro tvlb'
     MAIL_DEFAULT_SENDER = ('TigerPop', "tigerpopmarketplace@gmail.com")
 
+    # Email outbox: 'thread' (background dispatcher per worker), 'inline'
+    # (send the request's own message after it commits) or 'external'
+    # (`flask outbox run`, or `flask outbox drain` from cron). Serverless
+    # functions can't keep a thread alive past the response, and requests
+    # there only enqueue.
+    OUTBOX_DISPATCH = os.environ.get('OUTBOX_DISPATCH') or ('external' if IS_SERVERLESS else 'thread')
+    OUTBOX_MAX_ATTEMPTS = 6
+    OUTBOX_BACKOFF_SECONDS = 30
+
+    # Response cache for listing reads: 'memory' (per-process LRU), 'redis' or 'null'
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memory')
+    CACHE_REDIS_URL = os.environ.get('REDIS_URL')
+    CACHE_DEFAULT_TTL = int(os.environ.get('CACHE_DEFAULT_TTL', 30))
+    CACHE_MAX_ENTRIES = 2048
+    # Streamed responses larger than this are sent but not cached
+    CACHE_MAX_BODY_BYTES = 1024 * 1024
+
+    # Listings per yield_per batch for streamed collections
+    LISTING_STREAM_BATCH_SIZE = 200
+    # Listings per transaction (one multi-row INSERT each) in bulk imports
+    BULK_IMPORT_BATCH_SIZE = 500
+    # Upper edges of the price buckets in /api/listing/facets; the last bucket is open
+    FACET_PRICE_BUCKETS = (10, 25, 50, 100)
+    # GET /api/listing/?explain=1 returns the query plan (always on in debug)
+    LISTING_EXPLAIN = os.environ.get('LISTING_EXPLAIN') == '1'
+
+    # Prometheus metrics at METRICS_PATH (see utils/metrics), served only to
+    # requests bearing METRICS_TOKEN (or to anyone in debug); without a token
+    # the /internal endpoints answer 404
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+    METRICS_PATH = '/internal/metrics'
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    # Server-Timing response header (always on in debug)
+    SERVER_TIMING = os.environ.get('SERVER_TIMING') == '1'
+
+    # Tag each statement with the route that ran it (sqlcommenter comments)
+    SQL_COMMENTS = os.environ.get('SQL_COMMENTS', '1') == '1'
+    # Log statements slower than this (0 turns the log off) and EXPLAIN them
+    # in the background; see utils/slow_queries
+    SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 250))
+    # The EXPLAIN thread takes a connection of its own, which a one-connection
+    # serverless pool can't spare
+    SLOW_QUERY_EXPLAIN = os.environ.get(
+        'SLOW_QUERY_EXPLAIN', '0' if DB_POOL_MODE in ('pooler', 'null') else '1') == '1'
+    SLOW_QUERY_EXPLAIN_INTERVAL = 300
+    SLOW_QUERY_LOG_SIZE = 100
+
     # Logging configuration
     LOG_TO_STDOUT = os.environ.get('LOG_TO_STDOUT', True)  # Default to True for Heroku
     LOG_LEVEL = logging.INFO
@@ -59,14 +124,6 @@ class Config:
     LOG_MAX_BYTES = 1024 * 1024  # 1MB
     LOG_BACKUP_COUNT = 10
     
-    # Ensure upload directory exists
-    if not os.path.exists(UPLOAD_FOLDER):
-        try:
-            os.makedirs(UPLOAD_FOLDER)
-        except Exception:
-            # On Heroku, we can't create directories
-            pass
-
     # Additional config
     CLOUDINARY_CLOUD_NAME = os.environ.get('CLOUDINARY_CLOUD_NAME')
     CLOUDINARY_API_KEY = os.environ.get('CLOUDINARY_API_KEY')
@@ -74,3 +131,10 @@ class Config:
     FRONTEND_URL = os.environ.get('FRONTEND_URL') or 'http://localhost:3000'
     SERVICE_URL = os.environ.get('SERVICE_URL') or 'http://localhost:5000'
     CAS_URL = os.environ.get('CAS_URL') or 'https://fed.princeton.edu/cas'
+    CAS_TIMEOUT = (3.05, 10)  # connect, read (seconds)
+    CAS_RETRIES = 2
+    CAS_POOL_SIZE = 10
+    CAS_TICKET_CACHE_SIZE = 1024
+    CAS_TICKET_CACHE_TTL = 60
+    # Accept any ST- ticket as "testuser"; local development only
+    CAS_DEV_TICKETS = os.environ.get('CAS_DEV_TICKETS') == '1'
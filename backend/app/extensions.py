@@ -1,16 +1,40 @@
+from flask import current_app
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
-from flask_jwt_extended import JWTManager
-from flask_mail import Mail
+from .utils.auth_cache import CachingJWTManager
+from .utils.cache import ResponseCache
+
+
+class LazyMail:
+    """Flask-Mail's Mail, imported and configured from app.config on first use.
+
+    Only the outbox dispatcher sends mail, so request handlers (and serverless
+    cold starts) never load flask_mail, smtplib or the email package.
+    """
+
+    def __init__(self):
+        self._mail = None
+
+    def __getattr__(self, name):
+        from flask_mail import Mail
+
+        if self._mail is None:
+            self._mail = Mail()
+        if 'mail' not in current_app.extensions:
+            self._mail.init_app(current_app)
+        return getattr(self._mail, name)
+
 
 # Initialize extensions
 db = SQLAlchemy()
-migrate = Migrate()
-jwt = JWTManager()
-mail = Mail()
+jwt = CachingJWTManager()
+mail = LazyMail()
+cache = ResponseCache()
 
 def init_extensions(app):
     db.init_app(app)
-    migrate.init_app(app, db)
+    # Flask-Migrate pulls in Alembic; only processes that run `flask db` need it
+    if app.config.get('ENABLE_MIGRATIONS', True):
+        from flask_migrate import Migrate
+        Migrate(app, db)
     jwt.init_app(app)
-    mail.init_app(app) 
\ No newline at end of file
+    cache.init_app(app)
@@ -1,4 +1,5 @@
 from .user import User
-from .listing import Listing, ListingImage, HeartedListing
+from .listing import Listing, ListingImage, ImageDerivative, HeartedListing
+from .outbox import OutboxMessage
 
-__all__ = ['User', 'Listing', 'ListingImage', 'HeartedListing'] 
\ No newline at end of file
+__all__ = ['User', 'Listing', 'ListingImage', 'ImageDerivative', 'HeartedListing', 'OutboxMessage']
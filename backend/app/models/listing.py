@@ -4,6 +4,24 @@ from .user import User
 
 class Listing(db.Model):
     __tablename__ = 'listings'
+    # Each index backs a specific access pattern (see utils/listing_query for
+    # the feed's); keep in sync with the migrations.
+    __table_args__ = (
+        # Feed: ORDER BY created_at DESC, id DESC (keyset pagination)
+        db.Index('ix_listings_created_at_id', db.text('created_at DESC'), db.text('id DESC')),
+        # Feed filtered to one status, newest first
+        db.Index('ix_listings_status_created_at', 'status', db.text('created_at DESC')),
+        # Seller and buyer dashboards, newest first
+        db.Index('ix_listings_user_id_created_at', 'user_id', db.text('created_at DESC')),
+        db.Index('ix_listings_buyer_id_created_at', 'buyer_id', db.text('created_at DESC')),
+        # Case-insensitive category match, newest first
+        db.Index('ix_listings_category_created_at', db.text('lower(category)'),
+                 db.text('created_at DESC'), db.text('id DESC')),
+        # Case-insensitive category match, by price (range and/or price sort)
+        db.Index('ix_listings_category_price', db.text('lower(category)'), 'price', 'id'),
+        # Price range and price sorts on their own
+        db.Index('ix_listings_price', 'price', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
@@ -14,7 +32,12 @@ class Listing(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
     buyer_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Bumped on every change to the row; backs ETag / Last-Modified validators
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     condition = db.Column(db.String(50), nullable=True)
+    # Hearts on this listing, kept in step with hearted_listings by
+    # utils/hearts.py's UPDATE ... SET heart_count = heart_count +/- 1
+    heart_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
     # Add relationship with ListingImage
     images = db.relationship('ListingImage', backref='listing', lazy=True, cascade='all, delete-orphan')
@@ -42,7 +65,8 @@ class Listing(db.Model):
             'buyer_id': self.buyer_id,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'images': [image.filename for image in self.images],
-            'condition': self.condition
+            'condition': self.condition,
+            'heart_count': self.heart_count
         }
     
     def __repr__(self):
@@ -53,7 +77,7 @@ class ListingImage(db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     filename = db.Column(db.String(255), nullable=False)
-    listing_id = db.Column(db.Integer, db.ForeignKey('listings.id'), nullable=False)
+    listing_id = db.Column(db.Integer, db.ForeignKey('listings.id'), nullable=False, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     def __init__(self, filename, listing_id):
@@ -63,8 +87,42 @@ class ListingImage(db.Model):
     def __repr__(self):
         return f'<ListingImage {self.filename}>'
 
+class ImageDerivative(db.Model):
+    """One resized/re-encoded copy of a listing image.
+
+    Keyed by the source URL stored in ListingImage.filename: derivatives are
+    recorded at upload time, before the listing (and its ListingImage rows)
+    exists. Local storage renders and stores them then; on Cloudinary they
+    are transformation URLs of the one uploaded original.
+    """
+    __tablename__ = 'image_derivatives'
+    __table_args__ = (
+        # Also serves lookups by source_url alone
+        db.UniqueConstraint('source_url', 'variant', 'format', name='uq_image_derivatives_source_variant_format'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    source_url = db.Column(db.String(255), nullable=False)
+    variant = db.Column(db.String(20), nullable=False)  # 'full', 'card', 'thumb'
+    format = db.Column(db.String(10), nullable=False)   # 'jpeg', 'webp'
+    url = db.Column(db.String(255), nullable=False)
+    width = db.Column(db.Integer, nullable=False)
+    height = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ImageDerivative {self.variant}/{self.format} of {self.source_url}>'
+
 class HeartedListing(db.Model):
     __tablename__ = 'hearted_listings'
+    __table_args__ = (
+        # A user's hearted feed, most recently hearted first
+        db.Index('ix_hearted_listings_user_id_created_at', 'user_id', db.text('created_at DESC')),
+        # Hearts on a listing (counts, cascades when a listing is deleted)
+        db.Index('ix_hearted_listings_listing_id', 'listing_id'),
+        # One heart per user and listing; heart/unheart rely on it for ON CONFLICT
+        db.UniqueConstraint('user_id', 'listing_id', name='uq_hearted_listings_user_listing'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -5,12 +5,12 @@ from ..extensions import db
 from ..models import User
 from sqlalchemy import text
 import logging
-from sqlalchemy import create_engine
 from sqlalchemy.exc import OperationalError
 import os
 
 # Import CAS helpers for ticket validation and token generation
 from ..cas.auth import validate_cas_ticket, create_or_update_user, generate_jwt_token
+from ..utils.auth_cache import get_cached_user
 
 bp = Blueprint('auth', __name__)
 logger = logging.getLogger(__name__)
@@ -21,18 +21,11 @@ def test_db():
     try:
         logger.info("Starting database connection test")
         
-        # Set a shorter timeout for the query
-        # Get the database URL from config
-        db_url = db.engine.url
-        logger.info(f"Using database URL: {db_url}")
-        
-        # Create a new engine with a timeout
-        engine = create_engine(db_url, connect_args={'connect_timeout': 10})
-        
-        # Try to execute a simple query with the new engine
-        with engine.connect() as conn:
+        # Go through the app's pool: a throwaway engine would pay a fresh
+        # connect (and, behind a pooler, a fresh client slot) on every call
+        with db.engine.connect() as conn:
             logger.info("Executing test query")
-            result = conn.execute(text('SELECT 1'))
+            conn.execute(text('SELECT 1'))
             logger.info("Query executed successfully")
             return jsonify({'status': 'success', 'message': 'Database connection is working'}), 200
             
@@ -99,7 +92,7 @@ def login():
         if not user or not user.password_hash or not check_password_hash(user.password_hash, password):
             return jsonify({'message': 'Invalid username or password'}), 401
 
-        access_token = create_access_token(identity=user.id)
+        access_token = create_access_token(identity=str(user.id))
         return jsonify({
             'access_token': access_token,
             'user': {
@@ -140,24 +133,26 @@ def validate_ticket():
 @bp.route('/verify', methods=['GET'])
 @jwt_required()
 def verify_token():
-    """Verify the JWT token and return consolidated user info."""
+    """Verify the JWT token and return consolidated user info.
+
+    The token's claims carry user_id and netid; the rest comes from the
+    per-process user cache, so a warm call doesn't touch the database.
+    """
     try:
-        current_user_id = get_jwt_identity()
-        logger.info(f"Verifying token for user_id: {current_user_id}")
+        current_user_id = int(get_jwt_identity())
 
-        user = User.query.get(current_user_id)
+        user = get_cached_user(current_user_id)
         if not user:
             logger.error(f"User id {current_user_id} not found")
             return jsonify({'error': 'Invalid token user'}), 401
 
         additional_claims = get_jwt()
-        netid = additional_claims.get('netid') or user.netid
+        netid = additional_claims.get('netid') or user['netid']
 
-        logger.info(f"Token verified successfully for user: {user}")
         return jsonify({
-            'username': user.username,
-            'email': user.email,
-            'user_id': user.id,
+            'username': user['username'],
+            'email': user['email'],
+            'user_id': current_user_id,
             'netid': netid
         }), 200
     except Exception as e:
@@ -1,35 +1,121 @@
-from flask import Blueprint, request, jsonify, current_app, session
+from flask import (Blueprint, Response, request, jsonify, current_app, session, send_from_directory,
+                   stream_with_context)
 from werkzeug.utils import secure_filename
 import os
-from ..extensions import db, mail
+from ..extensions import db, cache
 from ..models import Listing, ListingImage, User, HeartedListing
+from ..serializers import serialize_listing, serialize_listings, stream_listings, stream_listings_ndjson
 from datetime import datetime
-from sqlalchemy import and_, or_
-from flask_mail import Message
-from ..utils.cloudinary_config import upload_image
+from sqlalchemy import and_, or_, func
+from sqlalchemy.orm import selectinload
+from ..utils.pagination import keyset_page, parse_limit
+from ..utils.search import search_listings
+from ..utils.cache import feed_tag, listing_scope, make_validator
+from ..utils.outbox import outbox
+from ..utils.uploads import process_uploads
+from ..utils.derivatives import record_derivatives
+from ..utils.explain import explain, indexes_used
+from ..utils import hearts, listing_query, listing_status
+from ..utils.errors import ListingNotFound, ListingUnavailable
+from ..utils.facets import CATEGORIES, facet_counts
+from ..utils.listing_fields import InvalidField, clean_images, normalize_category
+from ..utils.bulk import detect_format, export_query, import_listings, read_rows, text_stream
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 import base64
 import io
-from PIL import Image
 import json
 
 bp = Blueprint('listing', __name__)
 
 # Configure upload settings
-UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'uploads')
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 
-if not os.path.exists(UPLOAD_FOLDER):
-    os.makedirs(UPLOAD_FOLDER)
-
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def _requested_variants():
+    """Image sizes asked for with ?variants=thumb,card (None means all)."""
+    raw = request.args.get('variants')
+    return [v for v in raw.split(',') if v] if raw else None
+
+def _stream_listings(query):
+    """Respond with `query`'s listings as a JSON array streamed batch by batch."""
+    chunks = stream_listings(query, variants=_requested_variants(),
+                             batch_size=current_app.config['LISTING_STREAM_BATCH_SIZE'])
+    return Response(stream_with_context(chunks), mimetype='application/json')
+
+def _owner_tags(kind):
+    """Cache tags for /user and /buyer reads, keyed by id or by netid."""
+    def tags(**_):
+        raw_id = request.args.get(f'{kind}_id')
+        if raw_id:
+            try:
+                return [f'{kind}:{int(raw_id)}']
+            except ValueError:
+                return [f'{kind}:invalid']
+        return [f'{kind}-netid:{request.args.get("netid")}']
+    return tags
+
+def _feed_filters():
+    """The feed's validated filters; None when the arguments are invalid."""
+    try:
+        return listing_query.parse_filters(request.args)
+    except ValueError:
+        return None
+
+def _feed_tags():
+    filters = _feed_filters()
+    if filters is None or not filters.categories:
+        return [feed_tag()]
+    return [feed_tag(category) for category in filters.categories]
+
+def _feed_validator():
+    """Validator for feed and facet reads; None lets the view report bad input."""
+    filters = _feed_filters()
+    return _collection_validator(*listing_query.criteria(filters)) if filters else None
+
+def _collection_validator(*criteria):
+    """ETag/Last-Modified for the listings matching `criteria`, from one aggregate.
+
+    Any insert, update or delete among those rows changes the count, the
+    newest updated_at or the highest id, so the rows never need loading.
+    Deletions don't move max(updated_at), hence exact_date=False. The
+    aggregate scans every matching row, so the paged feed registers it with
+    conditional_only and runs it only for revalidations.
+    """
+    count, last_updated, max_id = (db.session
+        .query(func.count(Listing.id), func.max(Listing.updated_at), func.max(Listing.id))
+        .filter(*criteria)
+        .one())
+    return make_validator(cache.request_key('etag'), count, last_updated, max_id,
+                          last_modified=last_updated, exact_date=False)
+
+def _owner_validator(kind):
+    """Validator for /user and /buyer reads; None lets the view report bad input."""
+    column = Listing.user_id if kind == 'user' else Listing.buyer_id
+    def validator(**_):
+        raw_id = request.args.get(f'{kind}_id')
+        netid = request.args.get('netid')
+        if raw_id:
+            try:
+                return _collection_validator(column == int(raw_id))
+            except ValueError:
+                return None
+        if netid:
+            owner_id = db.session.query(User.id).filter(User.netid == netid).scalar_subquery()
+            return _collection_validator(column == owner_id)
+        return None
+    return validator
+
+def _listing_validator(id):
+    updated_at = db.session.query(Listing.updated_at).filter(Listing.id == id).scalar()
+    if updated_at is None:
+        return None
+    return make_validator('listing', id, updated_at, last_modified=updated_at)
+
 @bp.route('/upload', methods=['POST'])
 def upload_images():
     try:
-        current_app.logger.info("Starting image upload process...")
-        
         # Get the image data from the request
         files = request.files.getlist('images')
         current_app.logger.info(f"Received {len(files)} files")
@@ -38,33 +124,55 @@ def upload_images():
             current_app.logger.warning("No images provided in request")
             return jsonify({'error': 'No images provided'}), 400
 
-        image_urls = []
         for file in files:
-            current_app.logger.info(f"Processing file: {file.filename}")
-            if file and allowed_file(file.filename):
-                try:
-                    # Upload to Cloudinary using our utility function
-                    current_app.logger.info(f"Uploading {file.filename} to Cloudinary...")
-                    upload_result = upload_image(file)
-                    secure_url = upload_result['secure_url']
-                    current_app.logger.info(f"Upload successful, URL: {secure_url}")
-                    image_urls.append(secure_url)
-                except Exception as upload_error:
-                    current_app.logger.error(f"Failed to upload {file.filename}: {str(upload_error)}")
-                    raise upload_error
-            else:
+            if not (file and allowed_file(file.filename)):
                 current_app.logger.warning(f"Invalid file type for {file.filename}")
                 return jsonify({'error': f'Invalid file type for {file.filename}'}), 400
-        
-        current_app.logger.info(f"Successfully uploaded {len(image_urls)} images")
-        return jsonify({'urls': image_urls}), 200
+
+        # Normalize and upload all files concurrently
+        results = process_uploads(files)
+        image_urls = [r['url'] for r in results if r['ok']]
+        for r in results:
+            if not r['ok']:
+                current_app.logger.error(f"Failed to upload {r['filename']}: {r['error']}")
+
+        if not image_urls:
+            # Files that aren't readable images are the client's error;
+            # a failing storage backend is ours
+            status = 400 if all(r['rejected'] for r in results) else 500
+            return jsonify({'error': results[0]['error'], 'results': results}), status
+
+        # Derivative URLs are keyed by the full-size URL the listing will store
+        try:
+            record_derivatives(results)
+            db.session.commit()
+        except Exception as e:
+            # The images are stored either way; `flask images backfill` renders
+            # derivatives for any image without them
+            db.session.rollback()
+            current_app.logger.error(f"Failed to record image derivatives: {str(e)}")
+        for r in results:
+            r.pop('renditions', None)
+
+        current_app.logger.info(f"Successfully uploaded {len(image_urls)} of {len(results)} images")
+        # 207 tells the client some files failed; the rest are usable
+        status = 200 if len(image_urls) == len(results) else 207
+        return jsonify({'urls': image_urls, 'results': results}), status
     except Exception as e:
         current_app.logger.error(f"Error uploading images: {str(e)}")
         current_app.logger.exception("Full traceback:")
         return jsonify({'error': str(e)}), 500
 
+@bp.route('/uploads/<path:filename>', methods=['GET'])
+def get_uploaded_image(filename):
+    # Only used with UPLOAD_STORAGE=local; Cloudinary serves its own URLs
+    return send_from_directory(current_app.config['UPLOAD_FOLDER'], filename, max_age=31536000)
+
 @bp.route('/test-upload', methods=['POST'])
 def test_upload():
+    from PIL import Image
+    from ..utils.cloudinary_config import upload_image
+
     try:
         # Get the base64 image data from the request
         image_data = request.json.get('image')
@@ -98,41 +206,83 @@ def test_upload():
         return jsonify({'error': str(e)}), 500
 
 @bp.route('/', methods=['GET'])
+@cache.cached('feed', _feed_tags, validator=_feed_validator, conditional_only=True)
 def get_listings():
     try:
         # Get query parameters for filtering
-        max_price = request.args.get('max_price', type=float)
-        category = request.args.get('category')
+        search = request.args.get('search', '').strip()
+        cursor = request.args.get('cursor')
+        raw_limit = request.args.get('limit')
+        try:
+            filters = listing_query.parse_filters(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        # Start with base query
-        query = Listing.query
+        # Start with base query; images are loaded for the whole page in one
+        # extra SELECT ... WHERE listing_id IN (...) instead of one per row
+        query = Listing.query.options(selectinload(Listing.images))
         
         # Apply filters if they exist
-        if max_price:
-            query = query.filter(Listing.price <= max_price)
-        if category:
-            query = query.filter(Listing.category.ilike(category))
+        query = query.filter(*listing_query.criteria(filters))
+
+        if request.args.get('explain'):
+            return _explain_feed(query, filters, raw_limit, search)
+
+        # Search mode: ranked full-text matches, best first
+        if search:
+            if cursor:
+                return jsonify({'error': 'cursor cannot be combined with search'}), 400
+            if request.args.get('sort'):
+                return jsonify({'error': 'sort cannot be combined with search'}), 400
+            if raw_limit:
+                try:
+                    limit = parse_limit(raw_limit)
+                except ValueError as e:
+                    return jsonify({'error': str(e)}), 400
+                listings = search_listings(query, db.session, search, limit=limit)
+                return jsonify({
+                    'listings': serialize_listings(listings, variants=_requested_variants()),
+                    'next_cursor': None
+                })
+            listings = search_listings(query, db.session, search)
+            return jsonify(serialize_listings(listings, variants=_requested_variants()))
+
+        # Feed mode: keyset pagination on (sort key, id)
+        if cursor or raw_limit:
+            sort = listing_query.SORTS[filters.sort]
+            try:
+                limit = parse_limit(raw_limit)
+                listings, next_cursor = keyset_page(query, Listing, cursor=cursor, limit=limit,
+                                                    key=sort.key, descending=sort.descending)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            return jsonify({
+                'listings': serialize_listings(listings, variants=_requested_variants()),
+                'next_cursor': next_cursor
+            })
             
-        # Get all listings
-        listings = query.order_by(Listing.created_at.desc()).all()
-        
-        # Convert to dictionary format
-        return jsonify([{
-            'id': listing.id,
-            'title': listing.title,
-            'description': listing.description,
-            'price': listing.price,
-            'category': listing.category,
-            'status': listing.status,
-            'user_id': listing.user_id,
-            'created_at': listing.created_at.isoformat() if listing.created_at else None,
-            'images': [image.filename for image in listing.images],  # Include image URLs
-            'condition': listing.condition
-        } for listing in listings])
+        # Get all listings, streamed in batches
+        return _stream_listings(query.order_by(*listing_query.order_by(filters)))
     except Exception as e:
         current_app.logger.error(f"Error fetching listings: {str(e)}")
         return jsonify({'error': 'Failed to fetch listings'}), 500
 
+def _explain_feed(query, filters, raw_limit, search):
+    """Debug mode: the plan for the feed's (first page) query instead of its rows."""
+    if not (current_app.debug or current_app.config['LISTING_EXPLAIN']):
+        return jsonify({'error': 'explain is only available in debug mode'}), 403
+    if search:
+        return jsonify({'error': 'explain does not support search'}), 400
+    query = query.order_by(*listing_query.order_by(filters))
+    if raw_limit:
+        try:
+            query = query.limit(parse_limit(raw_limit) + 1)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    sql, plan = explain(query, db.session, with_sql=True)
+    return jsonify({'sql': sql, 'plan': plan, 'index': listing_query.supporting_index(filters),
+                    'indexes_used': indexes_used(plan), 'filters': filters._asdict()})
+
 @bp.route('', methods=['POST'])
 @bp.route('/', methods=['POST'])
 def create_listing():
@@ -142,6 +292,7 @@ def create_listing():
             data = request.get_json()
         else:
             data = request.form.to_dict()
+            data['images'] = request.form.getlist('images')
 
         # Get required fields
         title = data.get('title')
@@ -155,6 +306,11 @@ def create_listing():
         # Validate required fields
         if not all([title, description, price, user_id]):
             return jsonify({'error': 'Missing required fields'}), 400
+        try:
+            images = clean_images(images)
+            category = normalize_category(category)
+        except InvalidField as e:
+            return jsonify({'error': str(e)}), 400
 
         try:
             # Validate price
@@ -162,7 +318,8 @@ def create_listing():
             if price <= 0:
                 return jsonify({'error': 'Price must be greater than 0'}), 400
 
-            # Create new listing
+            # Create new listing, with its images attached through the
+            # relationship so one flush writes both
             new_listing = Listing(
                 title=title,
                 description=description,
@@ -172,30 +329,19 @@ def create_listing():
                 user_id=user_id,
                 condition=condition
             )
-
-            # Add listing to database
+            new_listing.images = [ListingImage(filename=url, listing_id=None) for url in images]
             db.session.add(new_listing)
-            db.session.commit()
+            db.session.flush()
 
-            # Handle images if provided
-            if images:
-                for url in images:
-                    image = ListingImage(filename=url, listing_id=new_listing.id)
-                    db.session.add(image)
-                db.session.commit()
+            # Serialize before committing: the ids came back from the INSERTs
+            # and the images collection is already loaded, whereas commit
+            # would expire both and the response would reload them
+            payload = serialize_listing(new_listing)
+            scope = listing_scope(new_listing)
+            db.session.commit()
 
-            return jsonify({
-                'id': new_listing.id,
-                'title': new_listing.title,
-                'description': new_listing.description,
-                'price': new_listing.price,
-                'category': new_listing.category,
-                'status': new_listing.status,
-                'user_id': new_listing.user_id,
-                'images': [image.filename for image in new_listing.images],
-                'condition': new_listing.condition,
-                'created_at': new_listing.created_at.isoformat() if new_listing.created_at else None
-            }), 201
+            cache.invalidate_listings(scope)
+            return jsonify(payload), 201
 
         except Exception as db_error:
             db.session.rollback()
@@ -206,15 +352,70 @@ def create_listing():
         current_app.logger.error(f"Error creating listing: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@bp.route('/bulk', methods=['POST'])
+@jwt_required()
+def bulk_import_listings():
+    """Create many listings from an NDJSON or CSV body, or an uploaded `file`."""
+    try:
+        upload = request.files.get('file')
+        if upload:
+            fmt = detect_format(upload.mimetype, upload.filename)
+            stream = upload.stream
+        else:
+            fmt = detect_format(request.mimetype)
+            stream = request.stream
+        results = import_listings(read_rows(text_stream(stream), fmt), int(get_jwt_identity()))
+        if not results:
+            return jsonify({'error': 'No rows provided'}), 400
+
+        created = sum(1 for r in results if r['ok'])
+        # 207 tells the client some rows failed; the rest were created
+        status = 201 if created == len(results) else 207 if created else 400
+        return jsonify({'created': created, 'failed': len(results) - created, 'results': results}), status
+    except UnicodeDecodeError:
+        return jsonify({'error': 'Body must be UTF-8'}), 400
+    except Exception as e:
+        current_app.logger.error(f"Error importing listings: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/export', methods=['GET'])
+@jwt_required()
+def export_listings():
+    """Stream listings as NDJSON, filtered by ?status=, ?user_id= and ?since= (ISO time)."""
+    try:
+        since = request.args.get('since')
+        since = datetime.fromisoformat(since) if since else None
+        user_id = request.args.get('user_id', type=int)
+    except ValueError:
+        return jsonify({'error': 'since must be an ISO 8601 timestamp'}), 400
+
+    query = export_query(status=request.args.get('status'), since=since, user_id=user_id)
+    chunks = stream_listings_ndjson(query, batch_size=current_app.config['LISTING_STREAM_BATCH_SIZE'])
+    return Response(stream_with_context(chunks), mimetype='application/x-ndjson')
+
 @bp.route('/categories', methods=['GET'])
 def get_categories():
-    categories = [
-        'tops', 'bottoms', 'dresses', 'shoes',
-        'furniture', 'appliances', 'books', 'other'
-    ]
-    return jsonify(categories)
+    return jsonify(list(CATEGORIES))
+
+@bp.route('/facets', methods=['GET'])
+# Every facet spans all categories, so any listing write invalidates it
+@cache.cached('facets', lambda: [feed_tag()])
+def get_facets():
+    """Category, condition and price-bucket counts for the feed's current filters."""
+    try:
+        filters = listing_query.parse_filters(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        clauses = listing_query.filter_clauses(filters)
+        status = clauses.pop('status')
+        return jsonify(facet_counts(criteria=[status] if status is not None else [], filters=clauses))
+    except Exception as e:
+        current_app.logger.error(f"Error computing facets: {str(e)}")
+        return jsonify({'error': 'Failed to compute facets'}), 500
 
 @bp.route('/user', methods=['GET'])
+@cache.cached('user', _owner_tags('user'), validator=_owner_validator('user'))
 def get_user_listings():
     try:
         # Prefer numeric user_id, but allow netid as a fallback for compatibility.
@@ -238,28 +439,17 @@ def get_user_listings():
             return jsonify({'error': 'Invalid user_id format'}), 400
 
         # Get all listings for this user by filtering on listing.user_id
-        listings = (Listing.query
-                   .filter(Listing.user_id == uid)
-                   .order_by(Listing.created_at.desc())
-                   .all())
+        query = (Listing.query
+                 .filter(Listing.user_id == uid)
+                 .order_by(Listing.created_at.desc()))
         
-        # Convert to dictionary format
-        return jsonify([{
-            'id': listing.id,
-            'title': listing.title,
-            'description': listing.description,
-            'price': listing.price,
-            'category': listing.category,
-            'status': listing.status,
-            'user_id': listing.user_id,
-            'created_at': listing.created_at.isoformat() if listing.created_at else None,
-            'images': [image.filename for image in listing.images]
-        } for listing in listings])
+        return _stream_listings(query)
     except Exception as e:
         current_app.logger.error(f"Error fetching user listings: {str(e)}")
         return jsonify({'error': 'Failed to fetch user listings'}), 500
 
 @bp.route('/buyer', methods=['GET'])
+@cache.cached('buyer', _owner_tags('buyer'), validator=_owner_validator('buyer'))
 def get_buyer_listings():
     try:
         # Prefer numeric buyer_id, but allow netid as a fallback for compatibility.
@@ -282,30 +472,16 @@ def get_buyer_listings():
             return jsonify({'error': 'Invalid buyer_id format'}), 400
 
         # Query for listings where the given id is the buyer
-        listings = Listing.query.filter_by(buyer_id=bid).order_by(Listing.created_at.desc()).all()
+        query = Listing.query.filter_by(buyer_id=bid).order_by(Listing.created_at.desc())
         
-        # Convert to dictionary format
-        return jsonify([{
-            'id': listing.id,
-            'title': listing.title,
-            'description': listing.description,
-            'price': listing.price,
-            'category': listing.category,
-            'status': listing.status,
-            'user_id': listing.user_id,
-            'buyer_id': listing.buyer_id,
-            'created_at': listing.created_at.isoformat() if listing.created_at else None,
-            'images': [image.filename for image in listing.images],
-            'condition': listing.condition
-        } for listing in listings])
+        return _stream_listings(query)
     except Exception as e:
         current_app.logger.error(f"Error fetching buyer listings: {str(e)}")
         return jsonify({'error': 'Failed to fetch buyer listings'}), 500
 
 @bp.route('/<int:id>/buy', methods=['POST'])
 def request_to_buy(id):
-    listing = Listing.query.get_or_404(id)
-    data = request.get_json()
+    data = request.get_json() or {}
     
     # Convert buyer_id to integer if it's not already
     buyer_id = data.get('buyer_id')
@@ -314,14 +490,19 @@ def request_to_buy(id):
     except (ValueError, TypeError):
         return jsonify({'error': 'Invalid buyer ID format'}), 400
     
-    # Update listing with buyer information
-    listing.buyer_id = buyer_id
-    listing.status = 'pending'
-    db.session.commit()
+    # Claim the listing: only one buyer's UPDATE can match an available row
+    try:
+        listing, before = listing_status.transition(id, listing_status.PENDING, buyer_id=buyer_id)
+    except ListingNotFound:
+        return jsonify({'error': 'Listing not found'}), 404
+    except listing_status.TransitionConflict as e:
+        db.session.rollback()
+        return jsonify({'error': 'Listing is no longer available', 'status': e.current}), 409
 
     # Get seller's and buyer's user records
-    seller = User.query.get(listing.user_id)
-    buyer = User.query.get(buyer_id)
+    users = {u.id: u for u in User.query.filter(User.id.in_({listing.user_id, buyer_id}))}
+    seller = users.get(listing.user_id)
+    buyer = users.get(buyer_id)
 
     # Grab optional fields from the request (message, contact_info)
     buyer_message = data.get('message') or ''
@@ -339,7 +520,9 @@ def request_to_buy(id):
     buyer_contact = buyer.email if (buyer and buyer.email) else (f"{buyer.netid}@princeton.edu" if buyer and buyer.netid else contact_info or 'No contact provided')
 
     if recipient:
-        msg = Message(
+        # Queued in the same transaction as the listing update; the outbox
+        # dispatcher delivers it after commit
+        outbox.enqueue(
             subject=f'TigerPop: New Interest in Your Listing - {listing.title}',
             recipients=[recipient],
             body=f"Someone is interested in your listing '{listing.title}'.\n\nMessage from buyer: {buyer_message}\nContact: {buyer_contact}",
@@ -358,21 +541,14 @@ def request_to_buy(id):
             </div>
             '''
         )
-
-        try:
-            mail.send(msg)
-        except Exception as e:
-            current_app.logger.error(f"Failed to send email: {str(e)}")
-            # don't fail the whole request if mail sending fails, but report it
-            return jsonify({
-                'message': 'Purchase request recorded, but failed to send email',
-                'error': str(e),
-                'listing': {'id': listing.id, 'status': listing.status}
-            }), 207
-
     else:
         current_app.logger.warning(f"Seller has no email address: seller={seller}")
 
+    db.session.commit()
+    cache.invalidate_listings(before, listing_status.scope(listing))
+    if recipient:
+        outbox.notify()
+
     return jsonify({
         'message': 'Purchase request sent successfully',
         'listing': {
@@ -383,24 +559,32 @@ def request_to_buy(id):
 
 @bp.route('/<int:id>/status', methods=['PATCH'])
 def update_listing_status(id):
+    """Sell a listing, or cancel a pending purchase by making it available again."""
+    data = request.get_json() or {}
+    if 'status' not in data:
+        return jsonify({'error': 'Status is required'}), 400
+    if data['status'] not in (listing_status.AVAILABLE, listing_status.SOLD):
+        return jsonify({'error': f"Status must be '{listing_status.AVAILABLE}' or '{listing_status.SOLD}'"}), 400
+
     try:
-        listing = Listing.query.get_or_404(id)
-        data = request.get_json()
-        
-        if 'status' not in data:
-            return jsonify({'error': 'Status is required'}), 400
-            
-        listing.status = data['status']
+        listing, before = listing_status.transition(id, data['status'])
         db.session.commit()
-        
-        return jsonify({
-            'id': listing.id,
-            'status': listing.status
-        })
+    except ListingNotFound:
+        return jsonify({'error': 'Listing not found'}), 404
+    except listing_status.TransitionConflict as e:
+        db.session.rollback()
+        return jsonify({'error': f'Listing is {e.current} and cannot become {e.target}', 'status': e.current}), 409
     except Exception as e:
+        db.session.rollback()
         current_app.logger.error(f"Error updating listing status: {str(e)}")
         return jsonify({'error': 'Failed to update listing status'}), 500
 
+    cache.invalidate_listings(before, listing_status.scope(listing))
+    return jsonify({
+        'id': listing.id,
+        'status': listing.status
+    })
+
 @bp.route('/<int:id>', methods=['DELETE'])
 def delete_listing(id):
     listing = Listing.query.get_or_404(id)
@@ -416,29 +600,19 @@ def delete_listing(id):
         except OSError:
             pass
     
+    scope = listing_scope(listing)
     db.session.delete(listing)
     db.session.commit()
+    cache.invalidate_listings(scope)
     
     return '', 204
 
 @bp.route('/<int:id>', methods=['GET'])
+@cache.cached('listing', lambda id: [f'listing:{id}'], validator=_listing_validator)
 def get_single_listing(id):
     try:
         listing = Listing.query.get_or_404(id)
-        user = User.query.get(listing.user_id)
-        return jsonify({
-            'id': listing.id,
-            'title': listing.title,
-            'description': listing.description,
-            'price': listing.price,
-            'category': listing.category,
-            'status': listing.status,
-            'user_id': listing.user_id,
-            'user_netid': user.netid if user else None,
-            'created_at': listing.created_at.isoformat() if listing.created_at else None,
-            'images': [image.filename for image in listing.images],
-            'condition': listing.condition
-        })
+        return jsonify(serialize_listing(listing, include_seller=True))
     except Exception as e:
         current_app.logger.error(f"Error fetching listing {id}: {str(e)}")
         return jsonify({'error': 'Failed to fetch listing'}), 500
@@ -453,7 +627,7 @@ def notify_seller(id):
             return jsonify({'error': 'Seller not found or no email address available'}), 404
             
         # Change email message here!!
-        msg = Message(
+        outbox.enqueue(
             subject=f'TigerPop: New Interest in Your Listing - {listing.title}',
             recipients=[f'{seller.netid}@princeton.edu'],
             body=f'Someone is interested in your listing "{listing.title}"', 
@@ -469,37 +643,27 @@ def notify_seller(id):
             </div>
             '''
         )
-        # Send email
-        mail.send(msg)
+        db.session.commit()
+        outbox.notify()
         
         return jsonify({
             'message': 'Notification sent successfully',
-            'details': f'Email sent to {seller.netid}@princeton.edu'
+            'details': f'Email queued for {seller.netid}@princeton.edu'
         })
         
     except Exception as e:
-        current_app.logger.error(f"Error sending notification: {str(e)}")
-        error_message = str(e)
-        if "BadCredentials" in error_message:
-            return jsonify({
-                'error': 'Email service configuration error',
-                'details': 'Please contact the administrator to fix the email settings'
-            }), 500
-        elif "Connection refused" in error_message:
-            return jsonify({
-                'error': 'Email service unavailable',
-                'details': 'Please try again later'
-            }), 500
-        else:
-            return jsonify({
-                'error': 'Failed to send notification',
-                'details': 'An unexpected error occurred'
-            }), 500
+        db.session.rollback()
+        current_app.logger.error(f"Error queueing notification: {str(e)}")
+        return jsonify({
+            'error': 'Failed to send notification',
+            'details': 'An unexpected error occurred'
+        }), 500
 
 @bp.route('/<int:id>', methods=['PUT'])
 def update_listing(id):
     try:
         listing = Listing.query.get_or_404(id)
+        before = listing_scope(listing)
         
         # Handle both JSON and form data
         if request.is_json:
@@ -521,69 +685,54 @@ def update_listing(id):
             except ValueError:
                 return jsonify({'error': 'Invalid price format'}), 400
         if 'category' in data:
-            listing.category = data['category']
+            try:
+                listing.category = normalize_category(data['category'])
+            except InvalidField as e:
+                return jsonify({'error': str(e)}), 400
         if 'images' in data:
-            # Clear existing images
-            ListingImage.query.filter_by(listing_id=listing.id).delete()
-            # Add new images
             try:
                 image_urls = json.loads(data['images']) if isinstance(data['images'], str) else data['images']
-                for image_url in image_urls:
-                    image = ListingImage(filename=image_url, listing_id=listing.id)
-                    db.session.add(image)
+                image_urls = clean_images(image_urls)
             except json.JSONDecodeError:
                 current_app.logger.error("Failed to parse image URLs")
                 return jsonify({'error': 'Invalid image data format'}), 400
+            except InvalidField as e:
+                return jsonify({'error': str(e)}), 400
+            # Image rows live in another table; touch the listing so its
+            # updated_at (and therefore its ETag) moves too
+            listing.updated_at = datetime.utcnow()
+            # Clear existing images
+            ListingImage.query.filter_by(listing_id=listing.id).delete()
+            # Add new images
+            for image_url in image_urls:
+                image = ListingImage(filename=image_url, listing_id=listing.id)
+                db.session.add(image)
         if 'condition' in data:
             listing.condition = data['condition']
         
         db.session.commit()
+        cache.invalidate_listings(before, listing_scope(listing))
         
-        return jsonify({
-            'id': listing.id,
-            'title': listing.title,
-            'description': listing.description,
-            'price': listing.price,
-            'category': listing.category,
-            'status': listing.status,
-            'user_id': listing.user_id,
-            'created_at': listing.created_at.isoformat() if listing.created_at else None,
-            'images': [image.filename for image in listing.images]
-        })
+        return jsonify(serialize_listing(listing))
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f"Error updating listing: {str(e)}")
         return jsonify({'error': 'Failed to update listing'}), 500
 
+# Most ids one /hearted/status call may ask about (a few feed pages)
+MAX_HEART_STATUS_IDS = 200
+
 @bp.route('/<int:id>/heart', methods=['POST'])
 @jwt_required()
 def heart_listing(id):
     try:
-        current_user_id = get_jwt_identity()
-        if not current_user_id:
-            return jsonify({'error': 'User not authenticated'}), 401
-
-        listing = Listing.query.get_or_404(id)
-        if listing.status != 'available':
-            return jsonify({'error': 'Listing is not available'}), 400
-
-        # Check if already hearted
-        existing_heart = HeartedListing.query.filter_by(
-            user_id=current_user_id,
-            listing_id=id
-        ).first()
-
-        if existing_heart:
-            return jsonify({'error': 'Listing already hearted'}), 400
-
-        hearted_listing = HeartedListing(
-            user_id=current_user_id,
-            listing_id=id
-        )
-        db.session.add(hearted_listing)
-        db.session.commit()
-
-        return jsonify({'message': 'Listing hearted successfully'}), 200
+        # Idempotent: hearting twice leaves one heart and answers 200 both times
+        state = hearts.heart(int(get_jwt_identity()), id)
+        return jsonify({'message': 'Listing hearted successfully', **state._asdict()}), 200
+    except ListingNotFound:
+        return jsonify({'error': 'Listing not found'}), 404
+    except ListingUnavailable:
+        return jsonify({'error': 'Listing is not available'}), 400
     except Exception as e:
         current_app.logger.error(f"Error hearting listing: {str(e)}")
         db.session.rollback()
@@ -593,37 +742,48 @@ def heart_listing(id):
 @jwt_required()
 def unheart_listing(id):
     try:
-        current_user_id = get_jwt_identity()
-        if not current_user_id:
-            return jsonify({'error': 'User not authenticated'}), 401
-
-        hearted_listing = HeartedListing.query.filter_by(
-            user_id=current_user_id,
-            listing_id=id
-        ).first_or_404()
-
-        db.session.delete(hearted_listing)
-        db.session.commit()
-
-        return jsonify({'message': 'Listing unhearted successfully'}), 200
+        state = hearts.unheart(int(get_jwt_identity()), id)
+        return jsonify({'message': 'Listing unhearted successfully', **state._asdict()}), 200
+    except ListingNotFound:
+        return jsonify({'error': 'Listing not found'}), 404
     except Exception as e:
         current_app.logger.error(f"Error unhearting listing: {str(e)}")
+        db.session.rollback()
         return jsonify({'error': 'Failed to unheart listing'}), 500
 
 @bp.route('/hearted', methods=['GET'])
 @jwt_required()
 def get_hearted_listings():
     try:
-        current_user_id = get_jwt_identity()
-        if not current_user_id:
-            return jsonify({'error': 'User not authenticated'}), 401
+        current_user_id = int(get_jwt_identity())
 
-        hearted_listings = HeartedListing.query.filter_by(user_id=current_user_id).all()
-        listing_ids = [hl.listing_id for hl in hearted_listings]
-        
-        listings = Listing.query.filter(Listing.id.in_(listing_ids)).all()
+        # One join, most recently hearted first
+        listings = (Listing.query
+                    .join(HeartedListing, HeartedListing.listing_id == Listing.id)
+                    .filter(HeartedListing.user_id == current_user_id)
+                    .order_by(HeartedListing.created_at.desc(), HeartedListing.id.desc())
+                    .all())
         
-        return jsonify([listing.to_dict() for listing in listings]), 200
+        return jsonify(serialize_listings(listings, variants=_requested_variants())), 200
     except Exception as e:
         current_app.logger.error(f"Error fetching hearted listings: {str(e)}")
         return jsonify({'error': 'Failed to fetch hearted listings'}), 500
+
+@bp.route('/hearted/status', methods=['GET'])
+@jwt_required()
+def get_hearted_status():
+    """Which of ?ids=1,2,3 the caller has hearted, as {id: bool}, in one query."""
+    try:
+        ids = {int(i) for i in request.args.get('ids', '').split(',') if i.strip()}
+    except ValueError:
+        return jsonify({'error': 'ids must be a comma-separated list of listing ids'}), 400
+    if len(ids) > MAX_HEART_STATUS_IDS:
+        return jsonify({'error': f'At most {MAX_HEART_STATUS_IDS} ids per request'}), 400
+
+    current_user_id = int(get_jwt_identity())
+    hearted = set()
+    if ids:
+        hearted = {listing_id for (listing_id,) in db.session.query(HeartedListing.listing_id)
+                   .filter(HeartedListing.user_id == current_user_id,
+                           HeartedListing.listing_id.in_(ids))}
+    return jsonify({'hearted': {str(i): i in hearted for i in sorted(ids)}}), 200
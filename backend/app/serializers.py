@@ -0,0 +1,142 @@
+"""JSON payloads for listings.
+
+Every route that returns listings goes through serialize_listings, which
+loads images (and optionally seller netids) for the whole batch with one
+query each, so serializing N listings costs the same number of statements
+as serializing one. Image derivatives (thumbnail/card/full in WebP and
+JPEG) come along in one more query, as `image_variants`, aligned with
+`images`.
+
+stream_listings does the same for unbounded collections, one yield_per batch
+at a time, so memory stays flat however many listings match.
+"""
+from collections import defaultdict
+from itertools import islice
+
+from flask import current_app
+
+from sqlalchemy import inspect
+from sqlalchemy.orm.attributes import set_committed_value
+
+from .extensions import db
+from .models import ListingImage, User
+
+# Ids per IN (...) clause; stays under SQLite's bound-parameter limit
+_IN_CHUNK = 500
+
+# Listings per batch when streaming
+STREAM_BATCH_SIZE = 200
+
+
+def _chunks(values):
+    values = list(values)
+    for start in range(0, len(values), _IN_CHUNK):
+        yield values[start:start + _IN_CHUNK]
+
+
+def prefetch_images(listings):
+    """Populate `images` on every listing that hasn't loaded them yet."""
+    pending = {l.id: l for l in listings if 'images' in inspect(l).unloaded}
+    if not pending:
+        return
+
+    images = defaultdict(list)
+    for chunk in _chunks(pending):
+        rows = (ListingImage.query
+                .filter(ListingImage.listing_id.in_(chunk))
+                .order_by(ListingImage.id))
+        for image in rows:
+            images[image.listing_id].append(image)
+
+    # Mark the relationship as loaded so listing.images doesn't lazy-load
+    for listing_id, listing in pending.items():
+        set_committed_value(listing, 'images', images.get(listing_id, []))
+
+
+def fetch_netids(user_ids):
+    """Return {user_id: netid} for the given ids in one round trip per chunk."""
+    user_ids = {uid for uid in user_ids if uid is not None}
+    netids = {}
+    for chunk in _chunks(user_ids):
+        netids.update(db.session.query(User.id, User.netid).filter(User.id.in_(chunk)))
+    return netids
+
+
+def listing_payload(listing, seller_netid=None, include_seller=False, derivatives=None):
+    """Build the JSON dict for one listing whose images are already loaded.
+
+    `derivatives` maps image URL to {variant: {format: {url, width, height}}};
+    images without derivatives get an empty dict, so clients fall back to
+    the URL in `images`.
+    """
+    derivatives = derivatives or {}
+    payload = {
+        'id': listing.id,
+        'title': listing.title,
+        'description': listing.description,
+        'price': listing.price,
+        'category': listing.category,
+        'status': listing.status,
+        'user_id': listing.user_id,
+        'buyer_id': listing.buyer_id,
+        'created_at': listing.created_at.isoformat() if listing.created_at else None,
+        'images': [image.filename for image in listing.images],
+        'image_variants': [derivatives.get(image.filename, {}) for image in listing.images],
+        'condition': listing.condition,
+        'heart_count': listing.heart_count or 0
+    }
+    if include_seller:
+        payload['user_netid'] = seller_netid
+    return payload
+
+
+def serialize_listings(listings, include_seller=False, variants=None):
+    """Serialize a batch of listings in a constant number of queries.
+
+    `variants` limits `image_variants` to those sizes, e.g. ['thumb'] for
+    the feed grid.
+    """
+    from .utils.derivatives import fetch_derivatives
+
+    listings = list(listings)
+    prefetch_images(listings)
+    netids = fetch_netids(l.user_id for l in listings) if include_seller else {}
+    urls = [image.filename for l in listings for image in l.images]
+    derivatives = fetch_derivatives(urls, variants) if urls else {}
+    return [listing_payload(l, netids.get(l.user_id), include_seller, derivatives) for l in listings]
+
+
+def serialize_listing(listing, include_seller=False, variants=None):
+    return serialize_listings([listing], include_seller=include_seller, variants=variants)[0]
+
+
+def stream_listings(query, include_seller=False, variants=None, batch_size=STREAM_BATCH_SIZE):
+    """Yield `query`'s listings as chunks of one JSON array.
+
+    Rows are fetched with yield_per and serialized a batch at a time (with the
+    same batched image/netid/derivative lookups as serialize_listings), so
+    only one batch of ORM objects and encoded text is alive at once.
+    """
+    dumps = current_app.json.dumps
+    rows = iter(query.yield_per(batch_size))
+    separator = '['
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        payloads = serialize_listings(batch, include_seller=include_seller, variants=variants)
+        yield separator + ','.join(dumps(p) for p in payloads)
+        separator = ','
+    yield '[]' if separator == '[' else ']'
+
+
+def stream_listings_ndjson(query, include_seller=True, batch_size=STREAM_BATCH_SIZE):
+    """Yield `query`'s listings as NDJSON, one batch of lines per chunk."""
+    dumps = current_app.json.dumps
+    rows = iter(query.yield_per(batch_size))
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        payloads = serialize_listings(batch, include_seller=include_seller)
+        yield ''.join(dumps(p) + '\n' for p in payloads)
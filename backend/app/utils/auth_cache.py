@@ -0,0 +1,145 @@
+"""Caches on the authentication hot path.
+
+Every @jwt_required() request verifies an HS256 signature, and /api/auth/verify,
+which the frontend calls on almost every page, also loaded the user row. Three
+per-process caches take that work, and CAS login's user upsert, off the
+common path:
+
+  tokens  encoded token -> verified claims, bounded LRU; an entry lives for
+          AUTH_TOKEN_CACHE_TTL seconds or until the token's own `exp`,
+          whichever comes first, so a cached token never outlives itself
+  users   user id -> {id, username, email, netid}; entries are dropped when a
+          User row is updated or deleted in this process, and expire after
+          AUTH_USER_CACHE_TTL so changes made by other workers show up too
+  netids  netid -> user id, so a returning user's CAS login skips the
+          upsert; same eviction rules, AUTH_NETID_CACHE_TTL
+
+Set any size to 0 to disable that cache.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, has_app_context
+from flask_jwt_extended import JWTManager
+from sqlalchemy import event, inspect
+
+
+class TTLCache:
+    """Thread-safe LRU mapping whose entries also expire."""
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.time():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, expires_at=None):
+        if not self.enabled:
+            return
+        deadline = time.time() + self.ttl
+        if expires_at is not None:
+            deadline = min(deadline, expires_at)
+        with self._lock:
+            self._entries[key] = (deadline, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+class _AuthCacheState:
+    def __init__(self, config):
+        self.tokens = TTLCache(config['AUTH_TOKEN_CACHE_SIZE'], config['AUTH_TOKEN_CACHE_TTL'])
+        self.users = TTLCache(config['AUTH_USER_CACHE_SIZE'], config['AUTH_USER_CACHE_TTL'])
+        self.netids = TTLCache(config['AUTH_NETID_CACHE_SIZE'], config['AUTH_NETID_CACHE_TTL'])
+
+
+class CachingJWTManager(JWTManager):
+    """JWTManager that remembers tokens it has already verified."""
+
+    def init_app(self, app, *args, **kwargs):
+        super().init_app(app, *args, **kwargs)
+        app.config.setdefault('AUTH_TOKEN_CACHE_SIZE', 4096)
+        app.config.setdefault('AUTH_TOKEN_CACHE_TTL', 300)
+        app.config.setdefault('AUTH_USER_CACHE_SIZE', 4096)
+        app.config.setdefault('AUTH_USER_CACHE_TTL', 60)
+        app.config.setdefault('AUTH_NETID_CACHE_SIZE', 8192)
+        app.config.setdefault('AUTH_NETID_CACHE_TTL', 300)
+        app.extensions['auth_cache'] = _AuthCacheState(app.config)
+        _listen_for_user_changes()
+
+    def _decode_jwt_from_config(self, encoded_token, csrf_value=None, allow_expired=False):
+        tokens = current_app.extensions['auth_cache'].tokens
+        # Expired-token and CSRF checks are rare; always verify those in full
+        if allow_expired or csrf_value is not None or not tokens.enabled:
+            return super()._decode_jwt_from_config(encoded_token, csrf_value, allow_expired)
+
+        claims = tokens.get(encoded_token)
+        if claims is None:
+            # Raises for bad signatures and expired tokens, which are never cached
+            claims = super()._decode_jwt_from_config(encoded_token, csrf_value, allow_expired)
+            tokens.set(encoded_token, claims, expires_at=claims.get('exp'))
+        return claims
+
+
+def get_cached_user(user_id):
+    """Return {id, username, email, netid} for `user_id`, or None if there is no such user."""
+    from ..extensions import db
+    from ..models import User
+
+    users = current_app.extensions['auth_cache'].users
+    user = users.get(user_id)
+    if user is None:
+        row = db.session.get(User, user_id)
+        if row is None:
+            return None
+        user = {'id': row.id, 'username': row.username, 'email': row.email, 'netid': row.netid}
+        users.set(user_id, user)
+    return user
+
+
+def _evict_user(mapper, connection, target):
+    if has_app_context() and 'auth_cache' in current_app.extensions:
+        state = current_app.extensions['auth_cache']
+        state.users.pop(target.id)
+        # The old netid too, if this update changed it
+        for netid in inspect(target).attrs.netid.history.sum():
+            state.netids.pop(netid)
+
+
+def _listen_for_user_changes():
+    from ..models import User
+
+    for name in ('after_update', 'after_delete'):
+        if not event.contains(User, name, _evict_user):
+            event.listen(User, name, _evict_user)
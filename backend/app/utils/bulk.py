@@ -0,0 +1,244 @@
+"""Bulk listing import and export.
+
+Move-out sales post dozens of items at once. Rows arrive as NDJSON (one JSON
+object per line) or CSV with a header, and are validated as they are read.
+Valid rows are written BULK_IMPORT_BATCH_SIZE at a time, each batch in one
+transaction: one multi-row INSERT ... RETURNING for the listings (on
+PostgreSQL; SQLite inserts them one by one to return ids in row order) and
+one multi-row INSERT for their images, instead of create_listing's two
+commits per listing. Every input row gets a result: its new id, or why it
+was skipped.
+
+Row fields: title, description and price are required; category (default
+'other'), condition (default 'good') and images are optional. In NDJSON
+`images` is a list of URLs; in CSV it is one column of URLs separated by '|'.
+
+Exports stream listings as NDJSON through serializers.stream_listings_ndjson.
+
+  POST /api/listing/bulk              body: NDJSON or CSV (by Content-Type)
+  GET  /api/listing/export            NDJSON
+  flask listings import FILE --netid tiger1
+  flask listings export [FILE]
+"""
+import csv
+import io
+import json
+import math
+import sys
+from datetime import datetime
+
+import click
+from flask import current_app
+from sqlalchemy import insert
+
+from ..extensions import cache, db
+from ..models import Listing, ListingImage, User
+from .cache import ListingScope
+from .listing_fields import InvalidField, clean_images, normalize_category
+
+FORMATS = ('ndjson', 'csv')
+_LISTINGS = Listing.__table__
+_IMAGES = ListingImage.__table__
+
+
+class RowRejected(ValueError):
+    """An input row that can't become a listing."""
+
+
+def read_rows(stream, fmt):
+    """Yield (row_number, dict) from a text stream; unparseable rows yield a RowRejected."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    if fmt != 'ndjson':
+        raise ValueError(f'Unsupported import format: {fmt}')
+    for number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield number, RowRejected(f'Invalid JSON: {str(e)}')
+            continue
+        yield number, row if isinstance(row, dict) else RowRejected('Expected a JSON object')
+
+
+def _text(row, field, max_length, default=None, required=False):
+    value = row.get(field)
+    value = value.strip() if isinstance(value, str) else value
+    if value in (None, ''):
+        if required:
+            raise RowRejected(f'{field} is required')
+        return default
+    if not isinstance(value, str):
+        raise RowRejected(f'{field} must be a string')
+    if max_length and len(value) > max_length:
+        raise RowRejected(f'{field} is longer than {max_length} characters')
+    return value
+
+
+def validate_row(row):
+    """Return (listing values, image URLs) for one input row, or raise RowRejected."""
+    if isinstance(row, RowRejected):
+        raise row
+    try:
+        price = float(row.get('price'))
+    except (TypeError, ValueError):
+        raise RowRejected('Price must be a number')
+    if not math.isfinite(price) or price <= 0:
+        raise RowRejected('Price must be greater than 0')
+
+    images = row.get('images') or []
+    if isinstance(images, str):
+        images = [url.strip() for url in images.split('|') if url.strip()]
+    try:
+        images = clean_images(images)
+        category = normalize_category(row.get('category'))
+    except InvalidField as e:
+        raise RowRejected(str(e))
+
+    values = {
+        'title': _text(row, 'title', 100, required=True),
+        'description': _text(row, 'description', None, required=True),
+        'price': price,
+        'category': category,
+        'condition': _text(row, 'condition', 50, default='good'),
+        'status': 'available'
+    }
+    return values, images
+
+
+def _insert_batch(batch, user_id):
+    """Insert one batch of validated rows in one transaction; return their new ids."""
+    now = datetime.utcnow()
+    listing_rows = [dict(values, user_id=user_id, created_at=now, updated_at=now)
+                    for _, values, _ in batch]
+    # Ids come back in the order of listing_rows, so they pair with `batch`
+    ids = list(db.session.execute(insert(_LISTINGS).returning(_LISTINGS.c.id, sort_by_parameter_order=True),
+                                  listing_rows).scalars())
+    image_rows = [{'filename': url, 'listing_id': listing_id, 'created_at': now}
+                  for listing_id, (_, _, images) in zip(ids, batch) for url in images]
+    if image_rows:
+        db.session.execute(insert(_IMAGES), image_rows)
+    db.session.commit()
+    return ids
+
+
+def import_listings(rows, user_id, batch_size=None):
+    """Create listings owned by `user_id` from (row_number, row) pairs.
+
+    Returns one result per row, in input order: {row, ok, id} or {row, ok, error}.
+    A batch that fails to insert is rolled back and each of its rows reported
+    failed; earlier batches stay committed.
+    """
+    from .search import index_listings
+
+    batch_size = batch_size or current_app.config['BULK_IMPORT_BATCH_SIZE']
+    results = []
+    batch = []
+
+    def flush():
+        try:
+            ids = _insert_batch(batch, user_id)
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f'Bulk import batch failed: {str(e)}')
+            for result, _, _ in batch:
+                result.update(ok=False, error='Database error')
+        else:
+            for (result, _, _), listing_id in zip(batch, ids):
+                result.update(ok=True, id=listing_id)
+            # Core inserts skip the ORM hooks that keep these current
+            index_listings(db.session, ((listing_id, values['title'], values['description'])
+                                        for (_, values, _), listing_id in zip(batch, ids)))
+            scopes = {values['category']: ListingScope(listing_id, values['category'], user_id, None)
+                      for (_, values, _), listing_id in zip(batch, ids)}
+            cache.invalidate_listings(*scopes.values())
+        batch.clear()
+
+    for row_number, row in rows:
+        try:
+            values, images = validate_row(row)
+        except RowRejected as e:
+            results.append({'row': row_number, 'ok': False, 'error': str(e)})
+            continue
+        # Filled in when the batch is written
+        result = {'row': row_number}
+        results.append(result)
+        batch.append((result, values, images))
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return results
+
+
+def detect_format(content_type=None, filename=None):
+    """'csv' or 'ndjson' from a Content-Type or file name (NDJSON by default)."""
+    if content_type and 'csv' in content_type:
+        return 'csv'
+    if filename and filename.lower().endswith('.csv'):
+        return 'csv'
+    return 'ndjson'
+
+
+def export_query(status=None, since=None, user_id=None):
+    """Listings to export, oldest change first so a consumer can resume from `since`."""
+    query = Listing.query
+    if status:
+        query = query.filter(Listing.status == status)
+    if since:
+        query = query.filter(Listing.updated_at >= since)
+    if user_id is not None:
+        query = query.filter(Listing.user_id == user_id)
+    return query.order_by(Listing.updated_at, Listing.id)
+
+
+def text_stream(binary):
+    """Decode an uploaded byte stream line by line (CSV wants universal newlines)."""
+    return io.TextIOWrapper(binary, encoding='utf-8', newline='')
+
+
+@click.group('listings')
+def listings_cli():
+    """Bulk listing import and export."""
+
+
+@listings_cli.command('import')
+@click.argument('source', type=click.File('r', encoding='utf-8'))
+@click.option('--netid', help='Owner of the imported listings.')
+@click.option('--user-id', type=int, help='Owner of the imported listings.')
+@click.option('--format', 'fmt', type=click.Choice(FORMATS), default=None,
+              help='Input format (default: from the file name, else NDJSON).')
+@click.option('--batch-size', type=int, default=None, help='Listings per transaction.')
+def import_command(source, netid, user_id, fmt, batch_size):
+    """Create listings from an NDJSON or CSV file ('-' for stdin)."""
+    query = User.query.filter_by(netid=netid) if netid else User.query.filter_by(id=user_id)
+    owner = query.first() if (netid or user_id) else None
+    if owner is None:
+        raise click.UsageError('Pass --netid or --user-id of an existing user')
+
+    fmt = fmt or detect_format(filename=source.name)
+    results = import_listings(read_rows(source, fmt), owner.id, batch_size)
+    failed = [r for r in results if not r['ok']]
+    for result in failed:
+        click.echo(f"row {result['row']}: {result['error']}", err=True)
+    click.echo(f'Done: {len(results) - len(failed)} imported, {len(failed)} failed')
+    if failed:
+        sys.exit(1)
+
+
+@listings_cli.command('export')
+@click.argument('target', type=click.File('w', encoding='utf-8'), default='-')
+@click.option('--status', help='Only listings with this status.')
+@click.option('--since', type=click.DateTime(), help='Only listings updated at or after this time.')
+def export_command(target, status, since):
+    """Write listings as NDJSON to TARGET (default stdout)."""
+    from ..serializers import stream_listings_ndjson
+
+    query = export_query(status=status, since=since)
+    for chunk in stream_listings_ndjson(query, batch_size=current_app.config['LISTING_STREAM_BATCH_SIZE']):
+        target.write(chunk)
@@ -0,0 +1,400 @@
+"""Response cache for listing reads.
+
+Cached responses are keyed on the route plus its normalized query string and
+tagged with the scopes they depend on (the whole feed, one category, one
+listing, one seller's or buyer's listings). Every tag has a version counter;
+an entry records the versions it was built from and is only served while
+they are all unchanged. Writes bump the versions of exactly the tags they
+affect, so a new listing in "books" leaves cached "furniture" pages alone.
+
+Views can also pass a validator: a cheap function returning the
+(etag, last_modified) pair for the current data. Those responses carry strong
+ETag / Last-Modified headers, and a matching If-None-Match or
+If-Modified-Since gets a 304. A current cache entry answers that from memory;
+otherwise only the validator runs, never the view. A collection validator is
+an aggregate over every matching row, which a page of results shouldn't pay
+for on each read; with conditional_only it runs only for conditional
+requests, and other bounded responses get an ETag hashed from the body, which
+a later If-None-Match also accepts.
+
+Hit/miss counters (this worker only) are served at /internal/cache behind
+METRICS_TOKEN like the other /internal endpoints.
+
+Backends:
+  memory  in-process LRU with TTL (default; per worker, so other workers
+          only see an invalidation once their copy expires)
+  redis   shared across workers; needs the optional `redis` package
+  null    caching disabled
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from datetime import datetime
+from functools import wraps
+from urllib.parse import urlencode
+
+from flask import Response, current_app, jsonify, make_response, request
+
+# exact_date=False means last_modified does not move on every change (e.g. a
+# collection's max(updated_at) ignores deletions), so If-Modified-Since alone
+# is not trusted; the ETag still is.
+Validator = namedtuple('Validator', ['etag', 'last_modified', 'exact_date'], defaults=(True,))
+
+
+def make_validator(*parts, last_modified=None, exact_date=True):
+    """Build a strong Validator by hashing everything the response depends on."""
+    digest = hashlib.sha1('|'.join(str(p) for p in parts).encode('utf-8')).hexdigest()[:20]
+    return Validator(digest, last_modified, exact_date)
+
+
+def body_validator(body):
+    """A strong Validator for exactly this response body."""
+    return Validator(hashlib.sha1(body).hexdigest()[:20], None)
+
+
+ListingScope = namedtuple('ListingScope', ['id', 'category', 'user_id', 'buyer_id'])
+
+
+def listing_scope(listing):
+    """Snapshot the fields that decide which cached reads include `listing`."""
+    return ListingScope(listing.id, listing.category, listing.user_id, listing.buyer_id)
+
+
+def feed_tag(category=None):
+    return f'feed:{category.lower()}' if category else 'feed'
+
+
+class MemoryBackend:
+    """Thread-safe LRU of (versions, validator, body) entries with per-entry expiry."""
+
+    def __init__(self, max_entries=2048):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        # Versions live outside the LRU: evicting one would reset it to 0 and
+        # could make an old entry look current again
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def lookup(self, key, tags):
+        with self._lock:
+            versions = tuple(self._versions.get(tag, 0) for tag in tags)
+            entry = self._entries.get(key)
+            if entry is None:
+                return versions, None
+            expires_at, stored = entry[0], entry[1:]
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return versions, None
+            self._entries.move_to_end(key)
+            return versions, stored
+
+    def store(self, key, versions, validator, body, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, versions, validator, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def bump(self, tags):
+        with self._lock:
+            for tag in tags:
+                self._versions[tag] = self._versions.get(tag, 0) + 1
+
+    def versions(self, tags):
+        with self._lock:
+            return tuple(self._versions.get(tag, 0) for tag in tags)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class RedisBackend:
+    """Redis (or any protocol-compatible server) shared by all workers."""
+
+    def __init__(self, url, prefix='tigerpop:'):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError('CACHE_BACKEND=redis requires the redis package') from e
+        self._redis = redis.Redis.from_url(url)
+        self._prefix = prefix
+
+    def _version_keys(self, tags):
+        return [f'{self._prefix}v:{tag}' for tag in tags]
+
+    def lookup(self, key, tags):
+        # Versions and the entry come back in a single round trip
+        values = self._redis.mget(self._version_keys(tags) + [f'{self._prefix}c:{key}'])
+        versions = tuple(int(v) if v is not None else 0 for v in values[:-1])
+        raw = values[-1]
+        if raw is None:
+            return versions, None
+        header, _, body = raw.partition(b'\n')
+        raw_versions, etag, last_modified, exact_date = header.decode('ascii').split('|')
+        stored_versions = tuple(int(v) for v in raw_versions.split(',')) if raw_versions else ()
+        validator = None
+        if etag:
+            validator = Validator(etag, datetime.fromisoformat(last_modified) if last_modified else None,
+                                  exact_date == '1')
+        return versions, (stored_versions, validator, body)
+
+    def store(self, key, versions, validator, body, ttl):
+        header = '|'.join([
+            ','.join(str(v) for v in versions),
+            validator.etag if validator else '',
+            validator.last_modified.isoformat() if validator and validator.last_modified else '',
+            '1' if validator and validator.exact_date else '0'
+        ]).encode('ascii')
+        self._redis.setex(f'{self._prefix}c:{key}', ttl, header + b'\n' + body)
+
+    def bump(self, tags):
+        pipe = self._redis.pipeline(transaction=False)
+        for version_key in self._version_keys(tags):
+            pipe.incr(version_key)
+        pipe.execute()
+
+    def versions(self, tags):
+        return tuple(int(v) if v is not None else 0 for v in self._redis.mget(self._version_keys(tags)))
+
+    def clear(self):
+        for key in self._redis.scan_iter(f'{self._prefix}c:*'):
+            self._redis.delete(key)
+
+
+class _CacheState:
+    def __init__(self, backend, ttl, max_body_bytes):
+        self.backend = backend
+        self.ttl = ttl
+        self.max_body_bytes = max_body_bytes
+        self.stats = {}
+        self.invalidations = 0
+        self.lock = threading.Lock()
+
+    def count(self, namespace, outcome):
+        with self.lock:
+            counters = self.stats.setdefault(namespace, {'hits': 0, 'misses': 0, 'not_modified': 0})
+            counters[outcome] += 1
+
+
+class ResponseCache:
+    """Flask extension wrapping a cache backend for JSON GET responses."""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('CACHE_BACKEND', 'memory')
+        app.config.setdefault('CACHE_DEFAULT_TTL', 30)
+        app.config.setdefault('CACHE_MAX_ENTRIES', 2048)
+        app.config.setdefault('CACHE_REDIS_URL', None)
+        app.config.setdefault('CACHE_MAX_BODY_BYTES', 1024 * 1024)
+
+        kind = app.config['CACHE_BACKEND']
+        if kind == 'null':
+            backend = None
+        elif kind == 'memory':
+            backend = MemoryBackend(app.config['CACHE_MAX_ENTRIES'])
+        elif kind == 'redis':
+            backend = RedisBackend(app.config['CACHE_REDIS_URL'])
+        else:
+            raise ValueError(f'Unknown CACHE_BACKEND: {kind}')
+        app.extensions['response_cache'] = _CacheState(backend, app.config['CACHE_DEFAULT_TTL'],
+                                                       app.config['CACHE_MAX_BODY_BYTES'])
+        app.add_url_rule('/internal/cache', 'cache_stats', self._stats_view)
+
+    def _stats_view(self):
+        from .metrics import internal_auth_error
+
+        denied = internal_auth_error()
+        if denied is not None:
+            return denied
+        return jsonify(self.stats())
+
+    @property
+    def _state(self):
+        return current_app.extensions['response_cache']
+
+    @property
+    def enabled(self):
+        return self._state.backend is not None
+
+    @staticmethod
+    def request_key(namespace):
+        """Cache key for the current request: path plus sorted, non-empty args."""
+        args = sorted((k, v.lower() if k == 'category' else v)
+                      for k in request.args for v in request.args.getlist(k) if v != '')
+        return f'{namespace}:{request.path}?{urlencode(args)}'
+
+    def cached(self, namespace, tags, validator=None, conditional_only=False):
+        """Cache a view's 200 JSON responses under the tags `tags(**view_args)` returns.
+
+        `validator(**view_args)` returns a Validator for the current data (or
+        None when there is nothing to validate, e.g. a missing listing); with it
+        the response supports conditional GET. With conditional_only, it runs
+        for other requests only when the response is streamed (already as
+        large as what the validator reads); bounded responses are validated
+        by their body.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                state = self._state
+                if state.backend is None:
+                    return self._conditional(view, validator, conditional_only, args, kwargs)[0]
+
+                key = self.request_key(namespace)
+                tag_list = tags(**kwargs)
+                versions, entry = state.backend.lookup(key, tag_list)
+                if entry is not None and entry[0] == versions:
+                    _, stored_validator, body = entry
+                    if stored_validator and _not_modified(stored_validator):
+                        state.count(namespace, 'not_modified')
+                        return _not_modified_response(stored_validator)
+                    state.count(namespace, 'hits')
+                    return _with_validator(Response(body, mimetype='application/json'), stored_validator)
+
+                state.count(namespace, 'misses')
+                response, current = self._conditional(view, validator, conditional_only, args, kwargs)
+                # Store under the versions read *before* the view ran: if a
+                # write lands meanwhile, the entry is already stale and the
+                # next read misses instead of serving old data
+                if response.status_code == 200 and response.mimetype == 'application/json':
+                    def store(body):
+                        stored = current or (body_validator(body) if conditional_only else None)
+                        state.backend.store(key, versions, stored, body, state.ttl)
+                    if response.is_streamed:
+                        # Store once the stream has been sent, unless it's too big
+                        response.response = _store_when_complete(response.response, store,
+                                                                 state.max_body_bytes)
+                    else:
+                        store(response.get_data())
+                elif response.status_code == 304:
+                    state.count(namespace, 'not_modified')
+                return response
+            return wrapper
+        return decorator
+
+    @staticmethod
+    def _conditional(view, validator, conditional_only, args, kwargs):
+        run = validator and (not conditional_only or _is_conditional())
+        current = validator(**kwargs) if run else None
+        if current and _not_modified(current):
+            return _not_modified_response(current), current
+        response = make_response(view(*args, **kwargs))
+        if response.status_code != 200:
+            return response, current
+        if conditional_only and not response.is_streamed:
+            # An ETag from a plain read is a body hash: revalidating it costs
+            # a render but not the transfer, and the 304 hands out `current`
+            by_body = body_validator(response.get_data())
+            if _not_modified(by_body):
+                return _not_modified_response(current or by_body), current or by_body
+            current = current or by_body
+        elif conditional_only and current is None and validator:
+            # A streamed body reads its rows only once it is sent, after this
+            current = validator(**kwargs)
+        if current:
+            _with_validator(response, current)
+        return response, current
+
+    def invalidate_tags(self, tags):
+        state = self._state
+        if state.backend is None or not tags:
+            return
+        state.backend.bump(sorted(set(tags)))
+        with state.lock:
+            state.invalidations += 1
+
+    def invalidate_listings(self, *scopes):
+        """Invalidate every cached read that could include the given listings.
+
+        Pass the scope from before a write and the one after it, so a listing
+        that moved category or changed buyer drops out of both old and new pages.
+        """
+        from ..serializers import fetch_netids
+
+        tags = {feed_tag()}
+        user_ids = set()
+        buyer_ids = set()
+        for scope in scopes:
+            if scope is None:
+                continue
+            tags.add(f'listing:{scope.id}')
+            if scope.category:
+                tags.add(feed_tag(scope.category))
+            if scope.user_id is not None:
+                user_ids.add(scope.user_id)
+            if scope.buyer_id is not None:
+                buyer_ids.add(scope.buyer_id)
+
+        netids = fetch_netids(user_ids | buyer_ids) if self.enabled else {}
+        for uid in user_ids:
+            tags.update({f'user:{uid}', f'user-netid:{netids.get(uid)}'})
+        for bid in buyer_ids:
+            tags.update({f'buyer:{bid}', f'buyer-netid:{netids.get(bid)}'})
+        self.invalidate_tags(tags)
+
+    def stats(self):
+        state = self._state
+        with state.lock:
+            namespaces = {ns: dict(counters) for ns, counters in state.stats.items()}
+            invalidations = state.invalidations
+        hits = sum(c['hits'] for c in namespaces.values())
+        misses = sum(c['misses'] for c in namespaces.values())
+        return {
+            'backend': current_app.config['CACHE_BACKEND'],
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': hits / (hits + misses) if hits + misses else None,
+            'invalidations': invalidations,
+            'namespaces': namespaces
+        }
+
+
+def _store_when_complete(chunks, store, max_bytes):
+    """Pass `chunks` through, then store their concatenation if it fit in max_bytes."""
+    buffered = []
+    size = 0
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        if buffered is not None:
+            size += len(chunk)
+            if size <= max_bytes:
+                buffered.append(chunk)
+            else:
+                buffered = None
+        yield chunk
+    if buffered is not None:
+        store(b''.join(buffered))
+
+
+def _is_conditional():
+    return bool(request.if_none_match or request.if_modified_since)
+
+
+def _not_modified(validator):
+    if request.if_none_match:
+        return request.if_none_match.contains(validator.etag)
+    if request.if_modified_since and validator.last_modified and validator.exact_date:
+        # HTTP dates have one-second resolution; compare as naive UTC
+        last_modified = validator.last_modified.replace(microsecond=0, tzinfo=None)
+        return last_modified <= request.if_modified_since.replace(tzinfo=None)
+    return False
+
+
+def _with_validator(response, validator):
+    if validator:
+        response.set_etag(validator.etag)
+        if validator.last_modified:
+            response.last_modified = validator.last_modified
+        # Let browsers keep the body but always revalidate it with us
+        response.cache_control.no_cache = True
+    return response
+
+
+def _not_modified_response(validator):
+    return _with_validator(Response(status=304), validator)
@@ -1,23 +1,50 @@
 import os
-import cloudinary
-import cloudinary.uploader
 
-# Configure Cloudinary
-cloudinary.config(
-    cloud_name=os.getenv('CLOUDINARY_CLOUD_NAME'),
-    api_key=os.getenv('CLOUDINARY_API_KEY'),
-    api_secret=os.getenv('CLOUDINARY_API_SECRET')
-)
+from .metrics import metrics
 
-def upload_image(image_file):
+_configured = False
+
+def _configure():
+    """Configure the cloudinary SDK from the environment on first use."""
+    global _configured
+    import cloudinary
+
+    if not _configured:
+        # Configure Cloudinary
+        cloudinary.config(
+            cloud_name=os.getenv('CLOUDINARY_CLOUD_NAME'),
+            api_key=os.getenv('CLOUDINARY_API_KEY'),
+            api_secret=os.getenv('CLOUDINARY_API_SECRET')
+        )
+        _configured = True
+
+def _uploader():
+    """cloudinary.uploader, imported and configured on first upload."""
+    import cloudinary.uploader
+
+    _configure()
+    return cloudinary.uploader
+
+def image_url(public_id, **options):
+    """
+    Delivery URL for an uploaded image, with `options` as Cloudinary transformations
+    """
+    import cloudinary.utils
+
+    _configure()
+    url, _ = cloudinary.utils.cloudinary_url(public_id, secure=True, **options)
+    return url
+
+def upload_image(image_file, **options):
     """
     Upload an image to Cloudinary and return the result
     """
     try:
         # Upload the image
-        result = cloudinary.uploader.upload(image_file)
+        with metrics.outbound('cloudinary'):
+            result = _uploader().upload(image_file, **options)
         # Return the full result object
         return result
     except Exception as e:
         print(f"Error uploading image to Cloudinary: {str(e)}")
-        raise e  # Re-raise the exception to handle it in the route 
\ No newline at end of file
+        raise e  # Re-raise the exception to handle it in the route
@@ -0,0 +1,229 @@
+"""Database connection management per deployment style.
+
+DB_POOL_MODE picks how SQLAlchemy holds Postgres connections:
+
+  queue   long-lived worker processes (gunicorn on Heroku): a QueuePool of
+          DB_POOL_SIZE connections plus DB_MAX_OVERFLOW (default off serverless)
+  pooler  serverless functions behind a transaction-mode pooler (PgBouncer,
+          Supabase's Supavisor on port 6543): one pooled connection per
+          container, opened in the background at cold start and reused by
+          every invocation the container serves. The pooler multiplexes
+          those client connections onto a few server connections, so nothing
+          session-scoped may be relied on; in particular no server-side
+          prepared statements (default on serverless)
+  null    NullPool: connect and disconnect on every checkout
+
+DATABASE_POOLER_URL, when set, is used instead of DATABASE_URL in pooler mode.
+
+Pools are instrumented: connect latency (new DBAPI connections) and checkout
+latency (time to get a connection from the pool, including pre-ping and any
+connect) are recorded per engine; see pool_stats(), served at
+/internal/db-pool behind METRICS_TOKEN like the other /internal endpoints.
+"""
+import threading
+import time
+
+from flask import current_app, jsonify
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import NullPool, QueuePool
+
+
+class LatencyStats:
+    """Count, total, max and last of a latency, in milliseconds."""
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.last_ms = None
+        self._lock = threading.Lock()
+
+    def observe(self, ms):
+        with self._lock:
+            self.count += 1
+            self.total_ms += ms
+            self.max_ms = max(self.max_ms, ms)
+            self.last_ms = ms
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'count': self.count,
+                'avg_ms': round(self.total_ms / self.count, 3) if self.count else None,
+                'max_ms': round(self.max_ms, 3),
+                'last_ms': round(self.last_ms, 3) if self.last_ms is not None else None
+            }
+
+
+class PoolMetrics:
+    def __init__(self):
+        self.connect = LatencyStats()
+        self.checkout = LatencyStats()
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that times every checkout."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            self.metrics.checkout.observe((time.perf_counter() - started) * 1000)
+
+
+class InstrumentedNullPool(NullPool):
+    """NullPool that times every checkout (each one is a fresh connect)."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            self.metrics.checkout.observe((time.perf_counter() - started) * 1000)
+
+
+def pooler_connect_args(url):
+    """DBAPI arguments that keep a driver safe behind a transaction-mode pooler."""
+    url = make_url(url)
+    if url.get_backend_name() != 'postgresql':
+        return {}
+    driver = url.get_driver_name()
+    args = {'connect_timeout': 5}
+    if driver == 'psycopg':
+        # psycopg 3 prepares statements after 5 executions by default; the
+        # prepared name would be looked up on whichever server connection the
+        # pooler hands out next
+        args['prepare_threshold'] = None
+    elif driver == 'pg8000':
+        args = {'timeout': 5}
+    # psycopg2 (the default driver) never uses server-side prepared statements
+    return args
+
+
+def engine_options(mode, url, pool_size=10, max_overflow=2, recycle=300):
+    """SQLALCHEMY_ENGINE_OPTIONS for a DB_POOL_MODE."""
+    if mode == 'null':
+        return {'poolclass': InstrumentedNullPool}
+    if mode == 'pooler':
+        return {
+            'poolclass': InstrumentedQueuePool,
+            # Serverless containers serve one request at a time
+            'pool_size': 1,
+            'max_overflow': 0,
+            'pool_timeout': 10,
+            'pool_recycle': recycle,
+            # A frozen container's connection may have been dropped by the
+            # pooler's idle timeout by the time it thaws
+            'pool_pre_ping': True,
+            'connect_args': pooler_connect_args(url)
+        }
+    if mode == 'queue':
+        return {
+            'poolclass': InstrumentedQueuePool,
+            'pool_size': pool_size,
+            'max_overflow': max_overflow,
+            'pool_recycle': recycle,
+            'pool_pre_ping': True,
+            'pool_timeout': 30
+        }
+    raise ValueError(f'Unknown DB_POOL_MODE: {mode}')
+
+
+def _time_connects(engine, metrics):
+    @event.listens_for(engine, 'do_connect')
+    def _connect_started(dialect, conn_rec, cargs, cparams):
+        conn_rec.info['connect_started'] = time.perf_counter()
+
+    @event.listens_for(engine, 'connect')
+    def _connected(dbapi_connection, conn_rec):
+        started = conn_rec.info.pop('connect_started', None)
+        if started is not None:
+            metrics.connect.observe((time.perf_counter() - started) * 1000)
+
+
+class _PoolState:
+    def __init__(self):
+        self.warmed = threading.Event()
+        self.warm_error = None
+
+
+def init_db_pool(app, db):
+    """Instrument the app's engine and, in pooler mode, warm one connection."""
+    app.config.setdefault('DB_POOL_MODE', 'queue')
+    app.config.setdefault('DB_WARM_ON_START', app.config['DB_POOL_MODE'] == 'pooler')
+    state = app.extensions['db_pool'] = _PoolState()
+    app.add_url_rule('/internal/db-pool', 'db_pool', _stats_view)
+
+    with app.app_context():
+        engine = db.engine
+    metrics = getattr(engine.pool, 'metrics', None)
+    if metrics is None:
+        # A pool class chosen elsewhere (e.g. the tests' StaticPool)
+        state.warmed.set()
+        return
+    _time_connects(engine, metrics)
+
+    if not app.config['DB_WARM_ON_START']:
+        state.warmed.set()
+        return
+
+    def warm():
+        # Overlaps the connect and TLS handshake with the rest of cold start;
+        # the first request waits in the pool checkout if it isn't done yet
+        try:
+            with engine.connect():
+                pass
+        except Exception as e:
+            state.warm_error = str(e)
+            app.logger.warning(f'Could not warm database connection: {str(e)}')
+        finally:
+            state.warmed.set()
+
+    threading.Thread(target=warm, name='db-warm', daemon=True).start()
+
+
+def _stats_view():
+    from .metrics import internal_auth_error
+    from ..extensions import db
+
+    denied = internal_auth_error()
+    if denied is not None:
+        return denied
+    return jsonify(pool_stats(db.engine))
+
+
+def pool_stats(engine):
+    """Pool mode, size and latency metrics for `engine`."""
+    pool = engine.pool
+    metrics = getattr(pool, 'metrics', None)
+    state = current_app.extensions.get('db_pool')
+    stats = {
+        'mode': current_app.config.get('DB_POOL_MODE'),
+        'pool': pool.status(),
+        'warmed': state.warmed.is_set() if state else None,
+        'warm_error': state.warm_error if state else None
+    }
+    if metrics is not None:
+        stats['connect'] = metrics.connect.snapshot()
+        stats['checkout'] = metrics.checkout.snapshot()
+    return stats
@@ -0,0 +1,183 @@
+"""Recording, serving and backfilling listing image derivatives.
+
+Uploads record every size and format up front (see utils/uploads.py):
+files rendered and stored next to the original for local storage,
+transformation URLs for Cloudinary. They are ImageDerivative rows keyed by
+the full-size URL, which is what ListingImage.filename stores. Serializers
+look derivatives up in batches and expose them as `image_variants`, so the
+feed can load thumbnails instead of originals.
+
+Images uploaded before derivatives existed (or whose rows failed to record)
+are handled by `flask images backfill`, which fetches and renders them on a
+process pool (Pillow work is CPU-bound) and stores the results from the
+parent process.
+"""
+import io
+import os
+from collections import defaultdict
+from datetime import datetime
+
+import click
+from flask import current_app
+from sqlalchemy import exists
+
+from ..extensions import cache, db
+from ..models import ImageDerivative, Listing, ListingImage
+from .cache import ListingScope
+from .uploads import (CONTENT_TYPES, render_settings, get_executor, get_storage, render_image,
+                      rendition_name)
+
+# Ids per IN (...) clause; stays under SQLite's bound-parameter limit
+_IN_CHUNK = 500
+
+_SWAPPED_ORIENTATIONS = {5, 6, 7, 8}
+
+
+def record_derivatives(results):
+    """Add ImageDerivative rows for successful process_uploads results."""
+    rows = []
+    for result in results:
+        if not result.get('ok'):
+            continue
+        for variant, fmt, url, width, height in result['renditions']:
+            rows.append(ImageDerivative(source_url=result['url'], variant=variant, format=fmt,
+                                        url=url, width=width, height=height))
+    db.session.add_all(rows)
+    return rows
+
+
+def fetch_derivatives(source_urls, variants=None):
+    """Return {source_url: {variant: {format: {url, width, height}}}}."""
+    source_urls = list({url for url in source_urls if url})
+    found = defaultdict(dict)
+    for start in range(0, len(source_urls), _IN_CHUNK):
+        query = ImageDerivative.query.filter(ImageDerivative.source_url.in_(source_urls[start:start + _IN_CHUNK]))
+        if variants:
+            query = query.filter(ImageDerivative.variant.in_(variants))
+        for d in query:
+            found[d.source_url].setdefault(d.variant, {})[d.format] = {
+                'url': d.url, 'width': d.width, 'height': d.height
+            }
+    return found
+
+
+def _source_size(data):
+    """Upright (width, height) of an image without decoding its pixels."""
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(data))
+    width, height = image.size
+    if image.getexif().get(0x0112) in _SWAPPED_ORIENTATIONS:
+        width, height = height, width
+    return width, height
+
+
+def _fetch(url, local_root, local_base_url):
+    if local_base_url and url.startswith(local_base_url):
+        with open(os.path.join(local_root, url[len(local_base_url):]), 'rb') as f:
+            return f.read()
+    import requests
+    response = requests.get(url, timeout=30)
+    response.raise_for_status()
+    return response.content
+
+
+def _render_existing(url, local_root, local_base_url, settings):
+    """Process-pool worker: fetch one source image and render its derivatives."""
+    try:
+        data = _fetch(url, local_root, local_base_url)
+        return url, _source_size(data), render_image(data, include_source=False, **settings), None
+    except Exception as e:
+        return url, None, None, str(e)
+
+
+def pending_sources(limit=None):
+    """Image URLs that have no derivatives yet."""
+    query = (db.session.query(ListingImage.filename).distinct()
+             .filter(~exists().where(ImageDerivative.source_url == ListingImage.filename))
+             .order_by(ListingImage.filename))
+    if limit:
+        query = query.limit(limit)
+    return [url for url, in query]
+
+
+def _touch_listings(urls):
+    """Bump updated_at on listings showing `urls` and drop their cached reads."""
+    listing_ids = db.session.query(ListingImage.listing_id).filter(ListingImage.filename.in_(urls))
+    listings = (db.session.query(Listing.id, Listing.category, Listing.user_id, Listing.buyer_id)
+                .filter(Listing.id.in_(listing_ids)).all())
+    if not listings:
+        return
+    (Listing.query.filter(Listing.id.in_([l.id for l in listings]))
+     .update({Listing.updated_at: datetime.utcnow()}, synchronize_session=False))
+    db.session.commit()
+    cache.invalidate_listings(*(ListingScope(*l) for l in listings))
+
+
+def backfill(workers=None, batch_size=50, limit=None, echo=None):
+    """Render and store derivatives for every image that lacks them.
+
+    Returns (processed, failed).
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    config = current_app.config
+    storage = get_storage()
+    settings = render_settings(config)
+    local_base_url = getattr(storage, 'base_url', None)
+    executor = get_executor(config['UPLOAD_MAX_WORKERS'])
+
+    sources = pending_sources(limit)
+    processed = failed = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for start in range(0, len(sources), batch_size):
+            batch = sources[start:start + batch_size]
+            rendered = pool.map(_render_existing, batch, [config['UPLOAD_FOLDER']] * len(batch),
+                                [local_base_url] * len(batch), [settings] * len(batch))
+            done = []
+            for url, size, renditions, error in rendered:
+                if error:
+                    failed += 1
+                    if echo:
+                        echo(f'  failed {url}: {error}')
+                    continue
+                key = os.path.splitext(os.path.basename(url))[0] or 'image'
+                saves = [(r, executor.submit(storage.save, r.data, rendition_name(key, r),
+                                             CONTENT_TYPES[r.format]))
+                         for r in renditions]
+                try:
+                    rows = [ImageDerivative(source_url=url, variant=r.variant, format=r.format,
+                                            url=future.result()['url'], width=r.width, height=r.height)
+                            for r, future in saves]
+                except Exception as e:
+                    failed += 1
+                    if echo:
+                        echo(f'  failed {url}: {str(e)}')
+                    continue
+                # The existing full-size JPEG is the source itself
+                rows.append(ImageDerivative(source_url=url, variant='full', format='jpeg', url=url,
+                                            width=size[0], height=size[1]))
+                db.session.add_all(rows)
+                done.append(url)
+            db.session.commit()
+            if done:
+                _touch_listings(done)
+            processed += len(done)
+            if echo:
+                echo(f'Processed {processed}/{len(sources)} ({failed} failed)')
+    return processed, failed
+
+
+@click.group('images')
+def images_cli():
+    """Listing image commands."""
+
+
+@images_cli.command('backfill')
+@click.option('--workers', type=int, default=None, help='Render processes (default: CPU count).')
+@click.option('--batch-size', type=int, default=50, help='Images per commit.')
+@click.option('--limit', type=int, default=None, help='Stop after this many images.')
+def backfill_command(workers, batch_size, limit):
+    """Render derivatives for images that have none yet."""
+    processed, failed = backfill(workers=workers, batch_size=batch_size, limit=limit, echo=click.echo)
+    click.echo(f'Done: {processed} processed, {failed} failed')
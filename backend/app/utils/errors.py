@@ -0,0 +1,13 @@
+"""Domain errors shared by the listing modules (hearts, listing_status).
+
+Routes translate these to responses: ListingNotFound to a 404,
+ListingUnavailable to a 400.
+"""
+
+
+class ListingNotFound(LookupError):
+    """No listing has this id."""
+
+
+class ListingUnavailable(ValueError):
+    """The listing is sold or pending, so it can't take part in this action."""
@@ -0,0 +1,47 @@
+"""Run the database's EXPLAIN on SQLAlchemy queries.
+
+Used by explain_queries.py to check that each route's query is served by
+the intended index, by GET /api/listing/?explain=1 and by the slow-query
+log (utils/slow_queries), which explains statements as the driver ran them.
+"""
+import re
+
+
+def explain(query, session, analyze=False, with_sql=False):
+    """Return the plan for `query` (ORM Query or Select) as a list of lines.
+
+    Bound values are inlined so the planner sees the same literals the route
+    would send. With analyze=True on Postgres the query is actually executed.
+    With with_sql=True, returns (sql, plan) instead.
+    """
+    statement = getattr(query, 'statement', query)
+    bind = session.get_bind()
+    sql = str(statement.compile(dialect=bind.dialect, compile_kwargs={'literal_binds': True}))
+    plan = explain_sql(session.connection(), sql, analyze=analyze)
+    return (sql, plan) if with_sql else plan
+
+
+def explain_sql(connection, sql, parameters=None, analyze=False):
+    """Return the plan for driver-level `sql` run on `connection`, as a list of lines.
+
+    Without `parameters`, `sql` is taken to have its values inlined.
+    """
+    if connection.dialect.name == 'postgresql':
+        prefix = 'EXPLAIN (ANALYZE, BUFFERS) ' if analyze else 'EXPLAIN '
+        if parameters is None:
+            # No parameters to format, so a literal % must not read as one
+            sql = sql.replace('%', '%%')
+        rows = connection.exec_driver_sql(prefix + sql, parameters)
+        return [row[0] for row in rows]
+
+    rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + sql, parameters)
+    return [row[-1] for row in rows]
+
+
+_INDEX_RE = re.compile(r'(?:USING (?:COVERING )?INDEX|Index (?:Only )?Scan(?: Backward)? using|'
+                       r'Bitmap Index Scan on) (\w+)')
+
+
+def indexes_used(plan):
+    """Return the names of the indexes referenced by an explain() plan."""
+    return sorted({name for line in plan for name in _INDEX_RE.findall(line)})
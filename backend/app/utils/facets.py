@@ -0,0 +1,90 @@
+"""Facet counts for the listing feed: categories, conditions and price buckets.
+
+All three come from one grouped query. Each listing matching the base
+criteria is reduced to (lower(category), condition, price bucket) plus a 0/1
+flag per facet filter, and the query returns one count per distinct
+combination: at most a few hundred rows, however many listings there are.
+Each facet is then summed in Python over the groups that pass every *other*
+facet's filter, so choosing "books" still shows how many tops there are,
+while the total honours all of them.
+"""
+from collections import Counter
+
+from flask import current_app
+from sqlalchemy import case, func, literal_column, select
+
+from ..extensions import db
+from ..models import Listing
+
+CATEGORIES = ('tops', 'bottoms', 'dresses', 'shoes', 'furniture', 'appliances', 'books', 'other')
+CONDITIONS = ('new', 'like new', 'good', 'fair', 'poor')
+FACETS = ('category', 'condition', 'price')
+
+
+def _number(n):
+    # Inline, so the result is an integer without the driver having to infer
+    # the type of a bound parameter
+    return literal_column(str(int(n)))
+
+
+def price_bucket(edges):
+    """Bucket number of Listing.price for ascending upper `edges` (len(edges) is open-ended)."""
+    if not edges:
+        return _number(0)
+    return case(*((Listing.price < edge, _number(number)) for number, edge in enumerate(edges)),
+                else_=_number(len(edges)))
+
+
+def _ordered(counts, known):
+    """Known values first, in their usual order and even when zero, then the rest by count."""
+    extra = sorted((v for v in counts if v not in known), key=lambda v: (-counts[v], str(v)))
+    return [{'value': value, 'count': counts[value]} for value in (*known, *extra)]
+
+
+def facet_counts(criteria=(), filters=None, edges=None):
+    """Category, condition and price-bucket counts for listings matching `criteria`.
+
+    `filters` maps a facet name ('category', 'condition' or 'price') to the
+    clause selecting it; those are the filters a facet ignores when counting
+    itself. `edges` defaults to the FACET_PRICE_BUCKETS setting.
+    """
+    filters = {name: clause for name, clause in (filters or {}).items() if clause is not None}
+    unknown = set(filters) - set(FACETS)
+    if unknown:
+        raise ValueError(f'Unknown facets: {", ".join(sorted(unknown))}')
+    edges = tuple(current_app.config['FACET_PRICE_BUCKETS'] if edges is None else edges)
+
+    # Per-row values in a subquery, so the outer GROUP BY names columns rather
+    # than repeating expressions with bound parameters (Postgres can't match those)
+    rows = (select(func.lower(Listing.category).label('category'),
+                   Listing.condition.label('condition'),
+                   price_bucket(edges).label('bucket'),
+                   *(case((clause, _number(1)), else_=_number(0)).label(f'in_{name}')
+                     for name, clause in filters.items()))
+            .where(*criteria)
+            .subquery())
+    flags = [rows.c[f'in_{name}'] for name in filters]
+    groups = db.session.execute(
+        select(rows.c.category, rows.c.condition, rows.c.bucket, *flags, func.count())
+        .group_by(rows.c.category, rows.c.condition, rows.c.bucket, *flags)
+    ).all()
+
+    counts = {name: Counter() for name in FACETS}
+    total = 0
+    for category, condition, bucket, *passed, count in groups:
+        passed = dict(zip(filters, passed))
+        values = {'category': category, 'condition': condition, 'price': bucket}
+        for name in FACETS:
+            if all(ok for other, ok in passed.items() if other != name):
+                counts[name][values[name]] += count
+        if all(passed.values()):
+            total += count
+
+    bounds = (0, *edges, None)
+    return {
+        'total': total,
+        'categories': _ordered(counts['category'], CATEGORIES),
+        'conditions': _ordered(counts['condition'], CONDITIONS),
+        'price_buckets': [{'min': bounds[i], 'max': bounds[i + 1], 'count': counts['price'][i]}
+                          for i in range(len(edges) + 1)],
+    }
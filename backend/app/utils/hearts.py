@@ -0,0 +1,104 @@
+"""Hearting and unhearting listings.
+
+hearted_listings is unique on (user_id, listing_id), so a heart is an
+INSERT ... ON CONFLICT DO NOTHING and an unheart a DELETE ... RETURNING:
+double clicks and client retries can race each other freely and still leave
+exactly one row (or none). Only the request that actually changed a row moves
+the listing's denormalized heart_count, in one UPDATE ... RETURNING that also
+hands back what cache invalidation needs. Repeating either call is a no-op
+that reports the current count.
+"""
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import literal, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from ..extensions import cache, db
+from ..models import HeartedListing, Listing
+from .cache import ListingScope
+from .errors import ListingNotFound, ListingUnavailable
+
+HeartState = namedtuple('HeartState', ['hearted', 'heart_count'])
+
+
+def _heart_statement(dialect_name, user_id, listing_id, now):
+    """Insert the heart if the listing exists and is available, skipping duplicates."""
+    hearts = HeartedListing.__table__
+    insert = pg_insert if dialect_name == 'postgresql' else sqlite_insert
+    source = (select(literal(user_id), Listing.id, literal(now))
+              .where(Listing.id == listing_id, Listing.status == 'available'))
+    return (insert(hearts)
+            .from_select(['user_id', 'listing_id', 'created_at'], source)
+            .on_conflict_do_nothing(index_elements=['user_id', 'listing_id'])
+            .returning(hearts.c.id))
+
+
+def _adjust_heart_count(listing_id, delta):
+    """Atomically add `delta` to a listing's heart_count; return (count, cache scope)."""
+    # updated_at moves too, since heart_count is part of the cached payload
+    row = db.session.execute(
+        update(Listing)
+        .where(Listing.id == listing_id)
+        .values(heart_count=Listing.heart_count + delta, updated_at=datetime.utcnow())
+        .returning(Listing.heart_count, Listing.category, Listing.user_id, Listing.buyer_id)
+        .execution_options(synchronize_session=False)
+    ).one()
+    return row.heart_count, ListingScope(listing_id, row.category, row.user_id, row.buyer_id)
+
+
+def _commit_change(listing_id, delta):
+    heart_count, scope = _adjust_heart_count(listing_id, delta)
+    db.session.commit()
+    cache.invalidate_listings(scope)
+    return heart_count
+
+
+def _current_count(listing_id):
+    """The listing's (status, heart_count); raises ListingNotFound."""
+    row = db.session.execute(
+        select(Listing.status, Listing.heart_count).where(Listing.id == listing_id)
+    ).first()
+    if row is None:
+        raise ListingNotFound(listing_id)
+    return row
+
+
+def heart(user_id, listing_id):
+    """Heart a listing for `user_id`; returns HeartState(True, heart_count).
+
+    Raises ListingNotFound, or ListingUnavailable for a sold or pending listing
+    the user hasn't already hearted.
+    """
+    stmt = _heart_statement(db.engine.dialect.name, user_id, listing_id, datetime.utcnow())
+    if db.session.execute(stmt).first() is not None:
+        return HeartState(True, _commit_change(listing_id, 1))
+
+    # Nothing inserted: an available listing was already hearted; otherwise
+    # the listing is missing, or sold and maybe hearted before the sale
+    status, heart_count = _current_count(listing_id)
+    if status != 'available':
+        hearted = db.session.execute(
+            select(HeartedListing.id).where(HeartedListing.user_id == user_id,
+                                            HeartedListing.listing_id == listing_id)
+        ).first()
+        if hearted is None:
+            raise ListingUnavailable(listing_id)
+    return HeartState(True, heart_count)
+
+
+def unheart(user_id, listing_id):
+    """Remove `user_id`'s heart; returns HeartState(False, heart_count).
+
+    Raises ListingNotFound for an unknown listing.
+    """
+    hearts = HeartedListing.__table__
+    deleted = db.session.execute(
+        hearts.delete()
+        .where(hearts.c.user_id == user_id, hearts.c.listing_id == listing_id)
+        .returning(hearts.c.id)
+    ).first()
+    if deleted is not None:
+        return HeartState(False, _commit_change(listing_id, -1))
+    return HeartState(False, _current_count(listing_id).heart_count)
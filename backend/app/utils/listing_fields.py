@@ -0,0 +1,42 @@
+"""Field rules shared by every way of writing a listing.
+
+The create and update routes and bulk import (utils/bulk.py) all validate
+through these, so a listing is stored the same way however it was made.
+"""
+
+MAX_IMAGES_PER_LISTING = 10
+# listing_images.filename is a VARCHAR(255)
+MAX_IMAGE_URL_LENGTH = 255
+MAX_CATEGORY_LENGTH = 50
+
+
+class InvalidField(ValueError):
+    """A listing field value that can't be stored."""
+
+
+def clean_images(images):
+    """`images` as a list of URL strings, or raise InvalidField."""
+    if images is None:
+        return []
+    if not isinstance(images, list) or not all(isinstance(url, str) for url in images):
+        raise InvalidField('images must be a list of URLs')
+    if len(images) > MAX_IMAGES_PER_LISTING:
+        raise InvalidField(f'At most {MAX_IMAGES_PER_LISTING} images per listing')
+    if any(len(url) > MAX_IMAGE_URL_LENGTH for url in images):
+        raise InvalidField(f'Image URLs are limited to {MAX_IMAGE_URL_LENGTH} characters')
+    return images
+
+
+def normalize_category(category):
+    """`category` as stored: trimmed and lowercase, 'other' when blank; raises InvalidField.
+
+    Facets, filters and the lower(category) indexes all assume this form.
+    """
+    if category is None:
+        return 'other'
+    if not isinstance(category, str):
+        raise InvalidField('category must be a string')
+    category = category.strip().lower()
+    if len(category) > MAX_CATEGORY_LENGTH:
+        raise InvalidField(f'category is longer than {MAX_CATEGORY_LENGTH} characters')
+    return category or 'other'
@@ -0,0 +1,142 @@
+"""Filters and sort orders for listing reads, parsed in one place.
+
+  ?category=books,tops          any of these (case-insensitive; repeatable)
+  &condition=new,like new       any of these
+  &min_price=5&max_price=40     inclusive price range
+  &status=available             any of available, pending, sold
+  &sort=newest                  or price_asc, price_desc
+
+parse_filters() validates request arguments into a ListingFilters, raising
+ValueError with a message fit for a 400. filter_clauses() turns them into
+WHERE clauses keyed by facet (so facet_counts can leave each facet's own
+filter out), and apply() into a filtered, ordered query.
+
+Every combination is shaped to fit an index on listings:
+
+  sort=newest, no category      ix_listings_created_at_id
+  sort=newest, status           ix_listings_status_created_at
+  sort=newest, category         ix_listings_category_created_at
+  price sort, no category       ix_listings_price
+  price sort, category          ix_listings_category_price
+
+Other filters (condition, a price range under newest) are checked against
+the rows the index yields in order, which with a LIMIT stops early.
+supporting_index() names the intended index; utils.explain shows the plan
+the database actually picks.
+"""
+from collections import namedtuple
+
+from sqlalchemy import func
+
+from ..extensions import db
+from ..models import Listing
+from .listing_status import STATUSES
+
+Sort = namedtuple('Sort', ['key', 'descending'])
+
+SORTS = {
+    'newest': Sort(Listing.created_at, True),
+    'price_asc': Sort(Listing.price, False),
+    'price_desc': Sort(Listing.price, True),
+}
+DEFAULT_SORT = 'newest'
+# Caps the IN (...) lists a client can make us build
+MAX_FILTER_VALUES = 20
+
+ListingFilters = namedtuple('ListingFilters',
+                            ['categories', 'conditions', 'statuses', 'min_price', 'max_price', 'sort'])
+
+
+def _values(args, name, lower=False):
+    """Distinct non-empty values of a repeatable, comma-separated argument, in order."""
+    values = []
+    for raw in args.getlist(name):
+        for value in raw.split(','):
+            value = value.strip()
+            value = value.lower() if lower else value
+            if value and value not in values:
+                values.append(value)
+    if len(values) > MAX_FILTER_VALUES:
+        raise ValueError(f'At most {MAX_FILTER_VALUES} values for {name}')
+    return tuple(values)
+
+
+def _price(args, name):
+    raw = args.get(name, '').strip()
+    if not raw:
+        return None
+    try:
+        price = float(raw)
+    except ValueError:
+        raise ValueError(f'{name} must be a number')
+    if not 0 <= price < float('inf'):
+        raise ValueError(f'{name} must be a non-negative number')
+    return price
+
+
+def parse_filters(args):
+    """ListingFilters from request arguments; raises ValueError on bad input."""
+    statuses = _values(args, 'status', lower=True)
+    unknown = [s for s in statuses if s not in STATUSES]
+    if unknown:
+        raise ValueError(f'Unknown status: {unknown[0]}')
+    sort = args.get('sort') or DEFAULT_SORT
+    if sort not in SORTS:
+        raise ValueError(f"sort must be one of: {', '.join(SORTS)}")
+    min_price = _price(args, 'min_price')
+    max_price = _price(args, 'max_price')
+    if min_price is not None and max_price is not None and min_price > max_price:
+        raise ValueError('min_price cannot be greater than max_price')
+    return ListingFilters(_values(args, 'category', lower=True), _values(args, 'condition'),
+                          statuses, min_price, max_price, sort)
+
+
+def _any_of(column, values):
+    if not values:
+        return None
+    return column == values[0] if len(values) == 1 else column.in_(values)
+
+
+def filter_clauses(filters):
+    """WHERE clauses by facet name ('category', 'condition', 'price', 'status'); None when unset."""
+    prices = []
+    if filters.min_price is not None:
+        prices.append(Listing.price >= filters.min_price)
+    if filters.max_price is not None:
+        prices.append(Listing.price <= filters.max_price)
+    return {
+        # Equality on lower(category) can use the lower(category) indexes;
+        # ILIKE cannot
+        'category': _any_of(func.lower(Listing.category), filters.categories),
+        'condition': _any_of(Listing.condition, filters.conditions),
+        'price': db.and_(*prices) if prices else None,
+        'status': _any_of(Listing.status, filters.statuses),
+    }
+
+
+def criteria(filters):
+    """All of the filters as a list of WHERE clauses."""
+    return [clause for clause in filter_clauses(filters).values() if clause is not None]
+
+
+def order_by(filters):
+    """ORDER BY for the requested sort, ties broken by id in the same direction."""
+    key, descending = SORTS[filters.sort]
+    return (key.desc(), Listing.id.desc()) if descending else (key.asc(), Listing.id.asc())
+
+
+def apply(query, filters):
+    """`query` filtered and ordered by `filters`."""
+    return query.filter(*criteria(filters)).order_by(*order_by(filters))
+
+
+def supporting_index(filters):
+    """Name of the listings index meant to serve this combination of filters and sort."""
+    if filters.sort != DEFAULT_SORT:
+        return 'ix_listings_category_price' if filters.categories else 'ix_listings_price'
+    if filters.categories:
+        return 'ix_listings_category_created_at'
+    if filters.statuses:
+        return 'ix_listings_status_created_at'
+    return 'ix_listings_created_at_id'
+
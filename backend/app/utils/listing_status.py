@@ -0,0 +1,109 @@
+"""The listing status state machine.
+
+  available --buy--> pending --sell--> sold
+      ^                 |
+      +-----cancel------+      (a seller may also sell straight from available)
+
+Every transition is one conditional UPDATE ... WHERE status IN (<allowed
+sources>) RETURNING, so two buyers racing for the same listing can't
+overwrite each other: the database lets exactly one UPDATE match, and the
+loser sees no row and gets a TransitionConflict. Nothing is read before the
+write; only a failed transition looks the listing up, to tell a missing
+listing from a conflicting one.
+
+Transitions don't commit, so callers can queue side effects (the outbox
+email for a buy request) in the same transaction.
+"""
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import select, update
+
+from ..extensions import db
+from ..models import Listing
+from .cache import ListingScope
+from .errors import ListingNotFound
+
+AVAILABLE = 'available'
+PENDING = 'pending'
+SOLD = 'sold'
+
+# status -> statuses it may move to
+TRANSITIONS = {
+    AVAILABLE: (PENDING, SOLD),
+    PENDING: (AVAILABLE, SOLD),
+    SOLD: (),
+}
+STATUSES = tuple(TRANSITIONS)
+
+Transitioned = namedtuple('Transitioned', ['id', 'title', 'price', 'category', 'user_id', 'buyer_id', 'status'])
+
+
+class InvalidStatus(ValueError):
+    pass
+
+
+class TransitionConflict(Exception):
+    """The listing wasn't in a status that allows the transition (any more)."""
+
+    def __init__(self, listing_id, current, target):
+        super().__init__(f'Listing {listing_id} is {current}, cannot become {target}')
+        self.current = current
+        self.target = target
+
+
+def sources(target):
+    """The statuses a listing may move to `target` from."""
+    if target not in TRANSITIONS:
+        raise InvalidStatus(target)
+    return tuple(status for status, targets in TRANSITIONS.items() if target in targets)
+
+
+def scope(row):
+    """Cache scope of a Transitioned row, as listing_scope() is for a Listing."""
+    return ListingScope(row.id, row.category, row.user_id, row.buyer_id)
+
+
+def _conflict(listing_id, target):
+    current = db.session.execute(select(Listing.status).where(Listing.id == listing_id)).scalar()
+    if current is None:
+        raise ListingNotFound(listing_id)
+    raise TransitionConflict(listing_id, current, target)
+
+
+def transition(listing_id, target, buyer_id=None):
+    """Move a listing to `target`; returns (Transitioned row, scope before the write).
+
+    Moving to pending records `buyer_id`; moving back to available clears it.
+    Raises InvalidStatus, ListingNotFound or TransitionConflict.
+    """
+    allowed = sources(target)
+    criteria = [Listing.id == listing_id, Listing.status.in_(allowed)]
+    values = {'status': target, 'updated_at': datetime.utcnow()}
+    previous_buyer = None
+    if target == PENDING:
+        values['buyer_id'] = buyer_id
+    elif target == AVAILABLE:
+        # RETURNING only sees the new row, and the buyer being cleared has
+        # cached /buyer pages to invalidate. Cancels are rare, so read it and
+        # make the UPDATE conditional on it not having changed since.
+        previous_buyer = db.session.execute(
+            select(Listing.buyer_id).where(Listing.id == listing_id)).scalar()
+        criteria.append(Listing.buyer_id.is_(None) if previous_buyer is None
+                        else Listing.buyer_id == previous_buyer)
+        values['buyer_id'] = None
+
+    row = db.session.execute(
+        update(Listing)
+        .where(*criteria)
+        .values(**values)
+        .returning(*(getattr(Listing, field) for field in Transitioned._fields))
+        .execution_options(synchronize_session=False)
+    ).first()
+    if row is None:
+        _conflict(listing_id, target)
+    row = Transitioned(*row)
+    # Only buyer_id decides which extra cached pages held the old row
+    before = ListingScope(row.id, row.category, row.user_id,
+                          previous_buyer if target == AVAILABLE else None)
+    return row, before
@@ -0,0 +1,315 @@
+"""Per-request performance metrics, exported in Prometheus text format.
+
+For every request, by endpoint (the Flask endpoint name, e.g.
+listing.get_listings, so URLs with ids don't explode the label set):
+
+  tigerpop_http_request_duration_seconds      latency histogram
+  tigerpop_http_requests_total                count by method and status
+  tigerpop_http_request_sql_statements        statements per request
+  tigerpop_http_request_sql_duration_seconds  SQL time per request
+
+SQL is timed with the engine's before/after_cursor_execute events. Calls to
+Cloudinary (each upload), SMTP (each message sent) and CAS (each
+serviceValidate) are wrapped in metrics.outbound(service):
+
+  tigerpop_outbound_duration_seconds{service}
+  tigerpop_outbound_errors_total{service}
+
+and count toward the request that made them, including calls made on a
+worker thread the request handed metrics.carry(fn) to. Streamed responses
+are measured until the last chunk is sent.
+
+Scrape METRICS_PATH (default /internal/metrics) with `Authorization: Bearer
+<METRICS_TOKEN>`. Without a METRICS_TOKEN the endpoint is only served in
+debug and answers 404 otherwise, so a default deploy doesn't publish its
+timings. Each worker process keeps its own
+numbers, as with prometheus_client without multiprocess mode. With
+SERVER_TIMING (always on in debug) responses carry a Server-Timing header
+for the browser's network panel.
+
+The hot path is two perf_counter() calls and a thread-local read per
+statement, and a few dictionary updates under a lock per request;
+benchmarks/metrics_overhead.py measures it.
+"""
+import hmac
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from flask import Response, current_app, has_app_context, request
+from sqlalchemy import event
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+PREFIX = 'tigerpop_'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def internal_auth_error():
+    """The error response for an /internal request without METRICS_TOKEN, else None.
+
+    With no token configured these endpoints only exist in debug: a 404
+    elsewhere, rather than serving them to anyone.
+    """
+    token = current_app.config.get('METRICS_TOKEN')
+    if not token:
+        if current_app.debug:
+            return None
+        return Response('Not Found\n', status=404, mimetype='text/plain')
+    supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+    if hmac.compare_digest(supplied.encode(), token.encode()):
+        return None
+    return Response('Unauthorized\n', status=401, mimetype='text/plain')
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels, buckets):
+        self.name = PREFIX + name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # One count per bucket, one for +Inf, then the sum
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def samples(self):
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+        for labels, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, '+Inf'), values):
+                cumulative += count
+                le = 'le="+Inf"' if bound == '+Inf' else f'le="{_number(float(bound))}"'
+                yield f'{self.name}_bucket{_labels(self.labels, labels, le)} {cumulative}'
+            yield f'{self.name}_sum{_labels(self.labels, labels)} {_number(values[-1])}'
+            yield f'{self.name}_count{_labels(self.labels, labels)} {cumulative}'
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help, labels):
+        self.name = PREFIX + name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            yield f'{self.name}{_labels(self.labels, labels)} {_number(value)}'
+
+
+class Registry:
+    """One app's metrics."""
+
+    def __init__(self):
+        self.request_duration = Histogram('http_request_duration_seconds', 'Request latency by endpoint.',
+                                          ('endpoint', 'method'), DURATION_BUCKETS)
+        self.requests = Counter('http_requests_total', 'Requests by endpoint, method and status.',
+                                ('endpoint', 'method', 'status'))
+        self.sql_statements = Histogram('http_request_sql_statements', 'SQL statements per request.',
+                                        ('endpoint',), STATEMENT_BUCKETS)
+        self.sql_duration = Histogram('http_request_sql_duration_seconds', 'SQL time per request.',
+                                      ('endpoint',), DURATION_BUCKETS)
+        self.outbound_duration = Histogram('outbound_duration_seconds', 'Calls to external services.',
+                                           ('service',), DURATION_BUCKETS)
+        self.outbound_errors = Counter('outbound_errors_total', 'Failed calls to external services.',
+                                       ('service',))
+
+    def render(self):
+        lines = []
+        for metric in (self.request_duration, self.requests, self.sql_statements, self.sql_duration,
+                       self.outbound_duration, self.outbound_errors):
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+class RequestTimings:
+    """What one request has spent so far."""
+
+    __slots__ = ('registry', 'started', 'sql_count', 'sql_seconds', 'outbound', '_lock')
+
+    def __init__(self, registry):
+        self.registry = registry
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.outbound = {}
+        self._lock = threading.Lock()
+
+    def add_outbound(self, service, seconds):
+        # Carried worker threads may report at the same time
+        with self._lock:
+            self.outbound[service] = self.outbound.get(service, 0.0) + seconds
+
+    def server_timing(self, total):
+        parts = [f'app;dur={total * 1000:.1f}',
+                 f'db;dur={self.sql_seconds * 1000:.1f};desc="{self.sql_count} queries"']
+        parts.extend(f'{service};dur={seconds * 1000:.1f}' for service, seconds in sorted(self.outbound.items()))
+        return ', '.join(parts)
+
+
+class Metrics:
+    def __init__(self, app=None):
+        self._local = threading.local()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        from ..extensions import db
+
+        app.config.setdefault('METRICS_ENABLED', True)
+        app.config.setdefault('METRICS_PATH', '/internal/metrics')
+        app.config.setdefault('METRICS_TOKEN', None)
+        app.config.setdefault('SERVER_TIMING', False)
+        if not app.config['METRICS_ENABLED']:
+            return
+        registry = app.extensions['metrics'] = Registry()
+
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+
+        app.before_request(lambda: self._start(registry))
+        app.after_request(self._finish)
+        app.add_url_rule(app.config['METRICS_PATH'], 'metrics', self._export)
+
+    # Requests
+
+    def _start(self, registry):
+        self._local.request = RequestTimings(registry)
+
+    def _finish(self, response):
+        timings = getattr(self._local, 'request', None)
+        if timings is None or request.endpoint == 'metrics':
+            self._local.request = None
+            return response
+        if current_app.debug or current_app.config['SERVER_TIMING']:
+            response.headers['Server-Timing'] = timings.server_timing(time.perf_counter() - timings.started)
+
+        labels = (request.endpoint or 'unmatched', request.method, str(response.status_code))
+        if response.is_streamed:
+            # The body (and its SQL) is produced while the server sends it
+            response.call_on_close(lambda: self._record(timings, labels))
+        else:
+            self._record(timings, labels)
+        return response
+
+    def _record(self, timings, labels):
+        elapsed = time.perf_counter() - timings.started
+        if getattr(self._local, 'request', None) is timings:
+            self._local.request = None
+        endpoint, method, _ = labels
+        registry = timings.registry
+        registry.request_duration.observe((endpoint, method), elapsed)
+        registry.requests.inc(labels)
+        registry.sql_statements.observe((endpoint,), timings.sql_count)
+        registry.sql_duration.observe((endpoint,), timings.sql_seconds)
+
+    # SQL
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if context is not None and getattr(self._local, 'request', None) is not None:
+            context._metrics_started = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, '_metrics_started', None)
+        timings = getattr(self._local, 'request', None)
+        if started is None or timings is None:
+            return
+        timings.sql_count += 1
+        timings.sql_seconds += time.perf_counter() - started
+
+    # Outbound calls
+
+    def current(self):
+        """The calling thread's RequestTimings, or None outside a request."""
+        return getattr(self._local, 'request', None)
+
+    def carry(self, fn):
+        """Wrap `fn` so outbound calls it makes on another thread count toward this request."""
+        timings = self.current()
+        if timings is None:
+            return fn
+
+        def run(*args, **kwargs):
+            self._local.request = timings
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self._local.request = None
+        return run
+
+    @contextmanager
+    def outbound(self, service):
+        """Time a call to an external service ('cloudinary', 'smtp', 'cas')."""
+        started = time.perf_counter()
+        failed = False
+        try:
+            yield
+        except Exception:
+            failed = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            timings = self.current()
+            if timings is not None:
+                timings.add_outbound(service, elapsed)
+                registry = timings.registry
+            else:
+                # e.g. the outbox dispatcher, outside any request
+                registry = current_app.extensions.get('metrics') if has_app_context() else None
+            if registry is not None:
+                registry.outbound_duration.observe((service,), elapsed)
+                if failed:
+                    registry.outbound_errors.inc((service,))
+
+    # Export
+
+    def _export(self):
+        denied = internal_auth_error()
+        if denied is not None:
+            return denied
+        return Response(current_app.extensions['metrics'].render(),
+                        content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+metrics = Metrics()
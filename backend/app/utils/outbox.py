@@ -0,0 +1,267 @@
+"""Transactional email outbox.
+
+Routes never talk to SMTP. They call `outbox.enqueue(...)`, which adds an
+OutboxMessage to the current session, so the email is committed (or rolled
+back) together with the change that caused it. A dispatcher then drains due
+messages over a single SMTP connection per batch:
+
+  thread    a daemon thread per worker process, started on first enqueue and
+            woken after each commit (default)
+  inline    after the enqueuing request commits, send the message it just
+            enqueued (at most OUTBOX_INLINE_LIMIT, within OUTBOX_INLINE_SECONDS);
+            never the backlog, which is left to `flask outbox drain`
+  external  nothing in-process; run `flask outbox run` (or `flask outbox drain`
+            from cron) next to the web workers. The default on serverless,
+            where background threads don't survive the response
+
+Failed sends are retried with exponential backoff; after OUTBOX_MAX_ATTEMPTS
+a message is marked dead and left in the table for inspection.
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app, g
+from sqlalchemy import inspect
+
+from ..extensions import db, mail
+from ..models import OutboxMessage
+from .metrics import metrics
+
+
+class Outbox:
+    """Flask extension owning the enqueue API and the dispatcher."""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('OUTBOX_DISPATCH', 'thread')
+        app.config.setdefault('OUTBOX_BATCH_SIZE', 50)
+        app.config.setdefault('OUTBOX_MAX_ATTEMPTS', 6)
+        app.config.setdefault('OUTBOX_BACKOFF_SECONDS', 30)
+        app.config.setdefault('OUTBOX_MAX_BACKOFF_SECONDS', 3600)
+        app.config.setdefault('OUTBOX_LEASE_SECONDS', 120)
+        app.config.setdefault('OUTBOX_POLL_SECONDS', 5)
+        app.config.setdefault('OUTBOX_INLINE_LIMIT', 1)
+        app.config.setdefault('OUTBOX_INLINE_SECONDS', 2)
+        app.extensions['outbox'] = _DispatcherThread(app)
+        app.cli.add_command(outbox_cli)
+
+    def enqueue(self, subject, recipients, body=None, html=None):
+        """Stage an email in the current session; it is sent after commit."""
+        message = OutboxMessage(subject=subject, recipients=recipients, body=body, html=html)
+        db.session.add(message)
+        # Inline dispatch sends only what this request enqueued
+        g.setdefault('outbox_enqueued', []).append(message)
+        return message
+
+    def notify(self):
+        """Tell the dispatcher new messages were committed."""
+        mode = current_app.config['OUTBOX_DISPATCH']
+        if mode == 'thread':
+            current_app.extensions['outbox'].wake()
+        elif mode == 'inline':
+            try:
+                self.send_enqueued()
+            except Exception as e:
+                # The message is safely stored; a later drain will retry it
+                current_app.logger.error(f"Inline outbox drain failed: {str(e)}")
+
+    def drain(self, max_batches=None):
+        """Send every due message, batch by batch. Returns (sent, failed)."""
+        sent = failed = batches = 0
+        while max_batches is None or batches < max_batches:
+            batch = self._claim()
+            if not batch:
+                break
+            batch_sent, batch_failed = self._deliver(batch)
+            sent += batch_sent
+            failed += batch_failed
+            batches += 1
+        return sent, failed
+
+    def send_enqueued(self):
+        """Send the committed messages this request enqueued; returns (sent, failed).
+
+        Only the first OUTBOX_INLINE_LIMIT are tried, and none is started
+        after OUTBOX_INLINE_SECONDS; the rest stay pending for a drain.
+        """
+        config = current_app.config
+        # Identity survives the commit's expiry, so reading it costs no query
+        ids = [state.identity[0] for state in map(inspect, g.pop('outbox_enqueued', []))
+               if state.identity is not None]
+        ids = ids[:config['OUTBOX_INLINE_LIMIT']]
+        if not ids:
+            return 0, 0
+        batch = self._claim(ids)
+        if not batch:
+            return 0, 0
+        return self._deliver(batch, deadline=time.monotonic() + config['OUTBOX_INLINE_SECONDS'])
+
+    def _claim(self, ids=None):
+        """Lease a batch of due messages so concurrent dispatchers skip them."""
+        config = current_app.config
+        now = datetime.utcnow()
+        query = (OutboxMessage.query
+                 .filter(OutboxMessage.status.in_([OutboxMessage.PENDING, OutboxMessage.SENDING]),
+                         OutboxMessage.next_attempt_at <= now))
+        if ids is not None:
+            query = query.filter(OutboxMessage.id.in_(ids))
+        query = query.order_by(OutboxMessage.next_attempt_at).limit(config['OUTBOX_BATCH_SIZE'])
+        if db.engine.dialect.name == 'postgresql':
+            query = query.with_for_update(skip_locked=True)
+
+        batch = query.all()
+        # A crashed dispatcher's messages come back once their lease expires
+        lease_until = now + timedelta(seconds=config['OUTBOX_LEASE_SECONDS'])
+        for message in batch:
+            message.status = OutboxMessage.SENDING
+            message.next_attempt_at = lease_until
+        db.session.commit()
+        return batch
+
+    def _deliver(self, batch, deadline=None):
+        from flask_mail import Message
+
+        sent = released = 0
+        pending = list(batch)
+        try:
+            # One SMTP connection (handshake, STARTTLS, login) for the batch
+            with mail.connect() as connection:
+                while pending:
+                    if deadline is not None and time.monotonic() > deadline:
+                        # Out of time: hand the rest back without counting an attempt
+                        for message in pending:
+                            message.status = OutboxMessage.PENDING
+                            message.next_attempt_at = datetime.utcnow()
+                        db.session.commit()
+                        released, pending = len(pending), []
+                        break
+                    message = pending[0]
+                    try:
+                        with metrics.outbound('smtp'):
+                            connection.send(Message(
+                                subject=message.subject,
+                                recipients=message.recipients,
+                                body=message.body,
+                                html=message.html
+                            ))
+                    except Exception as e:
+                        current_app.logger.error(f"Failed to send outbox message {message.id}: {str(e)}")
+                        self._record_failure(message, e)
+                        pending.pop(0)
+                        if not _connection_usable(connection):
+                            raise
+                    else:
+                        message.status = OutboxMessage.SENT
+                        message.sent_at = datetime.utcnow()
+                        message.last_error = None
+                        sent += 1
+                        pending.pop(0)
+                    db.session.commit()
+        except Exception as e:
+            # Could not connect, or the connection died: retry the rest later
+            current_app.logger.error(f"Outbox SMTP connection failed: {str(e)}")
+            for message in pending:
+                self._record_failure(message, e)
+            db.session.commit()
+        return sent, len(batch) - sent - released
+
+    def _record_failure(self, message, error):
+        config = current_app.config
+        message.attempts += 1
+        message.last_error = str(error)[:1000]
+        if message.attempts >= config['OUTBOX_MAX_ATTEMPTS']:
+            message.status = OutboxMessage.DEAD
+            current_app.logger.error(f"Outbox message {message.id} dead after {message.attempts} attempts")
+            return
+        delay = min(config['OUTBOX_BACKOFF_SECONDS'] * 2 ** (message.attempts - 1),
+                    config['OUTBOX_MAX_BACKOFF_SECONDS'])
+        message.status = OutboxMessage.PENDING
+        message.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+
+
+def _connection_usable(connection):
+    host = getattr(connection, 'host', None)
+    if host is None:
+        return True
+    try:
+        return host.noop()[0] == 250
+    except Exception:
+        return False
+
+
+class _DispatcherThread:
+    """Lazily started background thread that drains the outbox."""
+
+    def __init__(self, app):
+        self.app = app
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def wake(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='outbox-dispatcher', daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def _run(self):
+        poll_seconds = self.app.config['OUTBOX_POLL_SECONDS']
+        while True:
+            self._wakeup.wait(timeout=poll_seconds)
+            self._wakeup.clear()
+            with self.app.app_context():
+                try:
+                    outbox.drain()
+                except Exception as e:
+                    self.app.logger.error(f"Outbox dispatcher error: {str(e)}")
+                    db.session.rollback()
+                finally:
+                    db.session.remove()
+
+
+outbox = Outbox()
+
+
+@click.group('outbox')
+def outbox_cli():
+    """Email outbox commands."""
+
+
+@outbox_cli.command('drain')
+def drain_command():
+    """Send every due message once and exit (for cron)."""
+    sent, failed = outbox.drain()
+    click.echo(f'Sent {sent}, failed {failed}')
+
+
+@outbox_cli.command('run')
+@click.option('--interval', default=5.0, help='Seconds between polls.')
+def run_command(interval):
+    """Drain the outbox continuously."""
+    import time
+    click.echo('Outbox dispatcher running; Ctrl-C to stop')
+    while True:
+        sent, failed = outbox.drain()
+        if sent or failed:
+            click.echo(f'Sent {sent}, failed {failed}')
+        db.session.remove()
+        time.sleep(interval)
+
+
+@outbox_cli.command('status')
+def status_command():
+    """Count messages by status and show the most recent dead ones."""
+    counts = dict(db.session.query(OutboxMessage.status, db.func.count(OutboxMessage.id))
+                  .group_by(OutboxMessage.status))
+    for status in (OutboxMessage.PENDING, OutboxMessage.SENDING, OutboxMessage.SENT, OutboxMessage.DEAD):
+        click.echo(f'{status:<8} {counts.get(status, 0)}')
+    dead = (OutboxMessage.query.filter_by(status=OutboxMessage.DEAD)
+            .order_by(OutboxMessage.id.desc()).limit(10))
+    for message in dead:
+        click.echo(f'  dead #{message.id} to {", ".join(message.recipients)}: {message.last_error}')
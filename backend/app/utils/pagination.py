@@ -0,0 +1,81 @@
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    """Raised when a client sends a cursor we did not issue."""
+
+
+def encode_cursor(key, listing_id):
+    """Encode a (sort key, id) position, e.g. (created_at, id), as an opaque URL-safe token."""
+    payload = json.dumps([key.isoformat() if isinstance(key, datetime) else key, listing_id])
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, key_type=datetime):
+    """Decode a token produced by encode_cursor back into (key, id).
+
+    A cursor issued for a different sort order fails to parse as `key_type`
+    and is rejected like any other foreign cursor.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        key, listing_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if key_type is datetime:
+            key = datetime.fromisoformat(key)
+        elif isinstance(key, str) or key is None:
+            raise TypeError(f'Expected a {key_type.__name__} key')
+        else:
+            key = key_type(key)
+        return key, int(listing_id)
+    except (ValueError, TypeError, json.JSONDecodeError) as e:
+        raise InvalidCursor(f'Invalid cursor: {cursor}') from e
+
+
+def parse_limit(raw_limit):
+    """Clamp a requested page size into [1, MAX_PAGE_SIZE]."""
+    if raw_limit is None:
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(raw_limit)
+    except (TypeError, ValueError):
+        raise ValueError('limit must be an integer')
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def keyset_page(query, model, cursor=None, limit=DEFAULT_PAGE_SIZE, key=None, descending=True):
+    """Return one page of `query` and the cursor for the next one.
+
+    Rows are ordered by (key, id), newest first by default (key created_at,
+    descending), and the cursor points at the last row returned, so each page
+    is a range scan that starts where the previous one stopped instead of an
+    OFFSET over everything before it.
+    """
+    key = model.created_at if key is None else key
+    if cursor:
+        last_key, last_id = decode_cursor(cursor, key.type.python_type)
+        if descending:
+            after = or_(key < last_key, and_(key == last_key, model.id < last_id))
+        else:
+            after = or_(key > last_key, and_(key == last_key, model.id > last_id))
+        query = query.filter(after)
+
+    # Fetch one extra row so we know whether another page exists
+    order = (key.desc(), model.id.desc()) if descending else (key.asc(), model.id.asc())
+    rows = (query
+            .order_by(*order)
+            .limit(limit + 1)
+            .all())
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, key.key), last.id)
+    return rows, next_cursor
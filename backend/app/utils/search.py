@@ -0,0 +1,204 @@
+"""Full-text search over listing titles and descriptions.
+
+On Postgres, listings carry a generated ``search_vector`` tsvector column
+(see the ``add_listing_search_vector`` migration) backed by a GIN index, and
+results are ordered by ``ts_rank``. SQLite has no equivalent, so in
+development we keep a pure-Python inverted index per engine, built from the
+table on first use and kept current by mapper hooks on ``Listing``.
+"""
+import math
+import re
+import threading
+import weakref
+from bisect import bisect_left
+from collections import defaultdict
+
+from sqlalchemy import event, func, literal_column
+
+from ..models import Listing
+
+SEARCH_CONFIG = 'english'
+TITLE_WEIGHT = 3
+DESCRIPTION_WEIGHT = 1
+
+# Ids per IN (...) when loading fallback results; stays under SQLite's
+# bound-parameter limit
+_FETCH_CHUNK = 500
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+_STOPWORDS = frozenset({
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in',
+    'is', 'it', 'of', 'on', 'or', 'the', 'to', 'with'
+})
+
+
+def tokenize(text):
+    """Lowercase `text` and split it into indexable terms."""
+    if not text:
+        return []
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in _STOPWORDS]
+
+
+class InvertedIndex:
+    """In-memory term -> {listing_id: weight} index with prefix matching."""
+
+    def __init__(self):
+        self._postings = defaultdict(dict)
+        self._doc_terms = {}
+        self._vocabulary = []
+        self._vocabulary_dirty = False
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._doc_terms)
+
+    def add(self, listing_id, title, description):
+        weights = defaultdict(int)
+        for term in tokenize(title):
+            weights[term] += TITLE_WEIGHT
+        for term in tokenize(description):
+            weights[term] += DESCRIPTION_WEIGHT
+
+        with self._lock:
+            self._remove_locked(listing_id)
+            for term, weight in weights.items():
+                if term not in self._postings:
+                    self._vocabulary_dirty = True
+                self._postings[term][listing_id] = weight
+            self._doc_terms[listing_id] = tuple(weights)
+
+    def remove(self, listing_id):
+        with self._lock:
+            self._remove_locked(listing_id)
+
+    def _remove_locked(self, listing_id):
+        for term in self._doc_terms.pop(listing_id, ()):
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(listing_id, None)
+            if not postings:
+                del self._postings[term]
+                self._vocabulary_dirty = True
+
+    def _expand(self, prefix):
+        """Return every indexed term starting with `prefix`."""
+        if self._vocabulary_dirty:
+            self._vocabulary = sorted(self._postings)
+            self._vocabulary_dirty = False
+        terms = []
+        i = bisect_left(self._vocabulary, prefix)
+        while i < len(self._vocabulary) and self._vocabulary[i].startswith(prefix):
+            terms.append(self._vocabulary[i])
+            i += 1
+        return terms
+
+    def search(self, query):
+        """Return [(listing_id, score)] matching every term, best first.
+
+        The last term is treated as a prefix so results keep up with the
+        search box while the user is still typing.
+        """
+        terms = tokenize(query)
+        if not terms:
+            return []
+
+        with self._lock:
+            total_docs = max(len(self._doc_terms), 1)
+            scores = None
+            for i, term in enumerate(terms):
+                candidates = self._expand(term) if i == len(terms) - 1 else [term]
+                term_scores = defaultdict(float)
+                for candidate in candidates:
+                    postings = self._postings.get(candidate, {})
+                    idf = math.log(1 + total_docs / (1 + len(postings)))
+                    for listing_id, weight in postings.items():
+                        term_scores[listing_id] += weight * idf
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {lid: s + term_scores[lid] for lid, s in scores.items() if lid in term_scores}
+                if not scores:
+                    return []
+
+        return sorted(scores.items(), key=lambda item: (-item[1], -item[0]))
+
+
+# One fallback index per engine so separate apps (and tests) never share state
+_indexes = weakref.WeakKeyDictionary()
+_indexes_lock = threading.Lock()
+
+
+def _fallback_index(session):
+    engine = session.get_bind()
+    with _indexes_lock:
+        index = _indexes.get(engine)
+        if index is not None:
+            return index
+        index = InvertedIndex()
+        rows = session.query(Listing.id, Listing.title, Listing.description).yield_per(1000)
+        for listing_id, title, description in rows:
+            index.add(listing_id, title, description)
+        _indexes[engine] = index
+        return index
+
+
+@event.listens_for(Listing, 'after_insert')
+@event.listens_for(Listing, 'after_update')
+def _index_listing(mapper, connection, target):
+    index = _indexes.get(connection.engine)
+    if index is not None:
+        index.add(target.id, target.title, target.description)
+
+
+def index_listings(session, rows):
+    """Add (id, title, description) rows written with Core inserts, which skip the hooks above."""
+    index = _indexes.get(session.get_bind())
+    if index is not None:
+        for listing_id, title, description in rows:
+            index.add(listing_id, title, description)
+
+
+@event.listens_for(Listing, 'after_delete')
+def _unindex_listing(mapper, connection, target):
+    index = _indexes.get(connection.engine)
+    if index is not None:
+        index.remove(target.id)
+
+
+def build_tsquery(query):
+    """Turn free text into a safe ``to_tsquery`` string (AND, last term prefix)."""
+    terms = tokenize(query)
+    if not terms:
+        return None
+    terms[-1] = f'{terms[-1]}:*'
+    return ' & '.join(terms)
+
+
+def search_listings(query, session, text, limit=None):
+    """Return the Listings in `query` matching `text`, most relevant first."""
+    if session.get_bind().dialect.name == 'postgresql':
+        tsquery_text = build_tsquery(text)
+        if tsquery_text is None:
+            return []
+        tsquery = func.to_tsquery(SEARCH_CONFIG, tsquery_text)
+        search_vector = literal_column('listings.search_vector')
+        query = (query
+                 .filter(search_vector.op('@@')(tsquery))
+                 .order_by(func.ts_rank(search_vector, tsquery).desc(), Listing.id.desc()))
+        if limit is not None:
+            query = query.limit(limit)
+        return query.all()
+
+    # Fallback: rank in Python, then let the database apply the caller's
+    # filters to the ranked ids a chunk at a time, stopping once `limit` rows
+    # have survived. Ordering happens here, so SQLite never sorts by rank.
+    ranked = [listing_id for listing_id, _ in _fallback_index(session).search(text)]
+    results = []
+    for start in range(0, len(ranked), _FETCH_CHUNK):
+        chunk = ranked[start:start + _FETCH_CHUNK]
+        found = {listing.id: listing for listing in query.filter(Listing.id.in_(chunk))}
+        results.extend(found[listing_id] for listing_id in chunk if listing_id in found)
+        if limit is not None and len(results) >= limit:
+            return results[:limit]
+    return results
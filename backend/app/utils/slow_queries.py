@@ -0,0 +1,218 @@
+"""Slow-query log and route-tagged SQL.
+
+Every statement run while serving a request gets a sqlcommenter-style
+comment naming where it came from:
+
+  SELECT ... /*blueprint='listing',framework='flask',route='listing.get_listings'*/
+
+so pg_stat_activity, the Postgres log (log_min_duration_statement) and
+Supabase's query insights show the route next to the SQL. Keys are sorted
+and values URL-encoded, as the sqlcommenter spec asks. (pg_stat_statements
+ignores comments when it groups statements, so its query text carries the
+tag of whichever route ran a statement first.)
+
+Statements taking longer than SLOW_QUERY_MS are logged as warnings on the
+app logger with their endpoint and their parameters redacted: strings and
+bytes are replaced by their type and length, numbers and dates are kept. On
+Postgres (and SQLite, for development) a background thread then runs EXPLAIN
+for slow SELECTs, without ANALYZE, so nothing is executed twice, and
+attaches the plan. Each distinct statement is explained at most once per
+SLOW_QUERY_EXPLAIN_INTERVAL seconds, and when the queue is full plans are
+skipped rather than slowing requests down.
+
+The thread needs a connection of its own, so SLOW_QUERY_EXPLAIN defaults
+off with DB_POOL_MODE pooler or null: with one pooled connection per
+serverless function it would compete with the next request for it, and a
+frozen function may never finish it.
+
+The last SLOW_QUERY_LOG_SIZE slow queries, with plans, are served at
+/internal/slow-queries to requests bearing METRICS_TOKEN, like
+/internal/metrics; with no token set it only exists in debug.
+"""
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from urllib.parse import quote
+
+from flask import current_app, has_request_context, jsonify, request
+from sqlalchemy import event
+
+from .explain import explain_sql
+from .metrics import internal_auth_error
+
+_EXPLAIN_DIALECTS = ('postgresql', 'sqlite')
+_QUEUE_SIZE = 16
+
+
+def sql_comment(**tags):
+    """A sqlcommenter comment for `tags`: sorted keys, URL-encoded, single-quoted values."""
+    pairs = ','.join(f"{key}='{quote(str(value), safe='')}'" for key, value in sorted(tags.items()))
+    return f'/*{pairs}*/'
+
+
+def _redact_value(value):
+    if isinstance(value, str):
+        return f'<str:{len(value)}>'
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return f'<bytes:{len(value)}>'
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return f'<{type(value).__name__}>'
+
+
+def redact(parameters):
+    """DBAPI parameters with anything that could be personal data masked."""
+    if isinstance(parameters, dict):
+        return {key: _redact_value(value) for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [redact(p) if isinstance(p, (dict, list, tuple)) else _redact_value(p) for p in parameters]
+    return _redact_value(parameters)
+
+
+class _ExplainWorker:
+    """One daemon thread running EXPLAIN for slow statements, off the request path."""
+
+    def __init__(self, engine, logger, interval):
+        self.engine = engine
+        self.logger = logger
+        self.interval = interval
+        self.queue = queue.Queue(maxsize=_QUEUE_SIZE)
+        self.local = threading.local()
+        self._explained = {}
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, entry, statement, parameters):
+        now = time.monotonic()
+        with self._lock:
+            last = self._explained.get(statement)
+            if last is not None and now - last < self.interval:
+                return
+            if len(self._explained) > 1000:
+                self._explained.clear()
+            self._explained[statement] = now
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='slow-query-explain', daemon=True)
+                self._thread.start()
+        try:
+            self.queue.put_nowait((entry, statement, parameters))
+        except queue.Full:
+            pass
+
+    def _run(self):
+        # Our own EXPLAINs must not be logged (or explained) in turn
+        self.local.explaining = True
+        while True:
+            entry, statement, parameters = self.queue.get()
+            try:
+                entry['plan'] = self._explain(statement, parameters)
+                self.logger.warning(f"Plan for slow query on {entry['endpoint']}: {entry['plan']}")
+            except Exception as e:
+                entry['plan_error'] = str(e)
+            finally:
+                self.queue.task_done()
+
+    def _explain(self, statement, parameters):
+        with self.engine.connect() as connection:
+            plan = explain_sql(connection, statement, parameters)
+            connection.rollback()
+        return plan
+
+    def join(self):
+        """Wait until every queued statement has been explained (for tests)."""
+        self.queue.join()
+
+
+class SlowQueryLog:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        from ..extensions import db
+
+        app.config.setdefault('SQL_COMMENTS', True)
+        app.config.setdefault('SLOW_QUERY_MS', 250)
+        app.config.setdefault('SLOW_QUERY_EXPLAIN', app.config.get('DB_POOL_MODE') not in ('pooler', 'null'))
+        app.config.setdefault('SLOW_QUERY_EXPLAIN_INTERVAL', 300)
+        app.config.setdefault('SLOW_QUERY_LOG_SIZE', 100)
+        with app.app_context():
+            engine = db.engine
+
+        if app.config['SQL_COMMENTS']:
+            comments = {}
+
+            def tag_statement(conn, cursor, statement, parameters, context, executemany):
+                if not has_request_context() or request.endpoint is None:
+                    return statement, parameters
+                endpoint = request.endpoint
+                comment = comments.get(endpoint)
+                if comment is None:
+                    comment = comments[endpoint] = ' ' + sql_comment(
+                        route=endpoint, blueprint=request.blueprint or '', framework='flask')
+                return statement + comment, parameters
+
+            event.listen(engine, 'before_cursor_execute', tag_statement, retval=True)
+
+        threshold = app.config['SLOW_QUERY_MS']
+        if not threshold or threshold <= 0:
+            return
+        entries = deque(maxlen=app.config['SLOW_QUERY_LOG_SIZE'])
+        worker = None
+        if app.config['SLOW_QUERY_EXPLAIN'] and engine.dialect.name in _EXPLAIN_DIALECTS:
+            worker = _ExplainWorker(engine, app.logger, app.config['SLOW_QUERY_EXPLAIN_INTERVAL'])
+        app.extensions['slow_queries'] = {'threshold_ms': threshold, 'entries': entries, 'worker': worker}
+        logger = app.logger
+
+        def start_timer(conn, cursor, statement, parameters, context, executemany):
+            if context is not None:
+                context._slow_query_started = time.perf_counter()
+
+        def check_duration(conn, cursor, statement, parameters, context, executemany):
+            started = getattr(context, '_slow_query_started', None)
+            if started is None:
+                return
+            ms = (time.perf_counter() - started) * 1000
+            if ms < threshold or (worker is not None and getattr(worker.local, 'explaining', False)):
+                return
+            endpoint = request.endpoint if has_request_context() else None
+            entry = {
+                'at': datetime.utcnow().isoformat(),
+                'ms': round(ms, 3),
+                'endpoint': endpoint or threading.current_thread().name,
+                'statement': statement,
+                'parameters': redact(parameters),
+                'executemany': executemany,
+                'plan': None,
+            }
+            entries.append(entry)
+            logger.warning(f"Slow query ({entry['ms']:.1f} ms) on {entry['endpoint']}: {statement} "
+                           f"parameters={entry['parameters']}")
+            if worker is not None and not executemany and statement.lstrip()[:6].upper() == 'SELECT':
+                worker.submit(entry, statement, parameters)
+
+        event.listen(engine, 'before_cursor_execute', start_timer)
+        event.listen(engine, 'after_cursor_execute', check_duration)
+        app.add_url_rule('/internal/slow-queries', 'slow_queries', self._recent)
+
+    @staticmethod
+    def _recent():
+        denied = internal_auth_error()
+        if denied is not None:
+            return denied
+        state = current_app.extensions['slow_queries']
+        return jsonify({'threshold_ms': state['threshold_ms'], 'queries': list(reversed(state['entries']))})
+
+    @staticmethod
+    def wait_for_plans(app):
+        """Block until queued EXPLAINs have finished (for tests and scripts)."""
+        state = app.extensions.get('slow_queries')
+        if state and state['worker'] is not None:
+            state['worker'].join()
+
+
+slow_queries = SlowQueryLog()
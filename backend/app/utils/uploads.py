@@ -0,0 +1,284 @@
+"""Image upload pipeline.
+
+Each uploaded photo is decoded once with Pillow, rotated upright from its EXIF
+orientation, shrunk to fit UPLOAD_MAX_DIMENSION and re-encoded as a
+progressive JPEG, so storage and every later download see a bounded file
+instead of whatever the phone produced. Its derivatives (UPLOAD_VARIANTS in
+every format in UPLOAD_FORMATS) depend on the storage backend. Cloudinary
+gets only the normalized original and renders the rest from transformation
+URLs on first request. Local files have no such service, so the derivatives
+are rendered from the same decoded image and written next to it. See
+utils/derivatives.py for how they are recorded and served. Files are
+processed and stored concurrently on a shared, bounded thread pool, so a
+listing's photos take about as long as the slowest one rather than the sum
+of all of them.
+
+Storage backends (UPLOAD_STORAGE):
+  cloudinary  Cloudinary, via utils/cloudinary_config.py
+  local       files under UPLOAD_FOLDER, served by the listing blueprint
+
+Pillow is imported on first use, so requests that never touch an image don't
+pay for it at cold start.
+"""
+import io
+import os
+import threading
+import uuid
+from collections import namedtuple
+
+from flask import current_app, has_request_context, request
+
+from .metrics import metrics
+
+# Longest edge in pixels for each derivative below the full-size image
+DEFAULT_VARIANTS = {'thumb': 200, 'card': 480}
+DEFAULT_FORMATS = ('webp', 'jpeg')
+
+_EXTENSIONS = {'jpeg': 'jpg', 'webp': 'webp'}
+CONTENT_TYPES = {'jpeg': 'image/jpeg', 'webp': 'image/webp'}
+
+# One encoded image: variant is 'full' or a key of UPLOAD_VARIANTS
+Rendition = namedtuple('Rendition', ['variant', 'format', 'data', 'width', 'height'])
+
+
+class ImageRejected(ValueError):
+    """The upload is not an image Pillow can decode."""
+
+
+def _decode(data, max_dimension):
+    """Decode `data` to an upright RGB image no larger than max_dimension."""
+    from PIL import Image, ImageOps
+
+    try:
+        image = Image.open(io.BytesIO(data))
+        # JPEG can decode straight to a reduced scale, skipping most of the
+        # work for 12MP phone photos
+        image.draft('RGB', (max_dimension, max_dimension))
+        image = ImageOps.exif_transpose(image)
+    except Exception as e:
+        raise ImageRejected(f'Not a readable image: {str(e)}') from e
+
+    if image.mode in ('RGBA', 'LA', 'P'):
+        # Flatten transparency onto white; JPEG has no alpha channel
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    elif image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+    return image
+
+
+def _encode(image, fmt, quality):
+    output = io.BytesIO()
+    if fmt == 'jpeg':
+        image.save(output, format='JPEG', quality=quality, optimize=True, progressive=True)
+    elif fmt == 'webp':
+        image.save(output, format='WEBP', quality=quality, method=4)
+    else:
+        raise ValueError(f'Unsupported image format: {fmt}')
+    return output.getvalue()
+
+
+def normalize_image(data, max_dimension=2048, quality=82):
+    """Decode `data` once and return (jpeg_bytes, width, height)."""
+    image = _decode(data, max_dimension)
+    return _encode(image, 'jpeg', quality), image.width, image.height
+
+
+def render_image(data, max_dimension=2048, quality=82, variants=None, formats=DEFAULT_FORMATS,
+                 include_source=True):
+    """Decode `data` once and return a Rendition for every size and format.
+
+    The first rendition is the full-size JPEG (the image's canonical URL);
+    pass include_source=False when that already exists, e.g. in a backfill.
+    """
+    from PIL import Image
+
+    variants = DEFAULT_VARIANTS if variants is None else variants
+    image = _decode(data, max_dimension)
+    full_formats = ['jpeg'] if include_source else []
+    full_formats += [fmt for fmt in formats if fmt != 'jpeg']
+    renditions = [Rendition('full', fmt, _encode(image, fmt, quality), image.width, image.height)
+                  for fmt in full_formats]
+
+    # Largest first, each downscaled from the previous one rather than the full image
+    for variant, size in sorted(variants.items(), key=lambda item: -item[1]):
+        image = image.copy()
+        image.thumbnail((size, size), Image.LANCZOS)
+        for fmt in formats:
+            renditions.append(Rendition(variant, fmt, _encode(image, fmt, quality), image.width, image.height))
+    return renditions
+
+
+def fit_within(width, height, size):
+    """(width, height) scaled down, keeping the aspect ratio, to fit size x size."""
+    if width <= size and height <= size:
+        return width, height
+    scale = size / max(width, height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def rendition_name(key, rendition):
+    """Storage name for a rendition; the full JPEG keeps the bare key."""
+    suffix = '' if rendition.variant == 'full' else f'_{rendition.variant}'
+    return f'{key}{suffix}.{_EXTENSIONS[rendition.format]}'
+
+
+class LocalStorage:
+    """Writes files under `root` and returns URLs below `base_url`."""
+
+    # Nothing resizes local files on request: derivatives are stored at upload
+    transforms = False
+
+    def __init__(self, root, base_url):
+        self.root = root
+        self.base_url = base_url.rstrip('/') + '/'
+        os.makedirs(root, exist_ok=True)
+
+    def save(self, data, name, content_type='image/jpeg'):
+        path = os.path.join(self.root, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return {'url': self.base_url + name, 'key': name}
+
+
+class CloudinaryStorage:
+    """Uploads to Cloudinary; `name` becomes the public id."""
+
+    transforms = True
+
+    def save(self, data, name, content_type='image/jpeg'):
+        from .cloudinary_config import upload_image
+        result = upload_image(io.BytesIO(data), public_id=os.path.splitext(name)[0])
+        return {'url': result['secure_url'], 'key': result['public_id']}
+
+    def derivatives(self, stored, width, height, settings):
+        """(variant, format, url, width, height) for every other rendition of `stored`.
+
+        The URLs are Cloudinary transformations of the stored original, which
+        Cloudinary renders and caches on first request, so none of them is an
+        upload of its own.
+        """
+        from .cloudinary_config import image_url
+
+        key, quality, formats = stored['key'], settings['quality'], settings['formats']
+        renditions = [('full', fmt, image_url(key, format=fmt, quality=quality), width, height)
+                       for fmt in formats if fmt != 'jpeg']
+        for variant, size in settings['variants'].items():
+            scaled = fit_within(width, height, size)
+            renditions += [(variant, fmt, image_url(key, width=size, height=size, crop='limit', format=fmt,
+                                                    quality=quality), *scaled)
+                           for fmt in formats]
+        return renditions
+
+
+def get_storage():
+    """Storage backend for the current app."""
+    config = current_app.config
+    kind = config['UPLOAD_STORAGE']
+    if kind == 'cloudinary':
+        return CloudinaryStorage()
+    if kind == 'local':
+        base_url = config.get('UPLOAD_BASE_URL')
+        if not base_url:
+            host = request.host_url if has_request_context() else config['SERVICE_URL'].rstrip('/') + '/'
+            base_url = f'{host}api/listing/uploads/'
+        return LocalStorage(config['UPLOAD_FOLDER'], base_url)
+    raise ValueError(f'Unknown UPLOAD_STORAGE: {kind}')
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor(max_workers):
+    """Shared thread pool for storage I/O, created on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='upload')
+        return _executor
+
+
+def render_settings(config):
+    return {
+        'max_dimension': config['UPLOAD_MAX_DIMENSION'],
+        'quality': config['UPLOAD_JPEG_QUALITY'],
+        'variants': config['UPLOAD_VARIANTS'],
+        'formats': tuple(config['UPLOAD_FORMATS'])
+    }
+
+
+def _render_one(data, settings, render_derivatives):
+    """The renditions to store for one upload, full-size JPEG first."""
+    try:
+        if render_derivatives:
+            return render_image(data, **settings), None
+        jpeg, width, height = normalize_image(data, settings['max_dimension'], settings['quality'])
+        return [Rendition('full', 'jpeg', jpeg, width, height)], None
+    except Exception as e:
+        return None, e
+
+
+def process_uploads(files, storage=None):
+    """Normalize and store `files`, and their derivatives where needed, concurrently.
+
+    `files` are FileStorage objects. Returns one result dict per file, in the
+    order given; successful results carry the full-size `url` plus
+    `renditions`, a list of (variant, format, url, width, height): stored
+    files for local storage, transformation URLs for Cloudinary. Failed
+    results carry the `error`, and `rejected` when the file itself was at
+    fault (not an image Pillow can read) rather than storage.
+    """
+    config = current_app.config
+    storage = storage or get_storage()
+    executor = get_executor(config['UPLOAD_MAX_WORKERS'])
+    settings = render_settings(config)
+
+    # Request streams are read on this thread; workers only see bytes
+    sources = [(file.filename, file.read()) for file in files]
+    rendered = [executor.submit(_render_one, data, settings, not storage.transforms) for _, data in sources]
+
+    # Queue every rendition's save as soon as its file has been rendered
+    pending = []
+    for (filename, data), future in zip(sources, rendered):
+        renditions, error = future.result()
+        if error:
+            pending.append((filename, data, error, []))
+            continue
+        key = uuid.uuid4().hex
+        saves = [(r, executor.submit(metrics.carry(storage.save), r.data, rendition_name(key, r),
+                                     CONTENT_TYPES[r.format]))
+                 for r in renditions]
+        pending.append((filename, data, None, saves))
+
+    results = []
+    for filename, data, error, saves in pending:
+        if error:
+            results.append({'filename': filename, 'ok': False, 'error': str(error),
+                            'rejected': isinstance(error, ImageRejected)})
+            continue
+        try:
+            stored = [(r, future.result()) for r, future in saves]
+        except Exception as e:
+            results.append({'filename': filename, 'ok': False, 'error': str(e), 'rejected': False})
+            continue
+        full, saved = stored[0]
+        renditions = [(r.variant, r.format, s['url'], r.width, r.height) for r, s in stored]
+        if storage.transforms:
+            renditions += storage.derivatives(saved, full.width, full.height, settings)
+        results.append({
+            'filename': filename,
+            'ok': True,
+            'url': saved['url'],
+            'width': full.width,
+            'height': full.height,
+            'bytes': len(full.data),
+            'original_bytes': len(data),
+            'renditions': renditions
+        })
+    return results
@@ -0,0 +1,92 @@
+"""Per-request auth overhead with and without the token and user caches.
+
+Usage (from backend/):
+  python -m benchmarks.auth_benchmark
+  python -m benchmarks.auth_benchmark --requests 20000
+  DATABASE_URL=postgresql://... python -m benchmarks.auth_benchmark
+
+Reports the median cost of verifying a bearer token on its own, and of a full
+GET /api/auth/verify through the test client. SQLite makes the user lookup
+nearly free; against a remote Postgres the uncached column also pays a
+network round trip per request. Point DATABASE_URL at a scratch database:
+the users table is dropped and recreated.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from flask_jwt_extended import create_access_token, decode_token
+
+from app import create_app
+from app.config import Config
+from app.extensions import db
+from app.models import User
+
+
+def _per_call_us(fn, count, rounds=5):
+    samples = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for _ in range(count):
+            fn()
+        samples.append((time.perf_counter() - started) * 1e6 / count)
+    return statistics.median(samples)
+
+
+def run(database_url, cached, requests):
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = database_url
+        SQLALCHEMY_ENGINE_OPTIONS = {}
+        AUTH_TOKEN_CACHE_SIZE = 4096 if cached else 0
+        AUTH_USER_CACHE_SIZE = 4096 if cached else 0
+
+    app = create_app(BenchConfig)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        user = User(netid='bench', username='bench')
+        db.session.add(user)
+        db.session.commit()
+        token = create_access_token(identity=str(user.id), additional_claims={'netid': 'bench'})
+
+        with app.test_request_context():
+            decode_us = _per_call_us(lambda: decode_token(token), requests)
+
+        client = app.test_client()
+        headers = {'Authorization': f'Bearer {token}'}
+        assert client.get('/api/auth/verify', headers=headers).status_code == 200
+        verify_us = _per_call_us(lambda: client.get('/api/auth/verify', headers=headers), requests // 10)
+
+        db.session.remove()
+        db.drop_all()
+    return decode_us, verify_us
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=10000)
+    args = parser.parse_args()
+
+    database_url = os.environ.get('DATABASE_URL')
+    tmpdir = None
+    if not database_url:
+        tmpdir = tempfile.TemporaryDirectory()
+        database_url = f'sqlite:///{os.path.join(tmpdir.name, "auth_bench.db")}'
+    elif database_url.startswith('postgres://'):
+        database_url = database_url.replace('postgres://', 'postgresql://', 1)
+
+    uncached = run(database_url, False, args.requests)
+    cached = run(database_url, True, args.requests)
+    print(f'\n{"":<24}{"uncached us":>14}{"cached us":>12}{"speedup":>10}')
+    for label, before, after in (('token verification', uncached[0], cached[0]),
+                                 ('GET /api/auth/verify', uncached[1], cached[1])):
+        print(f'{label:<24}{before:>14.1f}{after:>12.1f}{before / after:>9.1f}x')
+
+    if tmpdir:
+        tmpdir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
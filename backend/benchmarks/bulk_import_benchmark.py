@@ -0,0 +1,98 @@
+"""Bulk listing import throughput against one create_listing-style insert per row.
+
+Usage (from backend/):
+  python -m benchmarks.bulk_import_benchmark
+  python -m benchmarks.bulk_import_benchmark --rows 10000 --baseline-rows 500
+  DATABASE_URL=postgresql://... python -m benchmarks.bulk_import_benchmark
+
+Generates NDJSON listings with two images each and imports them with
+utils.bulk (multi-row INSERTs, BULK_IMPORT_BATCH_SIZE per transaction).
+The baseline repeats create_listing's write path (insert and commit the
+listing, then insert and commit its images) for --baseline-rows rows and
+extrapolates. Point DATABASE_URL at a scratch database: tables are dropped
+and recreated.
+"""
+import argparse
+import io
+import json
+import os
+import tempfile
+import time
+
+from app import create_app
+from app.config import Config
+from app.extensions import db
+from app.models import Listing, ListingImage, User
+from app.utils.bulk import import_listings, read_rows
+
+
+def _ndjson(count):
+    return ''.join(json.dumps({
+        'title': f'Item {i}', 'description': f'Move-out sale item number {i}', 'price': 5 + i % 200,
+        'category': ('furniture', 'books', 'tops', 'other')[i % 4],
+        'images': [f'https://img.test/{i}a.jpg', f'https://img.test/{i}b.jpg']
+    }) + '\n' for i in range(count))
+
+
+def _per_row(body, user_id):
+    for line in body.splitlines():
+        row = json.loads(line)
+        listing = Listing(title=row['title'], description=row['description'], price=row['price'],
+                          category=row['category'], status='available', user_id=user_id)
+        db.session.add(listing)
+        db.session.commit()
+        for url in row['images']:
+            db.session.add(ListingImage(filename=url, listing_id=listing.id))
+        db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--baseline-rows', type=int, default=1000)
+    args = parser.parse_args()
+
+    database_url = os.environ.get('DATABASE_URL')
+    tmpdir = None
+    if not database_url:
+        tmpdir = tempfile.TemporaryDirectory()
+        database_url = f'sqlite:///{os.path.join(tmpdir.name, "bulk_bench.db")}'
+    elif database_url.startswith('postgres://'):
+        database_url = database_url.replace('postgres://', 'postgresql://', 1)
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = database_url
+        SQLALCHEMY_ENGINE_OPTIONS = {}
+
+    app = create_app(BenchConfig)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        user = User(netid='bench', username='bench')
+        db.session.add(user)
+        db.session.commit()
+
+        baseline_body = _ndjson(args.baseline_rows)
+        started = time.perf_counter()
+        _per_row(baseline_body, user.id)
+        baseline = (time.perf_counter() - started) / args.baseline_rows
+
+        body = _ndjson(args.rows)
+        started = time.perf_counter()
+        results = import_listings(read_rows(io.StringIO(body), 'ndjson'), user.id)
+        bulk = time.perf_counter() - started
+        assert all(r['ok'] for r in results)
+
+        print(f'\n{"":<30}{"rows/s":>10}{f"{args.rows} rows":>14}')
+        print(f'{"per-row create_listing path":<30}{1 / baseline:>10.0f}{baseline * args.rows:>13.1f}s')
+        print(f'{"bulk import":<30}{args.rows / bulk:>10.0f}{bulk:>13.1f}s')
+
+        db.session.remove()
+        db.drop_all()
+
+    if tmpdir:
+        tmpdir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+"""Local stand-ins for Cloudinary and SMTP, for load runs.
+
+    with FakeCloudinaryServer() as cloudinary, FakeSMTPServer() as smtp:
+        cloudinary.config()                      # point the SDK at it
+        app.config.update(smtp.mail_config())    # and Flask-Mail
+
+Like app/cas/stub.StubCASServer (the CAS stand-in), each runs on a daemon
+thread, binds an ephemeral port, counts what it received and can add a fixed
+delay to every call to mimic the real service's round trip.
+
+FakeCloudinaryServer answers the SDK's POST /v1_1/<cloud>/image/upload with
+the fields the app reads (secure_url, public_id). FakeSMTPServer speaks just
+enough SMTP for smtplib without TLS or auth, and keeps only the envelope.
+"""
+import json
+import re
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_PUBLIC_ID = re.compile(rb'name="public_id"\r\n\r\n([^\r]*)\r\n')
+
+
+class _Fake:
+    """Start/stop and the context manager protocol for a socketserver on a thread."""
+
+    def __init__(self, server, delay):
+        self.delay = delay
+        self._lock = threading.Lock()
+        self._server = server
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def address(self):
+        return self._server.server_address[:2]
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class FakeCloudinaryServer(_Fake):
+    def __init__(self, host='127.0.0.1', port=0, delay=0.0, cloud_name='loadtest'):
+        self.cloud_name = cloud_name
+        self.uploads = 0
+        self.bytes_received = 0
+        super().__init__(ThreadingHTTPServer((host, port), self._handler()), delay)
+
+    @property
+    def url(self):
+        host, port = self.address
+        return f'http://{host}:{port}'
+
+    def config(self):
+        """Point the cloudinary SDK, and utils/cloudinary_config.py, at this server.
+
+        Returns the environment variables cloudinary_config reads on first
+        upload; the caller must set them before that.
+        """
+        import cloudinary
+
+        cloudinary.config(cloud_name=self.cloud_name, api_key='loadtest', api_secret='loadtest',
+                          upload_prefix=self.url)
+        return {'CLOUDINARY_CLOUD_NAME': self.cloud_name, 'CLOUDINARY_API_KEY': 'loadtest',
+                'CLOUDINARY_API_SECRET': 'loadtest'}
+
+    def _respond(self, path, body):
+        if not path.endswith('/image/upload'):
+            return 404, {'error': {'message': 'not found'}}
+        match = _PUBLIC_ID.search(body)
+        with self._lock:
+            self.uploads += 1
+            self.bytes_received += len(body)
+            public_id = match.group(1).decode() if match else f'upload{self.uploads}'
+        return 200, {
+            'public_id': public_id,
+            'secure_url': f'https://res.cloudinary.com/{self.cloud_name}/image/upload/{public_id}.jpg',
+            'bytes': len(body),
+        }
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                status, payload = fake._respond(self.path, body)
+                if fake.delay:
+                    time.sleep(fake.delay)
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+class FakeSMTPServer(_Fake):
+    def __init__(self, host='127.0.0.1', port=0, delay=0.0):
+        self.messages = []
+        self.connections = 0
+        super().__init__(socketserver.ThreadingTCPServer((host, port), self._handler()), delay)
+
+    def mail_config(self):
+        """Flask-Mail settings that deliver to this server."""
+        host, port = self.address
+        return {'MAIL_SERVER': host, 'MAIL_PORT': port, 'MAIL_USE_TLS': False, 'MAIL_USE_SSL': False,
+                'MAIL_USERNAME': None, 'MAIL_PASSWORD': None, 'MAIL_SUPPRESS_SEND': False}
+
+    def _handler(self):
+        fake = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def reply(self, line):
+                self.wfile.write(line.encode('ascii') + b'\r\n')
+
+            def handle(self):
+                with fake._lock:
+                    fake.connections += 1
+                self.reply('220 fake ESMTP')
+                sender, recipients = None, []
+                for raw in self.rfile:
+                    command = raw.decode('utf-8', 'replace').rstrip('\r\n')
+                    verb = command[:4].upper()
+                    if verb in ('EHLO', 'HELO'):
+                        self.reply('250 fake')
+                    elif verb == 'MAIL':
+                        sender, recipients = command[10:].strip(), []
+                        self.reply('250 OK')
+                    elif verb == 'RCPT':
+                        recipients.append(command[8:].strip())
+                        self.reply('250 OK')
+                    elif verb == 'DATA':
+                        self.reply('354 End data with <CR><LF>.<CR><LF>')
+                        size = 0
+                        for line in self.rfile:
+                            if line in (b'.\r\n', b'.\n'):
+                                break
+                            size += len(line)
+                        if fake.delay:
+                            time.sleep(fake.delay)
+                        with fake._lock:
+                            fake.messages.append({'from': sender, 'to': recipients, 'bytes': size})
+                        self.reply('250 OK queued')
+                    elif verb == 'QUIT':
+                        self.reply('221 Bye')
+                        return
+                    elif verb in ('RSET', 'NOOP'):
+                        self.reply('250 OK')
+                    else:
+                        self.reply('502 Command not implemented')
+
+        return Handler
@@ -0,0 +1,80 @@
+"""Import-time profile of the serverless entry point (cold start).
+
+Usage (from backend/):
+  python -m benchmarks.importtime_profile
+  python -m benchmarks.importtime_profile --runs 10 --top 30
+  python -m benchmarks.importtime_profile --no-serverless
+
+Imports wsgi (what api/index.py loads) in fresh interpreters under
+`python -X importtime`, with VERCEL=1 unless --no-serverless. Reports the
+median wall time of the import, the packages that cost the most (self time
+summed per top-level package, from the median run) and whether the modules
+that should only load on first use (Pillow, cloudinary, requests, flask_mail,
+Alembic, ElementTree) were imported at startup.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Loaded on demand by the route or command that needs them
+DEFERRED = ('PIL', 'cloudinary', 'requests', 'flask_mail', 'alembic', 'flask_migrate',
+            'xml.etree.ElementTree', 'concurrent.futures.process')
+_SCRIPT = 'import time; t = time.perf_counter(); import wsgi; print(time.perf_counter() - t)'
+
+
+def profile_once(env):
+    """Return (wall seconds, {module: (self_us, cumulative_us)}) for one cold import."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', _SCRIPT], cwd=BACKEND, env=env,
+                            capture_output=True, text=True, check=True)
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return float(result.stdout.strip().splitlines()[-1]), modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--no-serverless', action='store_true', help='Profile the long-lived worker config.')
+    args = parser.parse_args()
+
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    if not args.no_serverless:
+        env['VERCEL'] = '1'
+    # Don't open a database connection while profiling imports
+    env['DB_WARM_ON_START'] = '0'
+    tmpdir = tempfile.TemporaryDirectory()
+    env.setdefault('DATABASE_URL', f'sqlite:///{os.path.join(tmpdir.name, "importtime.db")}')
+
+    profile_once(env)  # warm the filesystem cache and compiled bytecode
+    runs = sorted((profile_once(env) for _ in range(args.runs)), key=lambda run: run[0])
+    wall, modules = runs[len(runs) // 2]
+
+    packages = defaultdict(int)
+    for name, (self_us, _) in modules.items():
+        packages[name.split('.')[0]] += self_us
+
+    print(f'\nimport wsgi: median {statistics.median(r[0] for r in runs) * 1000:.1f} ms '
+          f'over {args.runs} runs, {len(modules)} modules')
+    print(f'\n{"package":<28}{"self ms":>10}')
+    for name, self_us in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+        print(f'{name:<28}{self_us / 1000:>10.1f}')
+    print(f'\n{"deferred module":<28}{"at startup":>10}')
+    for name in DEFERRED:
+        loaded = f'{modules[name][1] / 1000:.1f} ms' if name in modules else 'no'
+        print(f'{name:<28}{loaded:>10}')
+
+    tmpdir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
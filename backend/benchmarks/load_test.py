@@ -0,0 +1,433 @@
+"""Load test: browse, search, post, heart and buy against a local app, over HTTP.
+
+Usage (from backend/):
+  python -m benchmarks.load_test
+  python -m benchmarks.load_test --users 16 --iterations 100 --output after.json --baseline before.json
+  python -m benchmarks.load_test --duration 60 --mix browse=6,search=2,post=1,heart=2,buy=1
+  DATABASE_URL=postgresql://... python -m benchmarks.load_test --service-delay 50
+
+The app comes from create_app and is served by werkzeug's threaded server.
+Cloudinary and SMTP are replaced by the servers in benchmarks/fakes.py and
+CAS by app/cas/stub.py, all in this process; --service-delay adds a fixed
+latency (ms) to each of their calls, like the real round trip. Virtual users
+log in through /api/auth/validate with a stub CAS ticket, then each runs
+--iterations scenarios (or runs until --duration seconds), picked by weight
+from --mix:
+
+  browse  a feed page in a random sort, the next page, a listing, the facets
+  search  a title search and one of its results
+  post    upload --photos photos, then create a listing with their URLs
+  heart   heart a listing from the feed, fetch hearted listings, sometimes unheart
+  buy     request to buy an available listing; 409 when someone got there first
+
+Each user's choices come from a random.Random seeded with --seed and its
+number, and the seeded listings and photos from --seed, so runs with the same
+arguments send the same requests (with --duration, as many as fit). The
+report is JSON, printed or written to --output: per endpoint (method and
+route, e.g. "GET /api/listing/<id>"), requests, errors, throughput and
+p50/p95/p99 latency in ms, plus what the fake services received. With
+--baseline, a previous report, the table also shows the change in p95.
+Point DATABASE_URL at a scratch database: tables are dropped and recreated.
+"""
+import argparse
+import io
+import itertools
+import json
+import logging
+import math
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+import requests
+from sqlalchemy import insert
+from werkzeug.serving import make_server
+
+from app import create_app
+from app.cas.stub import StubCASServer
+from app.config import Config
+from app.extensions import db
+from app.models import Listing, User
+from app.utils.db_pool import engine_options
+from app.utils.facets import CATEGORIES, CONDITIONS
+from app.utils.listing_query import SORTS
+from benchmarks.fakes import FakeCloudinaryServer, FakeSMTPServer
+
+SCENARIOS = ('browse', 'search', 'post', 'heart', 'buy')
+DEFAULT_MIX = 'browse=6,search=3,post=1,heart=2,buy=1'
+PAGE_SIZE = 24
+SELLERS = 20
+
+ADJECTIVES = ('vintage', 'wooden', 'blue', 'black', 'small', 'large', 'used', 'cozy', 'leather', 'striped')
+NOUNS = ('lamp', 'desk', 'chair', 'jacket', 'textbook', 'sneakers', 'dress', 'jeans', 'microwave',
+         'mirror', 'rug', 'hoodie', 'kettle', 'bookshelf', 'boots')
+
+
+def parse_mix(text):
+    """{'browse': 6, ...} from 'browse=6,search=3,...'; raises ValueError."""
+    mix = {}
+    for part in filter(None, text.split(',')):
+        name, _, weight = part.partition('=')
+        if name not in SCENARIOS:
+            raise ValueError(f"unknown scenario {name!r}; choose from {', '.join(SCENARIOS)}")
+        mix[name] = float(weight or 1)
+    if not mix or sum(mix.values()) <= 0:
+        raise ValueError('the mix needs at least one scenario with a positive weight')
+    return mix
+
+
+def percentile(ordered, q):
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return None
+    return ordered[max(1, math.ceil(q / 100 * len(ordered))) - 1]
+
+
+def _seed(rng, size):
+    sellers = [User(netid=f'seller{i:02d}') for i in range(SELLERS)]
+    db.session.add_all(sellers)
+    db.session.commit()
+    start = datetime(2026, 1, 1)
+    db.session.execute(insert(Listing.__table__), [{
+        'title': f'{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)}',
+        'description': f'{rng.choice(ADJECTIVES).capitalize()} and {rng.choice(ADJECTIVES)}, pick up on campus.',
+        'price': float(rng.randrange(3, 400)), 'category': rng.choice(CATEGORIES),
+        'condition': rng.choice(CONDITIONS), 'status': 'available', 'user_id': rng.choice(sellers).id,
+        'created_at': start + timedelta(minutes=i)
+    } for i in range(size)])
+    db.session.commit()
+
+
+def _photos(rng, count, size):
+    """`count` JPEGs the size of a phone photo, shapes on a plain background."""
+    from PIL import Image, ImageDraw
+
+    photos = []
+    for _ in range(count):
+        image = Image.new('RGB', size, tuple(rng.randrange(256) for _ in range(3)))
+        draw = ImageDraw.Draw(image)
+        for _ in range(40):
+            x, y = rng.randrange(size[0]), rng.randrange(size[1])
+            draw.ellipse((x, y, x + rng.randrange(20, 400), y + rng.randrange(20, 400)),
+                         fill=tuple(rng.randrange(256) for _ in range(3)))
+        output = io.BytesIO()
+        image.save(output, format='JPEG', quality=90)
+        photos.append(output.getvalue())
+    return photos
+
+
+class VirtualUser:
+    """One logged-in user running scenarios on its own thread and HTTP session."""
+
+    def __init__(self, number, base_url, seed, photos):
+        self.number = number
+        self.base_url = base_url
+        self.rng = random.Random(f'{seed}:{number}')
+        self.photos = photos
+        self.session = requests.Session()
+        self.user_id = None
+        # endpoint -> [(seconds, status, ok)]
+        self.samples = defaultdict(list)
+
+    def call(self, method, route, path, expected=(200,), **kwargs):
+        """The response when its status is expected, else None; timed under `route`."""
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, self.base_url + path, timeout=60, **kwargs)
+            status = response.status_code
+        except requests.RequestException as e:
+            response, status = None, type(e).__name__
+        ok = status in expected
+        self.samples[route].append((time.perf_counter() - started, status, ok))
+        return response if ok else None
+
+    def login(self, cas):
+        ticket = f'ST-load-{self.number}'
+        cas.add_ticket(ticket, f'load{self.number:03d}')
+        response = self.call('GET', 'GET /api/auth/validate', '/api/auth/validate',
+                             params={'ticket': ticket, 'service': self.base_url})
+        if response is None:
+            raise RuntimeError(f'virtual user {self.number} could not log in')
+        body = response.json()
+        self.user_id = body['user_id']
+        self.session.headers['Authorization'] = f"Bearer {body['access_token']}"
+
+    def run(self, mix, iterations, deadline):
+        names, weights = list(mix), list(mix.values())
+        for _ in range(iterations) if iterations else itertools.count():
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            getattr(self, self.rng.choices(names, weights)[0])()
+
+    # Scenarios
+
+    def _feed(self, **params):
+        response = self.call('GET', 'GET /api/listing/', '/api/listing/', params={'limit': PAGE_SIZE, **params})
+        return response.json() if response is not None else None
+
+    def _view(self, listings):
+        if listings:
+            listing = self.rng.choice(listings)
+            self.call('GET', 'GET /api/listing/<id>', f"/api/listing/{listing['id']}")
+
+    def browse(self):
+        params = {'sort': self.rng.choice(list(SORTS))}
+        if self.rng.random() < 0.3:
+            params['category'] = self.rng.choice(CATEGORIES)
+        page = self._feed(**params)
+        if page is None:
+            return
+        listings = page['listings']
+        if page['next_cursor'] and self.rng.random() < 0.5:
+            more = self._feed(cursor=page['next_cursor'], **params)
+            if more is not None:
+                listings = more['listings']
+        self._view(listings)
+        self.call('GET', 'GET /api/listing/facets', '/api/listing/facets',
+                  params={k: v for k, v in params.items() if k == 'category'})
+
+    def search(self):
+        term = self.rng.choice(NOUNS if self.rng.random() < 0.7 else ADJECTIVES)
+        response = self.call('GET', 'GET /api/listing/?search', '/api/listing/',
+                             params={'search': term, 'limit': PAGE_SIZE})
+        if response is not None:
+            self._view(response.json()['listings'])
+
+    def post(self):
+        files = [('images', (f'photo{i}.jpg', data, 'image/jpeg')) for i, data in enumerate(self.photos)]
+        response = self.call('POST', 'POST /api/listing/upload', '/api/listing/upload', files=files)
+        if response is None:
+            return
+        self.call('POST', 'POST /api/listing/', '/api/listing/', expected=(201,), json={
+            'title': f'{self.rng.choice(ADJECTIVES)} {self.rng.choice(NOUNS)}',
+            'description': 'Posted by the load test.',
+            'price': self.rng.randrange(3, 400),
+            'category': self.rng.choice(CATEGORIES),
+            'condition': self.rng.choice(CONDITIONS),
+            'user_id': self.user_id,
+            'images': response.json()['urls'],
+        })
+
+    def heart(self):
+        page = self._feed(status='available', sort=self.rng.choice(list(SORTS)))
+        if not page or not page['listings']:
+            return
+        listing_id = self.rng.choice(page['listings'])['id']
+        # 400 when the listing was bought in between
+        self.call('POST', 'POST /api/listing/<id>/heart', f'/api/listing/{listing_id}/heart', expected=(200, 400))
+        self.call('GET', 'GET /api/listing/hearted', '/api/listing/hearted')
+        if self.rng.random() < 0.3:
+            self.call('DELETE', 'DELETE /api/listing/<id>/heart', f'/api/listing/{listing_id}/heart')
+
+    def buy(self):
+        page = self._feed(status='available', sort=self.rng.choice(list(SORTS)))
+        if page is None:
+            return
+        candidates = [listing for listing in page['listings'] if listing['user_id'] != self.user_id]
+        if not candidates:
+            return
+        listing_id = self.rng.choice(candidates)['id']
+        # 409 when another user claimed it first, which is the point of the race
+        self.call('POST', 'POST /api/listing/<id>/buy', f'/api/listing/{listing_id}/buy', expected=(200, 409),
+                  json={'buyer_id': self.user_id, 'message': 'Is this still available?'})
+
+
+def summarize(samples, elapsed):
+    """The report's 'endpoints' and 'total' from endpoint -> [(seconds, status, ok)]."""
+    def stats(calls):
+        ms = sorted(seconds * 1000 for seconds, _, _ in calls)
+        return {
+            'requests': len(calls),
+            'errors': sum(1 for _, _, ok in calls if not ok),
+            'throughput_rps': round(len(calls) / elapsed, 2),
+            'p50_ms': round(percentile(ms, 50), 2),
+            'p95_ms': round(percentile(ms, 95), 2),
+            'p99_ms': round(percentile(ms, 99), 2),
+            'max_ms': round(ms[-1], 2),
+            'statuses': dict(sorted(Counter(str(status) for _, status, _ in calls).items())),
+        }
+    endpoints = {route: stats(calls) for route, calls in sorted(samples.items())}
+    everything = [call for calls in samples.values() for call in calls]
+    return endpoints, stats(everything) if everything else None
+
+
+def _print_table(report, baseline=None):
+    previous = (baseline or {}).get('endpoints', {})
+    print(f'\n{"endpoint":<34}{"requests":>9}{"errors":>8}{"req/s":>9}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}'
+          + ('  p95 vs baseline' if baseline else ''), file=sys.stderr)
+    rows = list(report['endpoints'].items())
+    if report['total']:
+        rows.append(('total', report['total']))
+    for route, row in rows:
+        line = (f'{route:<34}{row["requests"]:>9}{row["errors"]:>8}{row["throughput_rps"]:>9.1f}'
+                f'{row["p50_ms"]:>9.1f}{row["p95_ms"]:>9.1f}{row["p99_ms"]:>9.1f}')
+        before = baseline.get('total') if baseline and route == 'total' else previous.get(route)
+        if baseline and before:
+            line += f'  {(row["p95_ms"] - before["p95_ms"]) / before["p95_ms"] * 100:+.1f}%'
+        print(line, file=sys.stderr)
+
+
+def run(database_url, users=8, iterations=None, duration=None, mix=None, seed=1, listings=1000,
+        photos=2, photo_size=(1600, 1200), service_delay=0.0, log_level=logging.ERROR):
+    """Run one load test and return its report (a JSON-serializable dict)."""
+    mix = mix or parse_mix(DEFAULT_MIX)
+    if not iterations and not duration:
+        iterations = 25
+    rng = random.Random(seed)
+    delay = service_delay / 1000
+    sqlite = database_url.startswith('sqlite')
+
+    class LoadConfig(Config):
+        SQLALCHEMY_DATABASE_URI = database_url
+        # SQLite lets one writer in at a time; wait for the lock rather than fail
+        SQLALCHEMY_ENGINE_OPTIONS = ({'connect_args': {'timeout': 30}} if sqlite else
+                                     engine_options('queue', database_url, pool_size=users + 4))
+        ENABLE_MIGRATIONS = False
+        JWT_SECRET_KEY = 'load-test-signing-key-not-for-production'
+        LOG_LEVEL = log_level
+        UPLOAD_STORAGE = 'cloudinary'
+        OUTBOX_DISPATCH = 'thread'
+        OUTBOX_POLL_SECONDS = 1
+
+    cloudinary = FakeCloudinaryServer(delay=delay).start()
+    smtp = FakeSMTPServer(delay=delay).start()
+    cas = StubCASServer(delay=delay).start()
+    saved_env = {key: os.environ.get(key) for key in cloudinary.config()}
+    os.environ.update(cloudinary.config())
+    server = None
+    try:
+        app = create_app(LoadConfig)
+        app.config.update(smtp.mail_config(), CAS_URL=cas.url)
+        # stdout is for the report
+        for handler in app.logger.handlers:
+            if isinstance(handler, logging.StreamHandler):
+                handler.setStream(sys.stderr)
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            _seed(rng, listings)
+            dialect = db.engine.dialect.name
+        payload = _photos(rng, photos, photo_size)
+
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f'http://127.0.0.1:{server.server_port}'
+
+        virtual_users = [VirtualUser(number, base_url, seed, payload) for number in range(users)]
+        for user in virtual_users:
+            user.login(cas)
+
+        start = threading.Barrier(users + 1)
+        deadline = [None]
+
+        def work(user):
+            start.wait()
+            user.run(mix, iterations, deadline[0])
+
+        threads = [threading.Thread(target=work, args=(user,), name=f'load-user-{user.number}')
+                   for user in virtual_users]
+        for thread in threads:
+            thread.start()
+        if duration:
+            deadline[0] = time.monotonic() + duration
+        started = time.perf_counter()
+        start.wait()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        # Purchase emails go out on the outbox thread; give it a moment to catch up
+        bought = sum(1 for user in virtual_users for _, status, _ in user.samples['POST /api/listing/<id>/buy']
+                     if status == 200)
+        waited = time.monotonic() + 10
+        while len(smtp.messages) < bought and time.monotonic() < waited:
+            time.sleep(0.1)
+
+        samples = defaultdict(list)
+        for user in virtual_users:
+            for route, calls in user.samples.items():
+                samples[route].extend(calls)
+        endpoints, total = summarize(samples, elapsed)
+        return {
+            'started_at': datetime.utcnow().isoformat(timespec='seconds'),
+            'database': dialect,
+            'settings': {'users': users, 'iterations': iterations, 'duration': duration, 'mix': mix, 'seed': seed,
+                         'listings': listings, 'photos': photos, 'photo_size': list(photo_size),
+                         'service_delay_ms': service_delay},
+            'elapsed_seconds': round(elapsed, 3),
+            'endpoints': endpoints,
+            'total': total,
+            'services': {'cloudinary_uploads': cloudinary.uploads, 'smtp_messages': len(smtp.messages),
+                         'cas_validations': cas.requests},
+        }
+    finally:
+        if server is not None:
+            server.shutdown()
+        for fake in (cloudinary, smtp, cas):
+            fake.stop()
+        for key, value in saved_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=8, help='Concurrent virtual users.')
+    parser.add_argument('--iterations', type=int, help='Scenarios per user (default 25 without --duration).')
+    parser.add_argument('--duration', type=float, help='Stop after this many seconds.')
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX, help=f'Scenario weights (default {DEFAULT_MIX}).')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--listings', type=int, default=1000, help='Listings seeded before the run.')
+    parser.add_argument('--photos', type=int, default=2, help='Photos per posted listing.')
+    parser.add_argument('--photo-size', type=int, nargs=2, default=(1600, 1200), metavar=('WIDTH', 'HEIGHT'))
+    parser.add_argument('--service-delay', type=float, default=0.0,
+                        help='Latency added to each Cloudinary, SMTP and CAS call, in ms.')
+    parser.add_argument('--output', help='Write the JSON report here instead of stdout.')
+    parser.add_argument('--baseline', help='A previous report to compare p95 latencies with.')
+    parser.add_argument('--verbose', action='store_true', help="Keep the app's and the server's logs.")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    database_url = os.environ.get('DATABASE_URL')
+    tmpdir = None
+    if not database_url:
+        tmpdir = tempfile.TemporaryDirectory()
+        database_url = f'sqlite:///{os.path.join(tmpdir.name, "load_test.db")}'
+    elif database_url.startswith('postgres://'):
+        database_url = database_url.replace('postgres://', 'postgresql://', 1)
+
+    try:
+        report = run(database_url, users=args.users, iterations=args.iterations, duration=args.duration,
+                     mix=args.mix, seed=args.seed, listings=args.listings, photos=args.photos,
+                     photo_size=tuple(args.photo_size), service_delay=args.service_delay,
+                     log_level=logging.INFO if args.verbose else logging.ERROR)
+    finally:
+        if tmpdir:
+            tmpdir.cleanup()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    _print_table(report, baseline)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    if report['total'] and report['total']['errors']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
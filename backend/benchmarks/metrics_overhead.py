@@ -0,0 +1,120 @@
+"""Request overhead of utils/metrics: the same requests with metrics on and off.
+
+Usage (from backend/):
+  python -m benchmarks.metrics_overhead
+  python -m benchmarks.metrics_overhead --requests 3000 --rounds 7 --max-overhead 3
+  DATABASE_URL=postgresql://... python -m benchmarks.metrics_overhead
+
+Two apps share one seeded database; one has METRICS_ENABLED off. Each round
+sends the same mix (a feed page, a listing, the facets and a 404) to both
+through the test client, alternating which goes first, and the median
+per-request time over rounds is compared. The response cache is off so
+every request runs its SQL, which is what the per-statement hooks cost.
+Exits non-zero when the overhead exceeds --max-overhead percent. Point
+DATABASE_URL at a scratch database: tables are dropped and recreated.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from app import create_app
+from app.config import Config
+from app.extensions import db
+from app.models import Listing, User
+
+
+def _load(size):
+    seller = User(netid='bench')
+    db.session.add(seller)
+    db.session.commit()
+    db.session.execute(insert(Listing.__table__), [{
+        'title': f'Listing number {i}', 'description': 'A used item.', 'price': float(5 + i % 200),
+        'category': ('furniture', 'books', 'tops', 'other')[i % 4], 'status': 'available',
+        'user_id': seller.id, 'condition': 'good', 'created_at': datetime(2026, 1, 1) + timedelta(minutes=i)
+    } for i in range(size)])
+    db.session.commit()
+
+
+def _paths(count):
+    mix = ['/api/listing/?limit=24', '/api/listing/1', '/api/listing/facets?category=books',
+           '/api/listing/?limit=24&sort=price_asc', '/api/nowhere']
+    return [mix[i % len(mix)] for i in range(count)]
+
+
+def _time(client, paths):
+    started = time.perf_counter()
+    for path in paths:
+        client.get(path).close()
+    return (time.perf_counter() - started) / len(paths)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--listings', type=int, default=500)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--max-overhead', type=float, default=5.0, help='Percent.')
+    args = parser.parse_args()
+
+    database_url = os.environ.get('DATABASE_URL')
+    tmpdir = None
+    if not database_url:
+        tmpdir = tempfile.TemporaryDirectory()
+        database_url = f'sqlite:///{os.path.join(tmpdir.name, "metrics_bench.db")}'
+    elif database_url.startswith('postgres://'):
+        database_url = database_url.replace('postgres://', 'postgresql://', 1)
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = database_url
+        SQLALCHEMY_ENGINE_OPTIONS = {}
+        CACHE_BACKEND = 'null'
+        OUTBOX_DISPATCH = 'external'
+        ENABLE_MIGRATIONS = False
+
+    class OffConfig(BenchConfig):
+        METRICS_ENABLED = False
+
+    instrumented = create_app(BenchConfig)
+    plain = create_app(OffConfig)
+    with instrumented.app_context():
+        db.drop_all()
+        db.create_all()
+        _load(args.listings)
+
+    paths = _paths(args.requests)
+    clients = {'off': plain.test_client(), 'on': instrumented.test_client()}
+    # Warm both: connections, compiled statement caches, lazy imports
+    for client in clients.values():
+        _time(client, paths[:50])
+
+    timings = {'off': [], 'on': []}
+    for round_number in range(args.rounds):
+        order = ('off', 'on') if round_number % 2 == 0 else ('on', 'off')
+        for name in order:
+            timings[name].append(_time(clients[name], paths))
+
+    off = statistics.median(timings['off'])
+    on = statistics.median(timings['on'])
+    overhead = (on - off) / off * 100
+    print(f'\n{"":<16}{"ms/request":>12}')
+    print(f'{"metrics off":<16}{off * 1000:>12.3f}')
+    print(f'{"metrics on":<16}{on * 1000:>12.3f}')
+    print(f'{"overhead":<16}{overhead:>11.1f}%  (limit {args.max_overhead:.1f}%)')
+
+    with instrumented.app_context():
+        db.session.remove()
+        db.drop_all()
+    if tmpdir:
+        tmpdir.cleanup()
+    if overhead > args.max_overhead:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+"""Compare listing search via ILIKE scans against the full-text search path.
+
+Usage (from backend/):
+  python -m benchmarks.search_benchmark                       # SQLite, 10k/100k/1M
+  python -m benchmarks.search_benchmark --sizes 10000,100000
+  DATABASE_URL=postgresql://... python -m benchmarks.search_benchmark
+
+Each size is loaded into a fresh database. On SQLite the full-text path is the
+in-process inverted index; on Postgres it is the generated tsvector column and
+GIN index from the add_listing_search_vector migration, which this script
+applies to the benchmark database. Point DATABASE_URL at a scratch database:
+the listings table is dropped and recreated for every size.
+"""
+import argparse
+import importlib.util
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, or_
+
+from app import create_app
+from app.config import Config
+from app.extensions import db
+from app.models import Listing, User
+from app.utils.search import search_listings
+
+VOCABULARY_SIZE = 5000
+
+
+def _vocabulary(seed=7):
+    """Pseudo-words with Zipfian frequencies, like real listing text."""
+    rng = random.Random(seed)
+    words = set()
+    while len(words) < VOCABULARY_SIZE:
+        words.add(''.join(rng.choice('abcdefghijklmnoprstuvwy') for _ in range(rng.randint(4, 9))))
+    words = sorted(words)
+    rng.shuffle(words)
+    cum_weights = []
+    total = 0.0
+    for rank in range(1, len(words) + 1):
+        total += 1.0 / rank
+        cum_weights.append(total)
+    return words, cum_weights
+
+
+WORDS, CUM_WEIGHTS = _vocabulary()
+# Common, medium and rare terms, a two-word query and a typeahead prefix
+QUERIES = [WORDS[3], WORDS[150], WORDS[2500], f'{WORDS[20]} {WORDS[40]}', WORDS[60][:3]]
+
+
+def _random_text(rng, length):
+    return ' '.join(rng.choices(WORDS, cum_weights=CUM_WEIGHTS, k=length))
+
+
+def _load(size, seed=42, chunk=10000):
+    rng = random.Random(seed)
+    seller = User(netid='bench')
+    db.session.add(seller)
+    db.session.commit()
+
+    start = datetime(2026, 1, 1)
+    for offset in range(0, size, chunk):
+        rows = []
+        for i in range(offset, min(offset + chunk, size)):
+            rows.append({
+                'title': _random_text(rng, 3),
+                'description': _random_text(rng, 12),
+                'price': round(rng.uniform(1, 500), 2),
+                'category': 'other',
+                'status': 'available',
+                'user_id': seller.id,
+                'condition': 'good',
+                'created_at': start + timedelta(seconds=i)
+            })
+        db.session.execute(insert(Listing.__table__), rows)
+        db.session.commit()
+
+
+def _apply_search_migration():
+    path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'migrations', 'versions',
+                        '20261018_add_listing_search_vector.py')
+    spec = importlib.util.spec_from_file_location('search_migration', path)
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+
+    from alembic.migration import MigrationContext
+    from alembic.operations import Operations
+
+    with db.engine.begin() as connection:
+        context = MigrationContext.configure(connection)
+        with Operations.context(context):
+            migration.upgrade()
+
+
+def _ilike_query(text):
+    pattern = f'%{text}%'
+    return (Listing.query
+            .filter(or_(Listing.title.ilike(pattern), Listing.description.ilike(pattern)))
+            .order_by(Listing.created_at.desc()))
+
+
+def _time(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def run(size, database_url, repeat):
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = database_url
+        SQLALCHEMY_ENGINE_OPTIONS = {}
+
+    app = create_app(BenchConfig)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        is_postgres = db.engine.dialect.name == 'postgresql'
+
+        started = time.perf_counter()
+        _load(size)
+        load_ms = (time.perf_counter() - started) * 1000
+
+        if is_postgres:
+            started = time.perf_counter()
+            _apply_search_migration()
+            with db.engine.begin() as connection:
+                connection.exec_driver_sql('ANALYZE listings')
+            index_ms = (time.perf_counter() - started) * 1000
+        else:
+            started = time.perf_counter()
+            search_listings(Listing.query, db.session, 'warmup')
+            index_ms = (time.perf_counter() - started) * 1000
+
+        print(f'\n{size:>9,} listings  (load {load_ms:,.0f} ms, index build {index_ms:,.0f} ms, '
+              f'{db.engine.dialect.name})')
+        print(f'  {"query":<26}{"matches":>9}{"ilike ms":>12}{"fts ms":>10}{"speedup":>10}')
+        for text in QUERIES:
+            ids = Listing.query.with_entities(Listing.id)
+            matches = len(search_listings(ids, db.session, text))
+            ilike_ms = _time(lambda: _ilike_query(text).with_entities(Listing.id).all(), repeat)
+            fts_ms = _time(lambda: search_listings(ids, db.session, text), repeat)
+            print(f'  {text:<26}{matches:>9,}{ilike_ms:>12.1f}{fts_ms:>10.1f}'
+                  f'{ilike_ms / fts_ms if fts_ms else float("inf"):>9.1f}x')
+
+        db.session.remove()
+        db.drop_all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='10000,100000,1000000')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    database_url = os.environ.get('DATABASE_URL')
+    tmpdir = None
+    if not database_url:
+        tmpdir = tempfile.TemporaryDirectory()
+        database_url = f'sqlite:///{os.path.join(tmpdir.name, "search_bench.db")}'
+    elif database_url.startswith('postgres://'):
+        database_url = database_url.replace('postgres://', 'postgresql://', 1)
+
+    for size in (int(s) for s in args.sizes.split(',')):
+        run(size, database_url, args.repeat)
+
+    if tmpdir:
+        tmpdir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
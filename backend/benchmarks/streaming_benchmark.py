@@ -0,0 +1,125 @@
+"""Peak memory of buffered vs streamed listing collections, via tracemalloc.
+
+Usage (from backend/):
+  python -m benchmarks.streaming_benchmark                    # 1k/10k/50k listings
+  python -m benchmarks.streaming_benchmark --sizes 1000,100000
+
+The buffered path is what jsonify(serialize_listings(query.all())) did: every
+ORM object, every payload dict and the whole JSON string alive at once. The
+streamed path is stream_listings, consumed chunk by chunk the way a WSGI
+server writes it out. Peak memory for the streamed path should stay flat as
+the collection grows.
+"""
+import argparse
+import gc
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import insert
+
+from app import create_app
+from app.config import Config
+from app.extensions import db
+from app.models import Listing, ListingImage, User
+from app.serializers import STREAM_BATCH_SIZE, serialize_listings, stream_listings
+
+
+def _load(size, chunk=10000):
+    seller = User(netid='bench')
+    db.session.add(seller)
+    db.session.commit()
+
+    start = datetime(2026, 1, 1)
+    for offset in range(0, size, chunk):
+        ids = range(offset + 1, min(offset + chunk, size) + 1)
+        db.session.execute(insert(Listing.__table__), [{
+            'id': i,
+            'title': f'Listing number {i}',
+            'description': 'A perfectly ordinary description of a used item. ' * 4,
+            'price': float(i % 500),
+            'category': 'other',
+            'status': 'available',
+            'user_id': seller.id,
+            'condition': 'good',
+            'created_at': start + timedelta(seconds=i)
+        } for i in ids])
+        db.session.execute(insert(ListingImage.__table__), [
+            {'listing_id': i, 'filename': f'https://res.cloudinary.com/demo/image/upload/{i}.jpg'}
+            for i in ids
+        ])
+        db.session.commit()
+
+
+def _query():
+    return Listing.query.order_by(Listing.created_at.desc())
+
+
+def _buffered():
+    return len(current_app.json.dumps(serialize_listings(_query().all())))
+
+
+def _streamed(batch_size):
+    return sum(len(chunk) for chunk in stream_listings(_query(), batch_size=batch_size))
+
+
+def _measure(fn):
+    db.session.remove()
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    size = fn()
+    elapsed = (time.perf_counter() - started) * 1000
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    db.session.remove()
+    return size, peak / (1024 * 1024), elapsed
+
+
+def run(size, database_url, batch_size):
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = database_url
+        SQLALCHEMY_ENGINE_OPTIONS = {}
+
+    app = create_app(BenchConfig)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        _load(size)
+
+        buffered_bytes, buffered_peak, buffered_ms = _measure(_buffered)
+        streamed_bytes, streamed_peak, streamed_ms = _measure(lambda: _streamed(batch_size))
+        print(f'{size:>9,}  {buffered_bytes / 1e6:>8.1f} MB body  '
+              f'buffered peak {buffered_peak:>8.1f} MB ({buffered_ms:>7,.0f} ms)  '
+              f'streamed peak {streamed_peak:>6.1f} MB ({streamed_ms:>7,.0f} ms)')
+
+        db.session.remove()
+        db.drop_all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='1000,10000,50000')
+    parser.add_argument('--batch-size', type=int, default=STREAM_BATCH_SIZE)
+    args = parser.parse_args()
+
+    database_url = os.environ.get('DATABASE_URL')
+    tmpdir = None
+    if not database_url:
+        tmpdir = tempfile.TemporaryDirectory()
+        database_url = f'sqlite:///{os.path.join(tmpdir.name, "streaming_bench.db")}'
+    elif database_url.startswith('postgres://'):
+        database_url = database_url.replace('postgres://', 'postgresql://', 1)
+
+    for size in (int(s) for s in args.sizes.split(',')):
+        run(size, database_url, args.batch_size)
+
+    if tmpdir:
+        tmpdir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
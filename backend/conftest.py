@@ -0,0 +1,98 @@
+from contextlib import contextmanager
+
+import pytest
+from flask.testing import FlaskClient
+from sqlalchemy import event
+from sqlalchemy.pool import StaticPool
+
+from app import create_app
+from app.config import Config
+from app.extensions import db
+from app.models import User
+
+
+class TestConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    # Tests write through the ORM directly; cache tests opt back in
+    CACHE_BACKEND = 'null'
+    # Tests drain the outbox explicitly
+    OUTBOX_DISPATCH = 'external'
+    # The explain thread would share the single in-memory connection
+    SLOW_QUERY_EXPLAIN = False
+    # One shared in-memory connection so every thread sees the same database
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'poolclass': StaticPool,
+        'connect_args': {'check_same_thread': False}
+    }
+
+
+@pytest.fixture
+def config_overrides():
+    """Settings layered over TestConfig; override in a test module, or give it
+    params, to customize the app."""
+    return {}
+
+
+@pytest.fixture
+def config(config_overrides):
+    """Config class for the `app` fixture: TestConfig plus `config_overrides`."""
+    if not config_overrides:
+        return TestConfig
+    return type('OverrideConfig', (TestConfig,), dict(config_overrides))
+
+
+@pytest.fixture
+def app(config):
+    app = create_app(config)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def seller(app):
+    seller = User(netid='seller1')
+    db.session.add(seller)
+    db.session.commit()
+    return seller
+
+
+class BufferedClient(FlaskClient):
+    """Reads streamed bodies fully before returning, as a real server would
+    before handling the next request."""
+
+    def open(self, *args, **kwargs):
+        kwargs.setdefault('buffered', True)
+        return super().open(*args, **kwargs)
+
+
+@pytest.fixture
+def client(app):
+    app.test_client_class = BufferedClient
+    return app.test_client()
+
+
+@pytest.fixture
+def count_queries(app):
+    """Context manager collecting the SQL statements executed inside it."""
+    @contextmanager
+    def counter():
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    return counter
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'smtp_down: point the mail config at a closed port')
+    config.addinivalue_line('markers', 'dispatch(mode): set OUTBOX_DISPATCH for the test app')
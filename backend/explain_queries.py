@@ -0,0 +1,83 @@
+"""Print the query plan for each listing route's main query.
+
+Usage:
+  # against the configured DATABASE_URL (Postgres) or the local SQLite db
+  python backend/explain_queries.py
+  python backend/explain_queries.py --analyze   # Postgres: EXPLAIN ANALYZE
+
+Use this after applying the add_listing_indexes migration to confirm the
+planner picks the intended index for each access pattern. On a nearly empty
+table Postgres may still prefer a sequential scan; run it against a database
+with realistic row counts (and after ANALYZE) before drawing conclusions.
+"""
+import argparse
+import os
+import sys
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import func, or_, and_
+
+from app import create_app
+from app.extensions import db
+from app.models import Listing, ListingImage, HeartedListing
+from app.utils.explain import explain, indexes_used
+
+
+def route_queries():
+    """(label, expected index, query) for each route's hot query."""
+    cursor_at = datetime(2026, 1, 1)
+    return [
+        ('get_listings (feed page)', 'ix_listings_created_at_id',
+         Listing.query.order_by(Listing.created_at.desc(), Listing.id.desc()).limit(25)),
+        ('get_listings (next page)', 'ix_listings_created_at_id',
+         Listing.query.filter(or_(
+             Listing.created_at < cursor_at,
+             and_(Listing.created_at == cursor_at, Listing.id < 1000)
+         )).order_by(Listing.created_at.desc(), Listing.id.desc()).limit(25)),
+        ('get_listings (category + max_price)', 'ix_listings_category_price',
+         Listing.query.filter(func.lower(Listing.category) == 'furniture', Listing.price <= 50)),
+        ('get_listings (max_price)', 'ix_listings_price',
+         Listing.query.filter(Listing.price <= 5)),
+        ('get_listings (status feed)', 'ix_listings_status_created_at',
+         Listing.query.filter(Listing.status == 'available')
+         .order_by(Listing.created_at.desc()).limit(25)),
+        ('get_user_listings', 'ix_listings_user_id_created_at',
+         Listing.query.filter(Listing.user_id == 1).order_by(Listing.created_at.desc())),
+        ('get_buyer_listings', 'ix_listings_buyer_id_created_at',
+         Listing.query.filter(Listing.buyer_id == 1).order_by(Listing.created_at.desc())),
+        ('listing images (selectinload)', 'ix_listing_images_listing_id',
+         ListingImage.query.filter(ListingImage.listing_id.in_([1, 2, 3]))),
+        ('get_hearted_listings', 'ix_hearted_listings_user_id_created_at',
+         HeartedListing.query.filter(HeartedListing.user_id == 1)
+         .order_by(HeartedListing.created_at.desc())),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='EXPLAIN each listing route query')
+    parser.add_argument('--analyze', action='store_true', help='Postgres only: run EXPLAIN ANALYZE')
+    args = parser.parse_args()
+
+    app = create_app()
+    missing = 0
+    with app.app_context():
+        print(f'Database: {db.engine.dialect.name}\n')
+        for label, expected, query in route_queries():
+            plan = explain(query, db.session, analyze=args.analyze)
+            used = indexes_used(plan)
+            ok = expected in used
+            missing += not ok
+            print(f'{"OK  " if ok else "MISS"} {label}  (expected {expected}, used: {", ".join(used) or "none"})')
+            for line in plan:
+                print(f'       {line}')
+            print()
+
+    if missing:
+        print(f'{missing} route queries did not use their expected index.')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,13 @@
+"""Management entry point.
+
+  FLASK_APP=manage.py flask db upgrade        # Alembic migrations
+  FLASK_APP=manage.py flask outbox run        # email outbox dispatcher
+  FLASK_APP=manage.py flask outbox drain      # send due emails once (cron)
+  FLASK_APP=manage.py flask outbox status     # counts and dead letters
+  FLASK_APP=manage.py flask images backfill   # render missing image derivatives
+  FLASK_APP=manage.py flask listings import FILE --netid NETID   # bulk NDJSON/CSV import
+  FLASK_APP=manage.py flask listings export [FILE]               # NDJSON export
+"""
 from flask_migrate import Migrate
 from app import create_app
 from app.extensions import db
@@ -0,0 +1,36 @@
+"""Add image_derivatives table
+
+Revision ID: 20261018_add_image_derivatives
+Revises: 20261018_add_outbox_messages
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20261018_add_image_derivatives'
+down_revision = '20261018_add_outbox_messages'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'image_derivatives',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('source_url', sa.String(length=255), nullable=False),
+        sa.Column('variant', sa.String(length=20), nullable=False),
+        sa.Column('format', sa.String(length=10), nullable=False),
+        sa.Column('url', sa.String(length=255), nullable=False),
+        sa.Column('width', sa.Integer(), nullable=False),
+        sa.Column('height', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('source_url', 'variant', 'format', name='uq_image_derivatives_source_variant_format')
+    )
+
+
+def downgrade():
+    op.drop_table('image_derivatives')
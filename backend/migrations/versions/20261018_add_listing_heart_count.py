@@ -0,0 +1,26 @@
+"""Add heart_count to listings
+
+Revision ID: 20261018_add_listing_heart_count
+Revises: 20261018_add_image_derivatives
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20261018_add_listing_heart_count'
+down_revision = '20261018_add_image_derivatives'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('listings', sa.Column('heart_count', sa.Integer(), nullable=False, server_default='0'))
+    op.execute('UPDATE listings SET heart_count = '
+               '(SELECT count(*) FROM hearted_listings WHERE hearted_listings.listing_id = listings.id)')
+
+
+def downgrade():
+    op.drop_column('listings', 'heart_count')
@@ -0,0 +1,56 @@
+"""Add indexes for listing feed, dashboard and heart queries
+
+Revision ID: 20261018_add_listing_indexes
+Revises: 20261018_add_listing_search_vector
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20261018_add_listing_indexes'
+down_revision = '20261018_add_listing_search_vector'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Feed: ORDER BY created_at DESC, id DESC (keyset pagination)
+    op.create_index('ix_listings_created_at_id', 'listings',
+                    [sa.text('created_at DESC'), sa.text('id DESC')])
+    # Feed filtered to one status, newest first
+    op.create_index('ix_listings_status_created_at', 'listings',
+                    ['status', sa.text('created_at DESC')])
+    # Seller and buyer dashboards, newest first
+    op.create_index('ix_listings_user_id_created_at', 'listings',
+                    ['user_id', sa.text('created_at DESC')])
+    op.create_index('ix_listings_buyer_id_created_at', 'listings',
+                    ['buyer_id', sa.text('created_at DESC')])
+    # Case-insensitive category match, optionally bounded by max_price
+    op.create_index('ix_listings_category_price', 'listings',
+                    [sa.text('lower(category)'), 'price'])
+    # max_price on its own
+    op.create_index('ix_listings_price', 'listings', ['price'])
+
+    # Postgres does not index foreign keys automatically; every listing
+    # serialization looks images up by listing_id.
+    op.create_index('ix_listing_images_listing_id', 'listing_images', ['listing_id'])
+
+    # A user's hearted feed, and hearts per listing
+    op.create_index('ix_hearted_listings_user_id_created_at', 'hearted_listings',
+                    ['user_id', sa.text('created_at DESC')])
+    op.create_index('ix_hearted_listings_listing_id', 'hearted_listings', ['listing_id'])
+
+
+def downgrade():
+    op.drop_index('ix_hearted_listings_listing_id', table_name='hearted_listings')
+    op.drop_index('ix_hearted_listings_user_id_created_at', table_name='hearted_listings')
+    op.drop_index('ix_listing_images_listing_id', table_name='listing_images')
+    op.drop_index('ix_listings_price', table_name='listings')
+    op.drop_index('ix_listings_category_price', table_name='listings')
+    op.drop_index('ix_listings_buyer_id_created_at', table_name='listings')
+    op.drop_index('ix_listings_user_id_created_at', table_name='listings')
+    op.drop_index('ix_listings_status_created_at', table_name='listings')
+    op.drop_index('ix_listings_created_at_id', table_name='listings')
@@ -0,0 +1,46 @@
+"""Add full-text search vector to listings
+
+Revision ID: 20261018_add_listing_search_vector
+Revises: 20260214_add_netid_to_users
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '20261018_add_listing_search_vector'
+down_revision = '20260214_add_netid_to_users'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # tsvector/GIN are Postgres-only; SQLite dev databases use the in-process
+    # index in app/utils/search.py instead.
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    # A stored generated column is recomputed by Postgres on every write, so it
+    # can never drift from title/description. Must match SEARCH_CONFIG.
+    op.execute("""
+        ALTER TABLE listings ADD COLUMN search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(description, '')), 'B')
+        ) STORED
+    """)
+    op.create_index(
+        'ix_listings_search_vector',
+        'listings',
+        ['search_vector'],
+        postgresql_using='gin'
+    )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.drop_index('ix_listings_search_vector', table_name='listings')
+    op.drop_column('listings', 'search_vector')
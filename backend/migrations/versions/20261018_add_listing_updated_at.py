@@ -0,0 +1,28 @@
+"""Add updated_at to listings
+
+Revision ID: 20261018_add_listing_updated_at
+Revises: 20261018_add_listing_indexes
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20261018_add_listing_updated_at'
+down_revision = '20261018_add_listing_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('listings', sa.Column('updated_at', sa.DateTime(), nullable=True))
+    # Existing rows have not changed since they were created
+    op.execute('UPDATE listings SET updated_at = created_at')
+    op.create_index('ix_listings_updated_at', 'listings', ['updated_at'])
+
+
+def downgrade():
+    op.drop_index('ix_listings_updated_at', table_name='listings')
+    op.drop_column('listings', 'updated_at')
@@ -0,0 +1,38 @@
+"""Index the feed's category and price sort orders
+
+Revision ID: 20261018_listing_sort_indexes
+Revises: 20261018_unique_hearted_listings
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20261018_listing_sort_indexes'
+down_revision = '20261018_unique_hearted_listings'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Category feed, newest first
+    op.create_index('ix_listings_category_created_at', 'listings',
+                    [sa.text('lower(category)'), sa.text('created_at DESC'), sa.text('id DESC')])
+    # Price sorts break ties on id, so the index has to carry it (Postgres
+    # indexes don't end in the row id the way SQLite's do)
+    op.drop_index('ix_listings_category_price', table_name='listings')
+    op.create_index('ix_listings_category_price', 'listings',
+                    [sa.text('lower(category)'), 'price', 'id'])
+    op.drop_index('ix_listings_price', table_name='listings')
+    op.create_index('ix_listings_price', 'listings', ['price', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_listings_price', table_name='listings')
+    op.create_index('ix_listings_price', 'listings', ['price'])
+    op.drop_index('ix_listings_category_price', table_name='listings')
+    op.create_index('ix_listings_category_price', 'listings',
+                    [sa.text('lower(category)'), 'price'])
+    op.drop_index('ix_listings_category_created_at', table_name='listings')
@@ -0,0 +1,26 @@
+"""Store listing categories lowercased
+
+Revision ID: 20261018_lowercase_listing_categories
+Revises: 20261018_listing_sort_indexes
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '20261018_lowercase_listing_categories'
+down_revision = '20261018_listing_sort_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Listings created before categories were normalized on write
+    op.execute("UPDATE listings SET category = lower(trim(category)) WHERE category <> lower(trim(category))")
+    op.execute("UPDATE listings SET category = 'other' WHERE category IS NULL OR category = ''")
+
+
+def downgrade():
+    # The original spelling isn't kept
+    pass
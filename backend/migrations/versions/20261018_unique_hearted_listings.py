@@ -0,0 +1,30 @@
+"""Make hearted_listings unique per user and listing
+
+Revision ID: 20261018_unique_hearted_listings
+Revises: 20261018_add_listing_heart_count
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '20261018_unique_hearted_listings'
+down_revision = '20261018_add_listing_heart_count'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Racing double clicks left duplicate hearts; keep the first of each
+    op.execute('DELETE FROM hearted_listings WHERE id NOT IN '
+               '(SELECT min(id) FROM hearted_listings GROUP BY user_id, listing_id)')
+    op.execute('UPDATE listings SET heart_count = '
+               '(SELECT count(*) FROM hearted_listings WHERE hearted_listings.listing_id = listings.id)')
+    with op.batch_alter_table('hearted_listings') as batch_op:
+        batch_op.create_unique_constraint('uq_hearted_listings_user_listing', ['user_id', 'listing_id'])
+
+
+def downgrade():
+    with op.batch_alter_table('hearted_listings') as batch_op:
+        batch_op.drop_constraint('uq_hearted_listings_user_listing', type_='unique')
@@ -0,0 +1,73 @@
+import time
+from datetime import timedelta
+
+import pytest
+from flask_jwt_extended import create_access_token
+
+from app.extensions import db
+from app.models import User
+
+
+@pytest.fixture
+def user(app):
+    user = User(netid='tiger1', username='tiger')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def _headers(user, **kwargs):
+    token = create_access_token(identity=str(user.id), additional_claims={'netid': user.netid}, **kwargs)
+    return {'Authorization': f'Bearer {token}'}
+
+
+def test_warm_verify_skips_signature_check_and_database(app, client, user, count_queries):
+    headers = _headers(user)
+    first = client.get('/api/auth/verify', headers=headers)
+    with count_queries() as statements:
+        second = client.get('/api/auth/verify', headers=headers)
+
+    assert first.status_code == second.status_code == 200
+    assert second.get_json() == {'username': 'tiger', 'email': None, 'user_id': user.id, 'netid': 'tiger1'}
+    assert statements == []
+    state = app.extensions['auth_cache']
+    assert state.tokens.stats()['hits'] == 1
+    assert state.users.stats()['hits'] == 1
+
+
+def test_user_changes_evict_cached_record(client, user):
+    headers = _headers(user)
+    client.get('/api/auth/verify', headers=headers)
+
+    user.username = 'orange'
+    db.session.commit()
+    assert client.get('/api/auth/verify', headers=headers).get_json()['username'] == 'orange'
+
+    db.session.delete(user)
+    db.session.commit()
+    assert client.get('/api/auth/verify', headers=headers).status_code == 401
+
+
+def test_cached_token_expires_with_the_token(client, user):
+    headers = _headers(user, expires_delta=timedelta(seconds=1))
+    assert client.get('/api/auth/verify', headers=headers).status_code == 200
+    time.sleep(1.1)
+    assert client.get('/api/auth/verify', headers=headers).status_code == 401
+
+
+def test_tampered_token_is_rejected(client, user):
+    headers = _headers(user)
+    client.get('/api/auth/verify', headers=headers)
+    headers['Authorization'] = headers['Authorization'][:-2] + 'xx'
+    assert client.get('/api/auth/verify', headers=headers).status_code == 401
+
+
+def test_caches_can_be_disabled(app, client, user):
+    app.config.update(AUTH_TOKEN_CACHE_SIZE=0, AUTH_USER_CACHE_SIZE=0)
+    from app.extensions import jwt
+    jwt.init_app(app)
+
+    headers = _headers(user)
+    for _ in range(2):
+        assert client.get('/api/auth/verify', headers=headers).status_code == 200
+    assert app.extensions['auth_cache'].tokens.stats() == {'size': 0, 'hits': 0, 'misses': 0}
@@ -0,0 +1,105 @@
+import threading
+
+import pytest
+
+from app.cas.client import CASClient, parse_service_response
+from app.cas.stub import StubCASServer
+from app.extensions import db
+from app.models import User
+
+SERVICE = 'http://localhost:5000/api/auth/cas/callback'
+
+
+@pytest.fixture
+def cas():
+    with StubCASServer() as server:
+        yield server
+
+
+@pytest.fixture
+def client_for(cas):
+    clients = []
+
+    def make(**kwargs):
+        client = CASClient(cas.url, **kwargs)
+        clients.append(client)
+        return client
+    yield make
+    for client in clients:
+        client.close()
+
+
+def test_parse_service_response():
+    assert parse_service_response(
+        '<cas:serviceResponse xmlns:cas="http://www.yale.edu/tp/cas"><cas:authenticationSuccess>'
+        '<cas:user>tiger1</cas:user></cas:authenticationSuccess></cas:serviceResponse>'
+    ) == ('tiger1', None)
+    assert parse_service_response('<nope') == (None, 'INVALID_RESPONSE')
+
+
+def test_connections_are_reused(cas, client_for):
+    client = client_for()
+    for i in range(5):
+        cas.add_ticket(f'ST-{i}', f'user{i}')
+        assert client.validate(f'ST-{i}', SERVICE) == f'user{i}'
+    assert cas.requests == 5
+    assert cas.connections == 1
+
+
+def test_duplicate_ticket_is_answered_from_cache(cas, client_for):
+    client = client_for()
+    cas.add_ticket('ST-1', 'tiger1')
+    assert client.validate('ST-1', SERVICE) == 'tiger1'
+    # CAS itself would now reject the spent ticket
+    assert client.validate('ST-1', SERVICE) == 'tiger1'
+    assert cas.requests == 1
+
+
+def test_concurrent_duplicates_share_one_upstream_call(cas, client_for):
+    client = client_for()
+    cas.add_ticket('ST-1', 'tiger1')
+    cas.delay = 0.2
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(client.validate('ST-1', SERVICE)))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == ['tiger1'] * 8
+    assert cas.requests == 1
+
+
+def test_rejected_tickets_are_not_cached(cas, client_for):
+    client = client_for()
+    assert client.validate('ST-bad', SERVICE) is None
+    assert client.validate('ST-bad', SERVICE) is None
+    assert cas.requests == 2
+
+
+def test_unavailable_server_is_retried(cas, client_for):
+    client = client_for(retries=2)
+    cas.add_ticket('ST-1', 'tiger1')
+    cas.fail_next = 2
+    assert client.validate('ST-1', SERVICE) == 'tiger1'
+    assert cas.requests == 3
+
+
+def test_gives_up_after_retries(cas, client_for):
+    client = client_for(retries=1)
+    cas.add_ticket('ST-1', 'tiger1')
+    cas.fail_next = 5
+    assert client.validate('ST-1', SERVICE) is None
+
+
+def test_validate_route_uses_configured_cas(app, client, cas):
+    app.config['CAS_URL'] = cas.url
+    cas.add_ticket('ST-42', 'tiger42')
+    response = client.get('/api/auth/validate', query_string={'ticket': 'ST-42', 'service': SERVICE})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['netid'] == 'tiger42'
+    assert db.session.get(User, body['user_id']).netid == 'tiger42'
+
+    # ST- tickets are no longer accepted blindly
+    assert client.get('/api/auth/validate', query_string={'ticket': 'ST-unknown'}).status_code == 401
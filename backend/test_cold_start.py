@@ -0,0 +1,15 @@
+import os
+import subprocess
+import sys
+
+from benchmarks.importtime_profile import BACKEND, DEFERRED
+
+
+def test_serverless_startup_defers_heavy_imports(tmp_path):
+    env = dict(os.environ, VERCEL='1', DB_WARM_ON_START='0', DATABASE_URL=f'sqlite:///{tmp_path / "cold.db"}')
+    script = ('import sys, wsgi; '
+              f'print([name for name in {DEFERRED!r} if name in sys.modules])')
+    result = subprocess.run([sys.executable, '-c', script], cwd=BACKEND, env=env,
+                            capture_output=True, text=True, check=True)
+    # The app logs its startup to stdout too
+    assert result.stdout.splitlines()[-1] == '[]'
@@ -0,0 +1,53 @@
+import pytest
+
+from app.extensions import db
+from app.models import User
+from app.utils.db_pool import InstrumentedQueuePool, engine_options, pooler_connect_args
+
+
+@pytest.fixture
+def config_overrides(tmp_path):
+    # A file database stands in for the pooler: one real connection per
+    # container, opened at startup
+    uri = f'sqlite:///{tmp_path / "pooler.db"}'
+    return {'SQLALCHEMY_DATABASE_URI': uri, 'DB_POOL_MODE': 'pooler', 'DB_WARM_ON_START': True,
+            'SQLALCHEMY_ENGINE_OPTIONS': engine_options('pooler', uri), 'METRICS_TOKEN': 's3cret'}
+
+
+def test_pooler_mode_reuses_one_warm_connection(app, client):
+    assert app.extensions['db_pool'].warmed.wait(5)
+    assert isinstance(db.engine.pool, InstrumentedQueuePool)
+
+    for _ in range(10):
+        assert client.get('/api/auth/test-db').status_code == 200
+        db.session.add(User(username='u', email='u@x.com', password_hash='x'))
+        db.session.commit()
+        db.session.delete(User.query.first())
+        db.session.commit()
+
+    assert client.get('/internal/db-pool').status_code == 401
+    stats = client.get('/internal/db-pool', headers={'Authorization': 'Bearer s3cret'}).get_json()
+    assert stats['mode'] == 'pooler'
+    assert stats['warmed'] is True
+    assert stats['warm_error'] is None
+    # The connection opened at cold start served every request
+    assert stats['connect']['count'] == 1
+    assert stats['checkout']['count'] > 10
+    assert stats['checkout']['max_ms'] >= stats['checkout']['avg_ms'] > 0
+
+
+def test_pooler_connect_args_disable_prepared_statements():
+    assert pooler_connect_args('postgresql+psycopg://u:p@pooler:6543/db') == {
+        'connect_timeout': 5, 'prepare_threshold': None}
+    assert pooler_connect_args('postgresql://u:p@pooler:6543/db') == {'connect_timeout': 5}
+    assert pooler_connect_args('sqlite:///app.db') == {}
+
+
+def test_engine_options_per_mode():
+    pooler = engine_options('pooler', 'postgresql://u:p@pooler:6543/db')
+    assert (pooler['pool_size'], pooler['max_overflow'], pooler['pool_pre_ping']) == (1, 0, True)
+    queue = engine_options('queue', 'postgresql://u:p@db/db', pool_size=5)
+    assert (queue['pool_size'], queue['max_overflow']) == (5, 2)
+    assert 'pool_size' not in engine_options('null', 'postgresql://u:p@db/db')
+    with pytest.raises(ValueError):
+        engine_options('bogus', 'sqlite://')
@@ -0,0 +1,112 @@
+import time
+
+import pytest
+
+from app.extensions import db
+from app.models import User
+from app.utils.cache import MemoryBackend
+
+
+@pytest.fixture
+def config_overrides():
+    return {'CACHE_BACKEND': 'memory', 'METRICS_TOKEN': 's3cret'}
+
+
+def _create(client, seller, title, category):
+    response = client.post('/api/listing/', json={
+        'title': title, 'description': 'desc', 'price': 10,
+        'category': category, 'user_id': seller.id
+    })
+    assert response.status_code == 201
+    return response.get_json()['id']
+
+
+def _stats(client):
+    response = client.get('/internal/cache', headers={'Authorization': 'Bearer s3cret'})
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_repeated_reads_are_served_from_cache(client, seller, count_queries):
+    _create(client, seller, 'Desk', 'furniture')
+    first = client.get('/api/listing/?category=furniture&max_price=50')
+    with count_queries() as statements:
+        # Same parameters in a different order and case hit the same entry
+        second = client.get('/api/listing/?max_price=50&category=Furniture')
+    assert statements == []
+    assert second.get_json() == first.get_json()
+    assert _stats(client)['namespaces']['feed'] == {'hits': 1, 'misses': 1, 'not_modified': 0}
+
+
+def test_create_invalidates_only_affected_category(client, seller):
+    _create(client, seller, 'Desk', 'furniture')
+    client.get('/api/listing/?category=furniture')
+    client.get('/api/listing/?category=books')
+    client.get('/api/listing/')
+
+    _create(client, seller, 'Novel', 'books')
+
+    assert [l['title'] for l in client.get('/api/listing/?category=books').get_json()] == ['Novel']
+    assert len(client.get('/api/listing/').get_json()) == 2
+    client.get('/api/listing/?category=furniture')
+    assert _stats(client)['namespaces']['feed'] == {'hits': 1, 'misses': 5, 'not_modified': 0}
+
+
+def test_update_invalidates_old_and_new_category_and_listing(client, seller):
+    listing_id = _create(client, seller, 'Lamp', 'furniture')
+    client.get('/api/listing/?category=furniture')
+    client.get('/api/listing/?category=other')
+    client.get(f'/api/listing/{listing_id}')
+    client.get(f'/api/listing/user?user_id={seller.id}')
+
+    client.put(f'/api/listing/{listing_id}', json={'category': 'other', 'title': 'Desk lamp'})
+
+    assert client.get('/api/listing/?category=furniture').get_json() == []
+    assert [l['title'] for l in client.get('/api/listing/?category=other').get_json()] == ['Desk lamp']
+    assert client.get(f'/api/listing/{listing_id}').get_json()['title'] == 'Desk lamp'
+    assert client.get(f'/api/listing/user?user_id={seller.id}').get_json()[0]['category'] == 'other'
+
+
+def test_buy_and_delete_invalidate_buyer_views(client, seller):
+    listing_id = _create(client, seller, 'Bike', 'other')
+    buyer = User(netid='buyer1')
+    db.session.add(buyer)
+    db.session.commit()
+    assert client.get('/api/listing/buyer?netid=buyer1').get_json() == []
+
+    client.post(f'/api/listing/{listing_id}/buy', json={'buyer_id': buyer.id})
+    assert [l['id'] for l in client.get('/api/listing/buyer?netid=buyer1').get_json()] == [listing_id]
+    assert client.get(f'/api/listing/{listing_id}').get_json()['status'] == 'pending'
+
+    # delete_listing only lets user 1 delete
+    assert seller.id == 1
+    assert client.delete(f'/api/listing/{listing_id}').status_code == 204
+    assert client.get('/api/listing/buyer?netid=buyer1').get_json() == []
+    assert client.get('/api/listing/').get_json() == []
+
+
+def test_memory_backend_evicts_lru_and_expires():
+    backend = MemoryBackend(max_entries=2)
+    backend.store('a', (), None, b'1', ttl=60)
+    backend.store('b', (), None, b'2', ttl=60)
+    backend.lookup('a', [])
+    backend.store('c', (), None, b'3', ttl=60)
+    assert backend.lookup('b', [])[1] is None
+    assert backend.lookup('a', [])[1] == ((), None, b'1')
+
+    backend.store('d', (), None, b'4', ttl=0.01)
+    time.sleep(0.02)
+    assert backend.lookup('d', [])[1] is None
+
+
+def test_streamed_responses_over_the_size_cap_are_not_cached(app, client, seller):
+    _create(client, seller, 'Desk', 'furniture')
+    app.extensions['response_cache'].max_body_bytes = 10
+    client.get('/api/listing/')
+    client.get('/api/listing/')
+    assert _stats(client)['namespaces']['feed'] == {'hits': 0, 'misses': 2, 'not_modified': 0}
+
+
+def test_cache_stats_need_the_token(app, client):
+    assert client.get('/internal/cache').status_code == 401
+    assert client.get('/api/listing/cache/stats').status_code == 404
@@ -0,0 +1,90 @@
+import pytest
+
+from app.extensions import db
+from app.models import Listing
+
+
+@pytest.fixture(params=[{}, {'CACHE_BACKEND': 'memory'}], ids=['uncached', 'cached'])
+def config_overrides(request):
+    return request.param
+
+
+@pytest.fixture
+def listing(seller):
+    listing = Listing(title='Desk', description='desc', price=40, category='furniture',
+                      status='available', user_id=seller.id)
+    db.session.add(listing)
+    db.session.commit()
+    return listing
+
+
+@pytest.mark.parametrize('path', [
+    '/api/listing/',
+    '/api/listing/?category=furniture&limit=10',
+    '/api/listing/user?user_id={seller}',
+    '/api/listing/user?netid=seller1',
+    '/api/listing/{listing}',
+])
+def test_matching_etag_returns_304_without_loading_rows(client, listing, count_queries, path):
+    path = path.format(seller=listing.user_id, listing=listing.id)
+    first = client.get(path)
+    assert first.status_code == 200
+    assert 'no-cache' in first.headers['Cache-Control']
+    # A feed page's plain read carries a body hash; the first revalidation
+    # trades it for the aggregate's ETag
+    revalidated = client.get(path, headers={'If-None-Match': first.headers['ETag']})
+    assert revalidated.status_code == 304
+    etag = revalidated.headers['ETag']
+
+    with count_queries() as statements:
+        second = client.get(path, headers={'If-None-Match': etag})
+    assert second.status_code == 304
+    assert second.data == b''
+    assert second.headers['ETag'] == etag
+    # At most the validator's aggregate; never the listing rows themselves
+    assert len(statements) <= 1
+    assert all('count(' in sql.lower() or 'updated_at' in sql.lower() for sql in statements)
+
+
+def test_etag_changes_after_write(client, listing):
+    path = f'/api/listing/user?user_id={listing.user_id}'
+    etag = client.get(path).headers['ETag']
+    client.put(f'/api/listing/{listing.id}', json={'images': ['https://img/1.jpg']})
+
+    response = client.get(path, headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert response.get_json()[0]['images'] == ['https://img/1.jpg']
+
+
+def test_etag_changes_after_delete(client, listing):
+    etag = client.get('/api/listing/').headers['ETag']
+    assert client.delete(f'/api/listing/{listing.id}').status_code == 204
+    response = client.get('/api/listing/', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json() == []
+
+
+def test_if_modified_since_only_trusted_for_single_listing(client, listing):
+    single = client.get(f'/api/listing/{listing.id}')
+    response = client.get(f'/api/listing/{listing.id}',
+                          headers={'If-Modified-Since': single.headers['Last-Modified']})
+    assert response.status_code == 304
+
+    response = client.get('/api/listing/', headers={'If-Modified-Since': single.headers['Last-Modified']})
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize('path', ['/api/listing/?limit=10', '/api/listing/?category=furniture&limit=10'])
+def test_plain_feed_pages_skip_the_aggregate(client, listing, count_queries, path):
+    with count_queries() as statements:
+        response = client.get(path)
+    assert response.status_code == 200
+    assert response.headers['ETag'] and 'Last-Modified' not in response.headers
+    assert not any('count(' in sql.lower() for sql in statements)
+
+
+def test_missing_listing_is_never_not_modified(client, listing):
+    response = client.get('/api/listing/999', headers={'If-None-Match': '*'})
+    assert response.status_code != 304
+    assert 'ETag' not in response.headers
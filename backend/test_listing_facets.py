@@ -0,0 +1,65 @@
+import pytest
+
+from app.extensions import db
+from app.models import Listing
+
+
+@pytest.fixture
+def config_overrides():
+    return {'CACHE_BACKEND': 'memory'}
+
+
+@pytest.fixture
+def listings(seller):
+    for title, price, category, condition in [('Lamp', 8, 'furniture', 'good'),
+                                              ('Desk', 60, 'Furniture', 'fair'),
+                                              ('Novel', 5, 'books', 'like new'),
+                                              ('Atlas', 30, 'books', 'good'),
+                                              ('Kettle', 150, 'kitchen', None)]:
+        db.session.add(Listing(title=title, description='', price=price, category=category,
+                               status='available', user_id=seller.id, condition=condition))
+    db.session.commit()
+
+
+def _counts(entries):
+    return {e['value']: e['count'] for e in entries if e['count']}
+
+
+def test_facets_are_one_grouped_query(client, listings, count_queries):
+    with count_queries() as statements:
+        body = client.get('/api/listing/facets').get_json()
+    assert len(statements) == 1
+    assert 'GROUP BY' in statements[0]
+
+    assert body['total'] == 5
+    assert _counts(body['categories']) == {'furniture': 2, 'books': 2, 'kitchen': 1}
+    # Known categories come first, zeros included; unknown ones follow
+    assert [c['value'] for c in body['categories']][:2] == ['tops', 'bottoms']
+    assert body['categories'][-1] == {'value': 'kitchen', 'count': 1}
+    assert _counts(body['conditions']) == {'good': 2, 'fair': 1, 'like new': 1, None: 1}
+    assert body['price_buckets'] == [
+        {'min': 0, 'max': 10, 'count': 2}, {'min': 10, 'max': 25, 'count': 0},
+        {'min': 25, 'max': 50, 'count': 1}, {'min': 50, 'max': 100, 'count': 1},
+        {'min': 100, 'max': None, 'count': 1}]
+
+
+def test_each_facet_ignores_its_own_filter(client, listings):
+    body = client.get('/api/listing/facets', query_string={'category': 'Books', 'max_price': 40}).get_json()
+    assert body['total'] == 2
+    # Categories honour max_price only; price buckets honour the category only
+    assert _counts(body['categories']) == {'furniture': 1, 'books': 2}
+    assert [b['count'] for b in body['price_buckets']] == [1, 0, 1, 0, 0]
+    assert _counts(body['conditions']) == {'like new': 1, 'good': 1}
+
+
+def test_facets_are_cached_until_a_listing_changes(client, seller, listings, count_queries):
+    assert client.get('/api/listing/facets').get_json()['total'] == 5
+    with count_queries() as statements:
+        assert client.get('/api/listing/facets').get_json()['total'] == 5
+    assert statements == []
+
+    client.post('/api/listing/', json={'title': 'Chair', 'description': 'x', 'price': 12,
+                                       'category': 'furniture', 'user_id': seller.id})
+    body = client.get('/api/listing/facets').get_json()
+    assert body['total'] == 6
+    assert _counts(body['categories'])['furniture'] == 3
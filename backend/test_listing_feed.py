@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta
+
+from app.extensions import db
+from app.models import Listing, ListingImage, User
+
+
+def _seed(count):
+    seller = User(netid='seller1')
+    db.session.add(seller)
+    db.session.flush()
+    start = datetime(2026, 1, 1)
+    for i in range(count):
+        # Pairs of listings share a timestamp so the id tie-breaker is exercised
+        listing = Listing(
+            title=f'Item {i}',
+            description='desc',
+            price=10 + i,
+            category='books',
+            status='available',
+            user_id=seller.id,
+            created_at=start + timedelta(minutes=i // 2)
+        )
+        db.session.add(listing)
+        db.session.flush()
+        db.session.add(ListingImage(filename=f'https://img/{i}.jpg', listing_id=listing.id))
+    db.session.commit()
+
+
+def test_feed_pages_cover_every_listing_once(client):
+    _seed(25)
+    seen = []
+    cursor = None
+    while True:
+        url = '/api/listing/?limit=10' + (f'&cursor={cursor}' if cursor else '')
+        body = client.get(url).get_json()
+        seen.extend(item['id'] for item in body['listings'])
+        cursor = body['next_cursor']
+        if not cursor:
+            break
+    assert len(seen) == 25
+    assert len(set(seen)) == 25
+    ordered = sorted(Listing.query.all(), key=lambda l: (l.created_at, l.id), reverse=True)
+    assert seen == [listing.id for listing in ordered]
+
+
+def test_feed_page_query_count_is_constant(client, count_queries):
+    _seed(30)
+    with count_queries() as statements:
+        body = client.get('/api/listing/?limit=20').get_json()
+    assert len(body['listings']) == 20
+    assert all(item['images'] for item in body['listings'])
+    # One SELECT for the page, one batched SELECT for its images and one for
+    # their derivatives; no aggregate over the whole feed
+    assert len(statements) == 3
+
+
+def test_feed_rejects_bad_cursor(client):
+    response = client.get('/api/listing/?cursor=not-a-cursor')
+    assert response.status_code == 400
+
+
+def test_legacy_unpaginated_response_is_a_list(client):
+    _seed(3)
+    body = client.get('/api/listing/').get_json()
+    assert isinstance(body, list)
+    assert len(body) == 3
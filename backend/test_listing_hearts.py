@@ -0,0 +1,164 @@
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from flask_jwt_extended import create_access_token
+
+from app.extensions import db
+from app.models import HeartedListing, Listing, User
+from app.utils import hearts
+
+
+@pytest.fixture
+def config_overrides(tmp_path):
+    # A file database so concurrent hearts run in separate connections
+    return {'CACHE_BACKEND': 'memory', 'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "hearts.db"}',
+            'SQLALCHEMY_ENGINE_OPTIONS': {'connect_args': {'timeout': 30}}}
+
+
+@pytest.fixture
+def seeded(app):
+    seller = User(netid='seller1')
+    users = [User(netid=f'buyer{i}') for i in range(8)]
+    db.session.add_all([seller] + users)
+    db.session.flush()
+    listings = [Listing(title=f'Item {i}', description='', price=5, category='books', status='available',
+                        user_id=seller.id, created_at=datetime(2026, 1, 1) + timedelta(minutes=i))
+                for i in range(4)]
+    db.session.add_all(listings)
+    db.session.commit()
+    return [l.id for l in listings], [u.id for u in users]
+
+
+def _auth(user_id):
+    return {'Authorization': f'Bearer {create_access_token(identity=str(user_id))}'}
+
+
+def test_heart_and_unheart_keep_count(client, seeded):
+    (listing_id, *_), (alice, bob, *_) = seeded
+    response = client.post(f'/api/listing/{listing_id}/heart', headers=_auth(alice))
+    assert response.get_json()['heart_count'] == 1
+    assert client.post(f'/api/listing/{listing_id}/heart', headers=_auth(bob)).get_json()['heart_count'] == 2
+    assert client.get(f'/api/listing/{listing_id}').get_json()['heart_count'] == 2
+
+    assert client.delete(f'/api/listing/{listing_id}/heart', headers=_auth(alice)).get_json()['heart_count'] == 1
+    assert client.post('/api/listing/9999/heart', headers=_auth(alice)).status_code == 404
+    assert client.delete('/api/listing/9999/heart', headers=_auth(alice)).status_code == 404
+    assert db.session.get(Listing, listing_id).heart_count == 1
+
+
+def test_heart_and_unheart_are_idempotent(client, seeded, count_queries):
+    (listing_id, *_), (alice, *_) = seeded
+    headers = _auth(alice)
+    path = f'/api/listing/{listing_id}/heart'
+    with count_queries() as statements:
+        first = client.post(path, headers=headers)
+    # INSERT ... ON CONFLICT DO NOTHING, then the count UPDATE (cache
+    # invalidation then looks up the seller's netid for its tags)
+    assert [s.split()[0] for s in statements][:2] == ['INSERT', 'UPDATE']
+    assert 'ON CONFLICT' in statements[0]
+    again = client.post(path, headers=headers)
+    assert first.status_code == again.status_code == 200
+    assert again.get_json() == {'message': 'Listing hearted successfully', 'hearted': True, 'heart_count': 1}
+
+    with count_queries() as statements:
+        assert client.delete(path, headers=headers).get_json()['heart_count'] == 0
+    assert [s.split()[0] for s in statements][:2] == ['DELETE', 'UPDATE']
+    again = client.delete(path, headers=headers)
+    assert again.status_code == 200
+    assert again.get_json()['hearted'] is False and again.get_json()['heart_count'] == 0
+    assert HeartedListing.query.count() == 0
+
+
+def test_repeat_heart_leaves_the_transaction_to_the_caller(app, seeded):
+    (hearted, other, *_), (alice, *_) = seeded
+    hearts.heart(alice, hearted)
+    db.session.add(User(netid='uncommitted'))
+    # No-op paths only read the count, and must not commit the caller's work
+    assert tuple(hearts.heart(alice, hearted)) == (True, 1)
+    assert tuple(hearts.unheart(alice, other)) == (False, 0)
+    db.session.rollback()
+    assert User.query.filter_by(netid='uncommitted').count() == 0
+
+
+def test_sold_listing_can_only_keep_existing_hearts(client, seeded):
+    (listing_id, *_), (alice, bob, *_) = seeded
+    client.post(f'/api/listing/{listing_id}/heart', headers=_auth(alice))
+    db.session.get(Listing, listing_id).status = 'sold'
+    db.session.commit()
+    assert client.post(f'/api/listing/{listing_id}/heart', headers=_auth(alice)).status_code == 200
+    assert client.post(f'/api/listing/{listing_id}/heart', headers=_auth(bob)).status_code == 400
+
+
+@pytest.mark.parametrize('same_user', [False, True])
+def test_concurrent_hearts_are_counted_once_each(app, seeded, same_user):
+    (listing_id, *_), users = seeded
+    if same_user:
+        # A double click, or a retry racing the original request
+        users = users[:1] * len(users)
+    barrier = threading.Barrier(len(users))
+    statuses = []
+
+    def heart(user_id):
+        client = app.test_client()
+        with app.app_context():
+            headers = _auth(user_id)
+            barrier.wait()
+            statuses.append(client.post(f'/api/listing/{listing_id}/heart', headers=headers).status_code)
+
+    threads = [threading.Thread(target=heart, args=(u,)) for u in users]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert statuses == [200] * len(users)
+    db.session.expire_all()
+    assert HeartedListing.query.count() == len(set(users))
+    assert db.session.get(Listing, listing_id).heart_count == len(set(users))
+
+
+def test_hearted_feed_is_one_join_in_heart_order(client, seeded, count_queries):
+    listing_ids, (alice, *_) = seeded
+    now = datetime(2026, 2, 1)
+    # Hearted in the opposite order to creation
+    for minutes, listing_id in enumerate(reversed(listing_ids[:3])):
+        db.session.add(HeartedListing(user_id=alice, listing_id=listing_id,
+                                      created_at=now + timedelta(minutes=minutes)))
+    db.session.commit()
+    headers = _auth(alice)
+
+    with count_queries() as statements:
+        body = client.get('/api/listing/hearted', headers=headers).get_json()
+    assert [l['id'] for l in body] == listing_ids[:3]
+    # The joined listings, then all of their images in one batch
+    assert len(statements) == 2
+    assert 'JOIN hearted_listings' in statements[0]
+
+
+def test_hearted_status_is_one_query(client, seeded, count_queries):
+    listing_ids, (alice, *_) = seeded
+    db.session.add_all([HeartedListing(user_id=alice, listing_id=listing_ids[0]),
+                        HeartedListing(user_id=alice, listing_id=listing_ids[2])])
+    db.session.commit()
+    headers = _auth(alice)
+
+    with count_queries() as statements:
+        response = client.get('/api/listing/hearted/status', headers=headers,
+                              query_string={'ids': ','.join(map(str, listing_ids))})
+    assert response.get_json()['hearted'] == {
+        str(listing_ids[0]): True, str(listing_ids[1]): False,
+        str(listing_ids[2]): True, str(listing_ids[3]): False}
+    assert len(statements) == 1
+
+    assert client.get('/api/listing/hearted/status', headers=headers,
+                      query_string={'ids': '1,x'}).status_code == 400
+    assert client.get('/api/listing/hearted/status', headers=headers,
+                      query_string={'ids': ','.join(map(str, range(1, 300)))}).status_code == 400
+
+
+def test_heart_refreshes_cached_reads(client, seeded):
+    (listing_id, *_), (alice, *_) = seeded
+    assert client.get(f'/api/listing/{listing_id}').get_json()['heart_count'] == 0
+    client.post(f'/api/listing/{listing_id}/heart', headers=_auth(alice))
+    assert client.get(f'/api/listing/{listing_id}').get_json()['heart_count'] == 1
@@ -0,0 +1,9 @@
+from app.extensions import db
+from app.utils.explain import explain, indexes_used
+from explain_queries import route_queries
+
+
+def test_route_queries_use_their_indexes(app):
+    for label, expected, query in route_queries():
+        plan = explain(query, db.session)
+        assert expected in indexes_used(plan), f'{label}: {plan}'
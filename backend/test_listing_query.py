@@ -0,0 +1,115 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.extensions import db
+from app.models import Listing
+
+
+@pytest.fixture
+def config_overrides():
+    return {'CACHE_BACKEND': 'memory', 'LISTING_EXPLAIN': True}
+
+
+@pytest.fixture
+def listings(seller):
+    rows = [('Lamp', 8, 'Furniture', 'good', 'available'),
+            ('Desk', 60, 'furniture', 'fair', 'available'),
+            ('Novel', 5, 'books', 'like new', 'sold'),
+            ('Atlas', 30, 'books', 'good', 'available'),
+            ('Boots', 30, 'shoes', 'new', 'pending'),
+            ('Kettle', 15, 'appliances', 'good', 'available')]
+    for minutes, (title, price, category, condition, status) in enumerate(rows):
+        db.session.add(Listing(title=title, description='', price=price, category=category, status=status,
+                               user_id=seller.id, condition=condition,
+                               created_at=datetime(2026, 1, 1) + timedelta(minutes=minutes)))
+    db.session.commit()
+
+
+def _titles(client, **args):
+    response = client.get('/api/listing/', query_string=args)
+    assert response.status_code == 200, response.get_json()
+    body = response.get_json()
+    return [l['title'] for l in (body['listings'] if isinstance(body, dict) else body)]
+
+
+def test_filters_combine(client, listings):
+    assert _titles(client) == ['Kettle', 'Boots', 'Atlas', 'Novel', 'Desk', 'Lamp']
+    assert _titles(client, category='books,FURNITURE') == ['Atlas', 'Novel', 'Desk', 'Lamp']
+    assert _titles(client, category=['books', 'shoes'], condition='good') == ['Atlas']
+    assert _titles(client, min_price=10, max_price=30) == ['Kettle', 'Boots', 'Atlas']
+    assert _titles(client, status='available', max_price=20) == ['Kettle', 'Lamp']
+    assert _titles(client, condition='like new,new') == ['Boots', 'Novel']
+
+
+def test_sorts_page_by_price(client, listings):
+    assert _titles(client, sort='price_asc') == ['Novel', 'Lamp', 'Kettle', 'Atlas', 'Boots', 'Desk']
+    assert _titles(client, sort='price_desc') == ['Desk', 'Boots', 'Atlas', 'Kettle', 'Lamp', 'Novel']
+
+    # Keyset pages on (price, id), through the tie at 30
+    seen, cursor = [], None
+    while True:
+        args = {'sort': 'price_desc', 'limit': 2}
+        if cursor:
+            args['cursor'] = cursor
+        body = client.get('/api/listing/', query_string=args).get_json()
+        seen += [l['title'] for l in body['listings']]
+        cursor = body['next_cursor']
+        if not cursor:
+            break
+    assert seen == ['Desk', 'Boots', 'Atlas', 'Kettle', 'Lamp', 'Novel']
+
+    # A cursor from one sort order is rejected by another
+    newest_cursor = client.get('/api/listing/', query_string={'limit': 2}).get_json()['next_cursor']
+    assert client.get('/api/listing/', query_string={'sort': 'price_asc', 'cursor': newest_cursor}).status_code == 400
+
+
+@pytest.mark.parametrize('args, error', [
+    ({'sort': 'cheapest'}, 'sort must be one of'),
+    ({'min_price': 'abc'}, 'min_price must be a number'),
+    ({'max_price': '-1'}, 'max_price must be a non-negative number'),
+    ({'min_price': 50, 'max_price': 10}, 'min_price cannot be greater'),
+    ({'status': 'gone'}, 'Unknown status'),
+    ({'category': ','.join(f'c{i}' for i in range(30))}, 'At most 20 values'),
+    ({'search': 'lamp', 'sort': 'price_asc'}, 'sort cannot be combined with search'),
+])
+def test_invalid_arguments_are_rejected(client, listings, args, error):
+    response = client.get('/api/listing/', query_string=args)
+    assert response.status_code == 400
+    assert response.get_json()['error'].startswith(error)
+
+
+@pytest.mark.parametrize('args, index', [
+    ({}, 'ix_listings_created_at_id'),
+    ({'status': 'available'}, 'ix_listings_status_created_at'),
+    ({'category': 'books'}, 'ix_listings_category_created_at'),
+    ({'sort': 'price_asc', 'max_price': 20}, 'ix_listings_price'),
+    ({'category': 'books', 'sort': 'price_desc'}, 'ix_listings_category_price'),
+])
+def test_explain_uses_the_supporting_index(client, listings, args, index):
+    body = client.get('/api/listing/', query_string=dict(args, explain=1, limit=2)).get_json()
+    assert body['index'] == index
+    assert any(index in line for line in body['plan']), body['plan']
+    assert index in body['indexes_used']
+    assert body['sql'].startswith('SELECT')
+    # The rows are never fetched
+    assert 'listings' not in body
+
+
+def test_explain_needs_debug(app, client, listings):
+    app.config['LISTING_EXPLAIN'] = False
+    assert client.get('/api/listing/', query_string={'explain': 1}).status_code == 403
+
+
+def test_facets_share_the_filters(client, listings):
+    body = client.get('/api/listing/facets', query_string={'status': 'available', 'condition': 'good'}).get_json()
+    assert body['total'] == 3
+    assert {c['value']: c['count'] for c in body['conditions'] if c['count']} == {'good': 3, 'fair': 1}
+    assert client.get('/api/listing/facets', query_string={'min_price': 'x'}).status_code == 400
+
+
+def test_multi_category_feed_is_invalidated_per_category(client, listings):
+    assert _titles(client, category='books,shoes') == ['Boots', 'Atlas', 'Novel']
+    lamp = Listing.query.filter_by(title='Lamp').one()
+    assert client.put(f'/api/listing/{lamp.id}', json={'category': 'books'}).status_code == 200
+    assert _titles(client, category='books,shoes') == ['Boots', 'Atlas', 'Novel', 'Lamp']
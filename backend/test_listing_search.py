@@ -0,0 +1,46 @@
+from app.extensions import db
+from app.models import Listing
+from app.utils.search import InvertedIndex, build_tsquery
+
+
+def _listing(user_id, title, description):
+    listing = Listing(title=title, description=description, price=20, category='other',
+                      status='available', user_id=user_id)
+    db.session.add(listing)
+    return listing
+
+
+def test_inverted_index_ranks_title_matches_first():
+    index = InvertedIndex()
+    index.add(1, 'Desk lamp', 'Bright lamp for a desk')
+    index.add(2, 'Chair', 'Comes with a free desk lamp')
+    index.add(3, 'Mini fridge', 'Cold')
+    assert [lid for lid, _ in index.search('desk lamp')] == [1, 2]
+    assert [lid for lid, _ in index.search('fr')] == [3, 2]
+    index.remove(1)
+    assert [lid for lid, _ in index.search('lamp')] == [2]
+
+
+def test_build_tsquery_sanitizes_input():
+    assert build_tsquery("mini fri") == 'mini & fri:*'
+    assert build_tsquery("desk' | !(x") == 'desk & x:*'
+    assert build_tsquery('the') is None
+
+
+def test_search_endpoint_uses_fallback_index_and_tracks_writes(client, seller):
+    _listing(seller.id, 'Wooden desk', 'Sturdy desk, pickup only')
+    _listing(seller.id, 'Lamp', 'Goes great on a desk')
+    db.session.commit()
+
+    body = client.get('/api/listing/?search=desk').get_json()
+    assert [item['title'] for item in body] == ['Wooden desk', 'Lamp']
+
+    # Writes after the index is built are picked up without a rebuild
+    fridge = _listing(seller.id, 'Mini fridge', 'Cold drinks')
+    db.session.commit()
+    body = client.get('/api/listing/?search=mini%20fri&limit=5').get_json()
+    assert [item['id'] for item in body['listings']] == [fridge.id]
+
+    db.session.delete(fridge)
+    db.session.commit()
+    assert client.get('/api/listing/?search=fridge').get_json() == []
@@ -0,0 +1,71 @@
+import pytest
+from flask_jwt_extended import create_access_token
+
+from app.extensions import db
+from app.models import HeartedListing, Listing, ListingImage, User
+
+
+def _seed(count):
+    seller = User(netid='seller1')
+    buyer = User(netid='buyer1')
+    db.session.add_all([seller, buyer])
+    db.session.flush()
+    listings = []
+    for i in range(count):
+        listing = Listing(title=f'Item {i}', description='desc', price=5 + i, category='books',
+                          status='pending', user_id=seller.id)
+        listing.buyer_id = buyer.id
+        db.session.add(listing)
+        db.session.flush()
+        db.session.add_all([ListingImage(filename=f'https://img/{i}-{n}.jpg', listing_id=listing.id)
+                            for n in range(3)])
+        db.session.add(HeartedListing(user_id=buyer.id, listing_id=listing.id))
+        listings.append(listing)
+    db.session.commit()
+    return seller, buyer, listings
+
+
+def _statements_for(client, count_queries, seller, buyer, listings, path, method='get', **kwargs):
+    path = path.format(seller=seller.id, buyer=buyer.id, listing=listings[0].id)
+    db.session.expire_all()
+    with count_queries() as statements:
+        response = getattr(client, method)(path, **kwargs)
+    assert response.status_code in (200, 201), response.get_json()
+    return len(statements)
+
+
+@pytest.mark.parametrize('path', [
+    '/api/listing/',
+    '/api/listing/?limit=100',
+    '/api/listing/user?user_id={seller}',
+    '/api/listing/buyer?buyer_id={buyer}',
+    '/api/listing/{listing}',
+    '/api/listing/hearted',
+])
+def test_listing_endpoints_use_constant_query_count(app, client, count_queries, path):
+    counts = []
+    for size in (2, 20):
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+        seller, buyer, listings = _seed(size)
+        headers = {'Authorization': f'Bearer {create_access_token(identity=str(buyer.id))}'}
+        counts.append(_statements_for(client, count_queries, seller, buyer, listings, path,
+                                      headers=headers))
+    assert counts[0] == counts[1], f'{path}: {counts[0]} statements for 2 listings, {counts[1]} for 20'
+
+
+def test_single_listing_includes_seller_netid(client):
+    seller, _, listings = _seed(1)
+    body = client.get(f'/api/listing/{listings[0].id}').get_json()
+    assert body['user_netid'] == 'seller1'
+    assert len(body['images']) == 3
+
+
+def test_update_listing_returns_new_images(client):
+    _, _, listings = _seed(1)
+    response = client.put(f'/api/listing/{listings[0].id}',
+                          json={'images': ['https://img/new.jpg'], 'title': 'Renamed'})
+    body = response.get_json()
+    assert body['title'] == 'Renamed'
+    assert body['images'] == ['https://img/new.jpg']
@@ -0,0 +1,109 @@
+import threading
+
+import pytest
+
+from app.extensions import db
+from app.models import Listing, OutboxMessage, User
+
+
+@pytest.fixture
+def config_overrides(tmp_path):
+    # A file database so concurrent buyers run in separate connections
+    return {'CACHE_BACKEND': 'memory', 'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "status.db"}',
+            'SQLALCHEMY_ENGINE_OPTIONS': {'connect_args': {'timeout': 30}}}
+
+
+@pytest.fixture
+def seeded(app):
+    seller = User(netid='seller1', email='seller@example.com')
+    buyers = [User(netid=f'buyer{i}') for i in range(12)]
+    db.session.add_all([seller] + buyers)
+    db.session.flush()
+    listing = Listing(title='Desk', description='', price=40, category='furniture',
+                      status='available', user_id=seller.id)
+    db.session.add(listing)
+    db.session.commit()
+    return listing.id, [b.id for b in buyers]
+
+
+def _status(listing_id):
+    db.session.expire_all()
+    listing = db.session.get(Listing, listing_id)
+    return listing.status, listing.buyer_id
+
+
+def test_buy_then_sell(client, seeded, count_queries):
+    listing_id, (alice, bob, *_) = seeded
+    with count_queries() as statements:
+        response = client.post(f'/api/listing/{listing_id}/buy', json={'buyer_id': alice})
+    assert response.status_code == 200
+    assert response.get_json()['listing'] == {'id': listing_id, 'status': 'pending'}
+    # The conditional UPDATE decides; nothing reads the listing first
+    assert statements[0].startswith('UPDATE listings')
+    assert 'status IN' in statements[0]
+
+    with count_queries() as statements:
+        again = client.post(f'/api/listing/{listing_id}/buy', json={'buyer_id': bob})
+    assert again.status_code == 409
+    assert again.get_json()['status'] == 'pending'
+    # Only after a failed UPDATE is the listing read, to report its status
+    assert [s.split()[0] for s in statements] == ['UPDATE', 'SELECT']
+    assert _status(listing_id) == ('pending', alice)
+
+    response = client.patch(f'/api/listing/{listing_id}/status', json={'status': 'sold'})
+    assert response.get_json() == {'id': listing_id, 'status': 'sold'}
+    assert _status(listing_id) == ('sold', alice)
+    assert client.patch(f'/api/listing/{listing_id}/status', json={'status': 'available'}).status_code == 409
+    assert client.post(f'/api/listing/{listing_id}/buy', json={'buyer_id': bob}).status_code == 409
+
+
+def test_cancel_returns_listing_to_available(client, seeded):
+    listing_id, (alice, bob, *_) = seeded
+    client.post(f'/api/listing/{listing_id}/buy', json={'buyer_id': alice})
+    assert client.get('/api/listing/buyer', query_string={'buyer_id': alice}).get_json()[0]['id'] == listing_id
+
+    response = client.patch(f'/api/listing/{listing_id}/status', json={'status': 'available'})
+    assert response.status_code == 200
+    assert _status(listing_id) == ('available', None)
+    # The cancelled buyer's cached page is invalidated too
+    assert client.get('/api/listing/buyer', query_string={'buyer_id': alice}).get_json() == []
+    assert client.post(f'/api/listing/{listing_id}/buy', json={'buyer_id': bob}).status_code == 200
+
+
+def test_status_validation(client, seeded):
+    listing_id, _ = seeded
+    patch = lambda body, id=listing_id: client.patch(f'/api/listing/{id}/status', json=body)
+    assert patch({}).status_code == 400
+    assert patch({'status': 'gone'}).status_code == 400
+    # pending needs a buyer, so only /buy gets there
+    assert patch({'status': 'pending'}).status_code == 400
+    assert patch({'status': 'sold'}, id=9999).status_code == 404
+    assert client.post('/api/listing/9999/buy', json={'buyer_id': 1}).status_code == 404
+    assert client.post(f'/api/listing/{listing_id}/buy', json={'buyer_id': 'x'}).status_code == 400
+    assert _status(listing_id) == ('available', None)
+
+
+def test_concurrent_buyers_get_one_winner(app, seeded):
+    listing_id, buyers = seeded
+    barrier = threading.Barrier(len(buyers))
+    results = {}
+
+    def buy(buyer_id):
+        client = app.test_client()
+        with app.app_context():
+            barrier.wait()
+            response = client.post(f'/api/listing/{listing_id}/buy', json={'buyer_id': buyer_id})
+            results[buyer_id] = response.status_code
+
+    threads = [threading.Thread(target=buy, args=(b,)) for b in buyers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    winners = [b for b, code in results.items() if code == 200]
+    assert len(winners) == 1
+    assert sorted(results.values()) == [200] + [409] * (len(buyers) - 1)
+    assert _status(listing_id) == ('pending', winners[0])
+    # Losers roll back their whole transaction, email included
+    assert OutboxMessage.query.count() == 1
@@ -0,0 +1,56 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.extensions import db
+from app.models import Listing, ListingImage
+
+
+@pytest.fixture
+def config_overrides():
+    return {'LISTING_STREAM_BATCH_SIZE': 2}
+
+
+def _seed(seller, count, buyer_id=None):
+    start = datetime(2026, 1, 1)
+    for i in range(count):
+        listing = Listing(title=f'Item {i}', description='', price=i, category='other',
+                          status='available', user_id=seller.id, created_at=start + timedelta(minutes=i))
+        listing.buyer_id = buyer_id
+        db.session.add(listing)
+        db.session.flush()
+        db.session.add(ListingImage(filename=f'https://img.test/{i}.jpg', listing_id=listing.id))
+    db.session.commit()
+
+
+@pytest.mark.parametrize('path', ['/api/listing/', '/api/listing/user?user_id={seller}',
+                                  '/api/listing/buyer?buyer_id={seller}'])
+def test_collections_are_streamed_in_batches(client, seller, path):
+    _seed(seller, 5, buyer_id=seller.id)
+    response = client.get(path.format(seller=seller.id), buffered=False)
+    assert response.is_streamed
+    # One chunk per batch of two, plus the closing bracket
+    chunks = list(response.response)
+    assert len(chunks) == 4
+
+    body = json.loads(b''.join(chunks))
+    assert [item['title'] for item in body] == ['Item 4', 'Item 3', 'Item 2', 'Item 1', 'Item 0']
+    assert all(item['images'] == [f'https://img.test/{item["title"][5:]}.jpg'] for item in body)
+
+
+def test_empty_collection_is_an_empty_array(client, seller):
+    assert client.get('/api/listing/').get_json() == []
+    assert client.get(f'/api/listing/user?user_id={seller.id}').get_json() == []
+
+
+def test_statements_grow_per_batch_not_per_row(app, client, seller, count_queries):
+    _seed(seller, 4)
+    with count_queries() as small:
+        client.get('/api/listing/')
+    _seed(seller, 4)
+    with count_queries() as large:
+        client.get('/api/listing/')
+    # Twice the rows is twice the batches: one images and one derivatives
+    # SELECT per extra batch, never one per listing
+    assert len(large) - len(small) == 2 * 2
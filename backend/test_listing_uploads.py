@@ -0,0 +1,189 @@
+import io
+import os
+import threading
+import time
+
+import pytest
+from PIL import Image
+from werkzeug.datastructures import FileStorage
+
+from app.extensions import db
+from app.models import Listing, ListingImage
+from app.utils.derivatives import backfill, fetch_derivatives
+from app.utils.uploads import CloudinaryStorage, LocalStorage, process_uploads
+from benchmarks.fakes import FakeCloudinaryServer
+
+
+@pytest.fixture
+def config_overrides(tmp_path):
+    return {'UPLOAD_STORAGE': 'local', 'UPLOAD_FOLDER': str(tmp_path), 'UPLOAD_MAX_DIMENSION': 1024}
+
+
+def _image_bytes(size, fmt='JPEG', mode='RGB', orientation=None):
+    image = Image.new(mode, size, 'red' if mode == 'RGB' else (255, 0, 0, 128))
+    output = io.BytesIO()
+    kwargs = {}
+    if orientation:
+        exif = Image.Exif()
+        exif[0x0112] = orientation
+        kwargs['exif'] = exif
+    image.save(output, format=fmt, **kwargs)
+    return output.getvalue()
+
+
+def _upload(client, *files):
+    return client.post('/api/listing/upload', data={'images': list(files)},
+                       content_type='multipart/form-data')
+
+
+def test_upload_normalizes_and_serves_images(client, tmp_path):
+    response = _upload(
+        client,
+        # Rotated 90 degrees by the camera: stored upright as 768x1024
+        (io.BytesIO(_image_bytes((4000, 3000), orientation=6)), 'phone.jpg'),
+        (io.BytesIO(_image_bytes((300, 200), fmt='PNG', mode='RGBA')), 'logo.png')
+    )
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert len(body['urls']) == 2
+    assert [(r['width'], r['height']) for r in body['results']] == [(768, 1024), (300, 200)]
+
+    stored = client.get(body['urls'][0].replace('http://localhost', ''))
+    assert stored.status_code == 200
+    image = Image.open(io.BytesIO(stored.data))
+    assert image.format == 'JPEG' and image.size == (768, 1024)
+    # Full size, card and thumb, each in WebP and JPEG
+    assert len(os.listdir(tmp_path)) == 2 * 6
+
+
+def test_listing_exposes_derivatives(client, seller):
+    url = _upload(client, (io.BytesIO(_image_bytes((1600, 1200))), 'desk.jpg')).get_json()['urls'][0]
+    client.post('/api/listing/', json={
+        'title': 'Desk', 'description': 'oak', 'price': 40, 'category': 'furniture',
+        'user_id': seller.id, 'images': [url]
+    })
+
+    listing = client.get('/api/listing/').get_json()[0]
+    variants = listing['image_variants'][0]
+    assert set(variants) == {'full', 'card', 'thumb'}
+    assert variants['full']['jpeg']['url'] == url
+    assert (variants['thumb']['webp']['width'], variants['thumb']['webp']['height']) == (200, 150)
+    thumb = client.get(variants['thumb']['webp']['url'].replace('http://localhost', ''))
+    assert Image.open(io.BytesIO(thumb.data)).format == 'WEBP'
+
+    # The feed grid can ask for thumbnails only
+    listing = client.get('/api/listing/?variants=thumb').get_json()[0]
+    assert set(listing['image_variants'][0]) == {'thumb'}
+
+
+def test_cloudinary_derivatives_are_transformations(app, monkeypatch):
+    with FakeCloudinaryServer() as cloudinary:
+        for name, value in cloudinary.config().items():
+            monkeypatch.setenv(name, value)
+        files = [FileStorage(io.BytesIO(_image_bytes((1600, 1200))), 'desk.jpg')]
+        result, = process_uploads(files, storage=CloudinaryStorage())
+
+    # One upload; every other rendition is a URL Cloudinary renders on request
+    assert cloudinary.uploads == 1
+    renditions = {(variant, fmt): (url, width, height) for variant, fmt, url, width, height in result['renditions']}
+    assert len(renditions) == 6
+    assert renditions['full', 'jpeg'] == (result['url'], 1024, 768)
+    url, width, height = renditions['thumb', 'webp']
+    assert '/image/upload/c_limit,h_200,q_82,w_200/' in url and url.endswith('.webp')
+    assert (width, height) == (200, 150)
+
+
+def test_backfill_renders_existing_images(app, tmp_path, seller):
+    # An image stored before derivatives existed
+    with open(tmp_path / 'old.jpg', 'wb') as f:
+        f.write(_image_bytes((3000, 1000)))
+    url = 'http://uploads.test/old.jpg'
+    app.config['UPLOAD_BASE_URL'] = 'http://uploads.test/'
+    listing = Listing(title='Rug', description='', price=5, category='other', status='available',
+                      user_id=seller.id)
+    db.session.add(listing)
+    db.session.flush()
+    db.session.add(ListingImage(filename=url, listing_id=listing.id))
+    db.session.commit()
+    before = listing.updated_at
+
+    assert backfill(workers=2) == (1, 0)
+    assert backfill(workers=2) == (0, 0)
+
+    variants = fetch_derivatives([url])[url]
+    assert variants['full']['jpeg'] == {'url': url, 'width': 3000, 'height': 1000}
+    assert (variants['full']['webp']['width'], variants['card']['jpeg']['width']) == (1024, 480)
+    db.session.refresh(listing)
+    assert listing.updated_at > before
+
+
+def test_upload_reports_per_file_failures(client):
+    response = _upload(
+        client,
+        (io.BytesIO(_image_bytes((50, 50))), 'ok.jpg'),
+        (io.BytesIO(b'not an image'), 'broken.jpg')
+    )
+
+    assert response.status_code == 207
+    body = response.get_json()
+    assert len(body['urls']) == 1
+    assert [r['ok'] for r in body['results']] == [True, False]
+    assert 'Not a readable image' in body['results'][1]['error']
+
+
+def test_upload_of_only_unreadable_images_is_a_client_error(client):
+    response = _upload(client, (io.BytesIO(b'not an image'), 'broken.jpg'),
+                       (io.BytesIO(b'\xff\xd8 truncated'), 'cut.jpg'))
+
+    assert response.status_code == 400
+    assert all(r['rejected'] for r in response.get_json()['results'])
+
+
+def test_upload_storage_failure_is_a_server_error(client, monkeypatch):
+    def refuse(self, data, name, content_type='image/jpeg'):
+        raise OSError('disk full')
+    monkeypatch.setattr(LocalStorage, 'save', refuse)
+
+    response = _upload(client, (io.BytesIO(_image_bytes((50, 50))), 'ok.jpg'))
+
+    assert response.status_code == 500
+    assert response.get_json()['results'][0] == {'filename': 'ok.jpg', 'ok': False, 'error': 'disk full',
+                                                 'rejected': False}
+
+
+def test_upload_rejects_disallowed_extension(client):
+    response = client.post('/api/listing/upload', data={
+        'images': [(io.BytesIO(b'x'), 'script.exe')]
+    }, content_type='multipart/form-data')
+    assert response.status_code == 400
+
+
+class SlowStorage(LocalStorage):
+    """Local storage with a fixed network-like delay per file."""
+
+    def __init__(self, root, delay):
+        super().__init__(root, 'http://test/')
+        self.delay = delay
+        self.threads = set()
+
+    def save(self, data, name, content_type='image/jpeg'):
+        self.threads.add(threading.get_ident())
+        time.sleep(self.delay)
+        return super().save(data, name, content_type)
+
+
+def test_uploads_run_concurrently(app, tmp_path):
+    storage = SlowStorage(str(tmp_path), delay=0.2)
+    files = [FileStorage(io.BytesIO(_image_bytes((200, 200))), f'{i}.jpg') for i in range(4)]
+
+    started = time.perf_counter()
+    results = process_uploads(files, storage=storage)
+    elapsed = time.perf_counter() - started
+
+    assert all(r['ok'] for r in results)
+    assert [r['filename'] for r in results] == ['0.jpg', '1.jpg', '2.jpg', '3.jpg']
+    assert len(storage.threads) > 1
+    # Six renditions per file: serial saves would take at least 24 * 0.2s
+    assert len(os.listdir(tmp_path)) == 4 * 6
+    assert elapsed < 2.4
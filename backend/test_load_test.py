@@ -0,0 +1,51 @@
+import logging
+
+import pytest
+
+from benchmarks.load_test import parse_mix, percentile, run
+
+
+def test_parse_mix():
+    assert parse_mix('browse=3,buy') == {'browse': 3.0, 'buy': 1.0}
+    with pytest.raises(ValueError):
+        parse_mix('browse=1,checkout=2')
+    with pytest.raises(ValueError):
+        parse_mix('browse=0')
+
+
+def test_percentile_is_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([7], 95) == 7
+    assert percentile([], 50) is None
+
+
+@pytest.fixture
+def app_logger():
+    # create_app configures the shared 'app' logger outside testing mode
+    logger = logging.getLogger('app')
+    level, handlers = logger.level, list(logger.handlers)
+    yield logger
+    logger.setLevel(level)
+    logger.handlers[:] = handlers
+
+
+def test_short_run_reports_every_scenario(tmp_path, app_logger):
+    report = run(f'sqlite:///{tmp_path / "load.db"}', users=2, iterations=4, seed=3, listings=60,
+                 photos=1, photo_size=(320, 240), mix=parse_mix('browse,search,post,heart,buy'))
+
+    assert report['total']['errors'] == 0
+    endpoints = report['endpoints']
+    assert endpoints['GET /api/auth/validate']['requests'] == 2
+    for row in endpoints.values():
+        assert row['p50_ms'] <= row['p95_ms'] <= row['p99_ms'] <= row['max_ms']
+    assert sum(row['requests'] for row in endpoints.values()) == report['total']['requests']
+
+    services = report['services']
+    assert services['cas_validations'] == 2
+    uploads = endpoints.get('POST /api/listing/upload', {}).get('requests', 0)
+    # One Cloudinary upload per photo; derivatives are transformation URLs
+    assert services['cloudinary_uploads'] == uploads
+    bought = endpoints.get('POST /api/listing/<id>/buy', {}).get('statuses', {}).get('200', 0)
+    assert services['smtp_messages'] == bought
@@ -0,0 +1,110 @@
+import re
+
+import pytest
+
+from app.cas.stub import StubCASServer
+from app.extensions import db
+from app.models import Listing
+from app.utils.metrics import metrics
+
+
+AUTH = {'Authorization': 'Bearer s3cret'}
+
+
+@pytest.fixture
+def config_overrides():
+    return {'SERVER_TIMING': True, 'METRICS_TOKEN': 's3cret'}
+
+
+@pytest.fixture
+def listing(seller):
+    listing = Listing(title='Lamp', description='', price=8, category='furniture',
+                      status='available', user_id=seller.id)
+    db.session.add(listing)
+    db.session.commit()
+    return listing
+
+
+def _scrape(client):
+    response = client.get('/internal/metrics', headers=AUTH)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    return response.get_data(as_text=True)
+
+
+def _sample(text, name, **labels):
+    """Value of the sample `name` whose labels include `labels`."""
+    for line in text.splitlines():
+        match = re.match(r'(\w+)(?:\{(.*)\})? (\S+)$', line)
+        if not match or match.group(1) != name:
+            continue
+        found = dict(re.findall(r'(\w+)="([^"]*)"', match.group(2) or ''))
+        if all(found.get(k) == str(v) for k, v in labels.items()):
+            return float(match.group(3))
+    return None
+
+
+def test_requests_are_timed_by_endpoint(client, listing, count_queries):
+    path = f'/api/listing/{listing.id}'
+    with count_queries() as statements:
+        assert client.get(path).status_code == 200
+        assert client.get(path).status_code == 200
+    assert client.get('/api/nowhere/1').status_code == 404
+
+    text = _scrape(client)
+    assert '# TYPE tigerpop_http_request_duration_seconds histogram' in text
+    endpoint = 'listing.get_single_listing'
+    assert _sample(text, 'tigerpop_http_request_duration_seconds_count', endpoint=endpoint, method='GET') == 2
+    assert _sample(text, 'tigerpop_http_request_duration_seconds_bucket', endpoint=endpoint, le='+Inf') == 2
+    assert _sample(text, 'tigerpop_http_requests_total', endpoint=endpoint, status='200') == 2
+    assert _sample(text, 'tigerpop_http_request_sql_statements_sum', endpoint=endpoint) == len(statements)
+    # Unrouted paths share one label instead of one per URL
+    assert _sample(text, 'tigerpop_http_requests_total', endpoint='unmatched', status='404') == 1
+    # Scrapes aren't counted
+    assert _sample(text, 'tigerpop_http_requests_total', endpoint='metrics') is None
+
+
+def test_streamed_responses_count_their_sql(client, listing, count_queries):
+    with count_queries() as statements:
+        client.get('/api/listing/')
+    text = _scrape(client)
+    assert _sample(text, 'tigerpop_http_request_sql_statements_sum', endpoint='listing.get_listings') == len(statements)
+
+
+def test_server_timing_header(client, listing):
+    header = client.get(f'/api/listing/{listing.id}').headers['Server-Timing']
+    assert re.match(r'app;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ queries"$', header)
+
+
+def test_cas_calls_are_outbound(app, client):
+    with StubCASServer() as cas:
+        app.config['CAS_URL'] = cas.url
+        cas.add_ticket('ST-1', 'tiger1')
+        response = client.get('/api/auth/validate', query_string={'ticket': 'ST-1', 'service': 'http://x'})
+    assert response.status_code == 200
+    assert 'cas;dur=' in response.headers['Server-Timing']
+    text = _scrape(client)
+    assert _sample(text, 'tigerpop_outbound_duration_seconds_count', service='cas') == 1
+
+
+def test_outbound_errors_outside_requests(app):
+    with pytest.raises(OSError):
+        with metrics.outbound('smtp'):
+            raise OSError('connection refused')
+    text = app.extensions['metrics'].render()
+    assert _sample(text, 'tigerpop_outbound_errors_total', service='smtp') == 1
+    assert _sample(text, 'tigerpop_outbound_duration_seconds_count', service='smtp') == 1
+
+
+def test_metrics_token(app, client):
+    assert client.get('/internal/metrics').status_code == 401
+    assert client.get('/internal/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    assert client.get('/internal/metrics', headers=AUTH).status_code == 200
+
+
+def test_metrics_need_a_token_outside_debug(app, client):
+    # A default deploy has no token: the endpoint is hidden, not public
+    app.config['METRICS_TOKEN'] = None
+    assert client.get('/internal/metrics').status_code == 404
+    app.debug = True
+    assert client.get('/internal/metrics').status_code == 200
@@ -0,0 +1,157 @@
+import socket
+import time
+
+import pytest
+
+from app.extensions import db
+from app.models import Listing, OutboxMessage, User
+from app.utils.outbox import outbox
+
+aiosmtpd_controller = pytest.importorskip('aiosmtpd.controller')
+
+
+class SinkHandler:
+    """Collects delivered messages and counts SMTP sessions."""
+
+    def __init__(self):
+        self.messages = []
+        self.connections = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        self.connections += 1
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope)
+        return '250 OK'
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_sink():
+    handler = SinkHandler()
+    controller = aiosmtpd_controller.Controller(handler, hostname='127.0.0.1', port=_free_port())
+    controller.start()
+    yield handler, controller.port
+    controller.stop()
+
+
+@pytest.fixture
+def config_overrides(request, smtp_sink):
+    marker = request.node.get_closest_marker('smtp_down')
+    # A port nobody listens on makes every connection attempt fail fast
+    port = _free_port() if marker else smtp_sink[1]
+    dispatch = request.node.get_closest_marker('dispatch')
+    return {'MAIL_SERVER': '127.0.0.1', 'MAIL_PORT': port, 'MAIL_USE_TLS': False, 'MAIL_USERNAME': None,
+            'MAIL_PASSWORD': None, 'MAIL_SUPPRESS_SEND': False,
+            'OUTBOX_DISPATCH': dispatch.args[0] if dispatch else 'external',
+            'OUTBOX_BATCH_SIZE': 10, 'OUTBOX_MAX_ATTEMPTS': 3}
+
+
+@pytest.fixture
+def listing(seller):
+    buyer = User(netid='buyer1')
+    db.session.add(buyer)
+    db.session.commit()
+    listing = Listing(title='Desk', description='desc', price=40, category='furniture',
+                      status='available', user_id=seller.id)
+    db.session.add(listing)
+    db.session.commit()
+    return listing, buyer
+
+
+def test_buy_request_only_enqueues(client, listing, smtp_sink):
+    listing, buyer = listing
+    handler, _ = smtp_sink
+    response = client.post(f'/api/listing/{listing.id}/buy',
+                           json={'buyer_id': buyer.id, 'message': 'Still available?'})
+    assert response.status_code == 200
+    assert handler.messages == []
+
+    queued = OutboxMessage.query.one()
+    assert queued.status == OutboxMessage.PENDING
+    assert queued.recipients == ['seller1@princeton.edu']
+
+    assert outbox.drain() == (1, 0)
+    assert handler.messages[0].rcpt_tos == ['seller1@princeton.edu']
+    assert b'Still available?' in handler.messages[0].content
+    assert OutboxMessage.query.one().status == OutboxMessage.SENT
+
+
+def test_batch_shares_one_smtp_connection(app, smtp_sink):
+    handler, _ = smtp_sink
+    for i in range(7):
+        outbox.enqueue(subject=f'Hello {i}', recipients=[f'user{i}@princeton.edu'], body='hi')
+    db.session.commit()
+
+    assert outbox.drain() == (7, 0)
+    assert len(handler.messages) == 7
+    assert handler.connections == 1
+
+
+@pytest.mark.smtp_down
+def test_failures_back_off_then_dead_letter(app, smtp_sink):
+    message = outbox.enqueue(subject='Hello', recipients=['user@princeton.edu'], body='hi')
+    db.session.commit()
+
+    assert outbox.drain() == (0, 1)
+    assert message.status == OutboxMessage.PENDING
+    assert message.attempts == 1
+    assert message.last_error
+    first_retry = message.next_attempt_at
+
+    # Not due yet: nothing is claimed
+    assert outbox.drain() == (0, 0)
+
+    for expected_attempts in (2, 3):
+        message.next_attempt_at = message.created_at
+        db.session.commit()
+        outbox.drain()
+        assert message.attempts == expected_attempts
+    assert message.status == OutboxMessage.DEAD
+    assert first_retry > message.created_at
+
+
+@pytest.mark.dispatch('thread')
+def test_thread_dispatcher_delivers_after_commit(client, listing, smtp_sink):
+    listing, _ = listing
+    handler, _ = smtp_sink
+    assert client.post(f'/api/listing/{listing.id}/notify').status_code == 200
+
+    deadline = time.monotonic() + 5
+    while not handler.messages and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert [m.rcpt_tos for m in handler.messages] == [['seller1@princeton.edu']]
+
+
+@pytest.mark.dispatch('inline')
+def test_inline_dispatch_sends_only_the_requests_message(client, listing, smtp_sink):
+    listing, buyer = listing
+    handler, _ = smtp_sink
+    # A backlog from earlier requests is left to `flask outbox drain`
+    db.session.add_all([OutboxMessage(subject=f'Old {i}', recipients=['old@princeton.edu'], body='hi')
+                        for i in range(3)])
+    db.session.commit()
+
+    response = client.post(f'/api/listing/{listing.id}/buy', json={'buyer_id': buyer.id})
+    assert response.status_code == 200
+    assert [m.rcpt_tos for m in handler.messages] == [['seller1@princeton.edu']]
+    assert OutboxMessage.query.filter_by(status=OutboxMessage.PENDING).count() == 3
+
+
+def test_inline_send_stops_at_its_time_budget(app, smtp_sink):
+    handler, _ = smtp_sink
+    app.config['OUTBOX_INLINE_SECONDS'] = -1
+    message = outbox.enqueue(subject='Hello', recipients=['user@princeton.edu'], body='hi')
+    db.session.commit()
+
+    assert outbox.send_enqueued() == (0, 0)
+    assert handler.messages == []
+    assert (message.status, message.attempts) == (OutboxMessage.PENDING, 0)
+    assert outbox.drain() == (1, 0)
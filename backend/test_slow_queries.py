@@ -0,0 +1,92 @@
+import logging
+
+import pytest
+
+from app.extensions import db
+from app.models import Listing, User
+from app.utils.slow_queries import redact, slow_queries, sql_comment
+from conftest import TestConfig
+
+
+@pytest.fixture
+def config_overrides(tmp_path):
+    # A file database, so the explain thread gets a connection of its own;
+    # a threshold every statement crosses
+    return {'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "slow.db"}', 'SQLALCHEMY_ENGINE_OPTIONS': {},
+            'SLOW_QUERY_MS': 0.0001, 'SLOW_QUERY_EXPLAIN': True, 'METRICS_TOKEN': 's3cret'}
+
+
+@pytest.fixture
+def listing(app, seller):
+    listing = Listing(title='Lamp', description='', price=8, category='furniture',
+                      status='available', user_id=seller.id)
+    db.session.add(listing)
+    db.session.commit()
+    # These INSERTs count as slow too; don't let their EXPLAINs land in a test's statements
+    slow_queries.wait_for_plans(app)
+    return listing
+
+
+def test_sql_comment_format():
+    assert sql_comment(route='listing.get_listings', blueprint='listing', framework='flask') == \
+        "/*blueprint='listing',framework='flask',route='listing.get_listings'*/"
+    assert sql_comment(route="it's/odd") == "/*route='it%27s%2Fodd'*/"
+
+
+def test_redact_masks_strings():
+    assert redact(('tiger1', 42, 1.5, None, b'\x00\x01')) == ['<str:6>', 42, 1.5, None, '<bytes:2>']
+    assert redact({'netid': 'tiger1', 'id': 3}) == {'netid': '<str:6>', 'id': 3}
+    assert redact([('a', 1), ('bb', 2)]) == [['<str:1>', 1], ['<str:2>', 2]]
+
+
+def test_request_statements_are_tagged(app, client, listing, count_queries):
+    with count_queries() as statements:
+        client.get('/api/listing/user', query_string={'netid': 'seller1'})
+    # The request's SELECTs count as slow; their EXPLAINs must not run
+    # during the next block
+    slow_queries.wait_for_plans(app)
+    assert statements
+    comment = "/*blueprint='listing',framework='flask',route='listing.get_user_listings'*/"
+    assert all(s.endswith(comment) for s in statements)
+
+    # Outside a request nothing is added
+    with count_queries() as statements:
+        User.query.count()
+    assert not statements[0].endswith('*/')
+
+
+def test_slow_queries_are_logged_redacted_and_explained(app, client, listing, caplog):
+    with caplog.at_level(logging.WARNING):
+        client.get('/api/listing/user', query_string={'netid': 'seller1'})
+    slow_queries.wait_for_plans(app)
+
+    logged = [r.getMessage() for r in caplog.records if r.getMessage().startswith('Slow query')]
+    assert logged and all('on listing.get_user_listings' in m for m in logged)
+    assert not any('seller1' in r.getMessage() for r in caplog.records)
+
+    queries = client.get('/internal/slow-queries', headers={'Authorization': 'Bearer s3cret'}).get_json()['queries']
+    lookup = next(q for q in queries if 'FROM users' in q['statement'] and q['endpoint'] == 'listing.get_user_listings')
+    assert lookup['parameters'][0] == '<str:7>'
+    # SQLite's EXPLAIN QUERY PLAN lines, filled in by the background thread
+    assert any('users' in line for line in lookup['plan'])
+    # Only SELECTs are explained; the fixture's INSERTs are logged without a plan
+    inserts = [q for q in queries if q['statement'].startswith('INSERT')]
+    assert inserts and all(q['plan'] is None for q in inserts)
+
+
+def test_slow_query_log_needs_the_token(app, client, listing):
+    client.get('/api/listing/user', query_string={'netid': 'seller1'})
+    assert client.get('/internal/slow-queries').status_code == 401
+    # Without a token configured the log is hidden outside debug
+    app.config['METRICS_TOKEN'] = None
+    assert client.get('/internal/slow-queries').status_code == 404
+
+
+def test_slow_query_log_can_be_off():
+    from app import create_app
+
+    class Off(TestConfig):
+        SLOW_QUERY_MS = 0
+    app = create_app(Off)
+    assert 'slow_queries' not in app.extensions
+    assert app.test_client().get('/internal/slow-queries').status_code == 404